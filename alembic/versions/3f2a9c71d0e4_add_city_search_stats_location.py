@@ -0,0 +1,32 @@
+"""Add location and geocode query to city_search_stats
+
+Revision ID: 3f2a9c71d0e4
+Revises: 8bb5647b7098
+Create Date: 2026-10-18 16:20:11.508317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c71d0e4'
+down_revision: Union[str, None] = '8bb5647b7098'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Прогрев кэша берет координаты и название для геокодера отсюда; у строк,
+    # созданных до миграции, они появятся при следующем поиске города
+    op.add_column('city_search_stats', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('city_search_stats', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('city_search_stats', sa.Column('geocode_query', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('city_search_stats', 'geocode_query')
+    op.drop_column('city_search_stats', 'longitude')
+    op.drop_column('city_search_stats', 'latitude')
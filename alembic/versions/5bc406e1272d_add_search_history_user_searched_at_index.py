@@ -0,0 +1,42 @@
+"""Add composite (user_id, searched_at DESC) index to search_history
+
+Revision ID: 5bc406e1272d
+Revises: d5f3663eef7b
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5bc406e1272d'
+down_revision: Union[str, None] = 'd5f3663eef7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /api/history и /api/last-city: WHERE user_id = ? ORDER BY searched_at DESC.
+    # INCLUDE (city) позволяет last-city читать только индекс (PostgreSQL 11+).
+    # Индекс строится CONCURRENTLY, чтобы не блокировать запись в большую таблицу
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_search_history_user_id_searched_at',
+            'search_history',
+            ['user_id', sa.text('searched_at DESC')],
+            unique=False,
+            postgresql_include=['city'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_search_history_user_id_searched_at',
+            table_name='search_history',
+            postgresql_concurrently=True
+        )
@@ -0,0 +1,66 @@
+"""Create search statistics rollup tables
+
+Revision ID: 6b0e4297a707
+Revises: 5bc406e1272d
+Create Date: 2026-10-18 12:31:07.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b0e4297a707'
+down_revision: Union[str, None] = '5bc406e1272d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('city_search_stats',
+    sa.Column('city', sa.String(), nullable=False),
+    sa.Column('search_count', sa.Integer(), nullable=False),
+    sa.Column('last_searched', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('city')
+    )
+    op.create_index('ix_city_search_stats_search_count', 'city_search_stats', [sa.text('search_count DESC')], unique=False)
+    op.create_table('daily_search_stats',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('searches', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('date')
+    )
+    op.create_table('search_totals',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_searches', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Заполняем сводные таблицы по уже накопленной истории
+    op.execute("""
+        INSERT INTO city_search_stats (city, search_count, last_searched)
+        SELECT city, count(id), max(searched_at)
+        FROM search_history
+        WHERE city IS NOT NULL
+        GROUP BY city
+    """)
+    # Дни по UTC, как при инкрементальном обновлении, а не по часовому поясу сессии БД
+    op.execute("""
+        INSERT INTO daily_search_stats (date, searches)
+        SELECT date(searched_at AT TIME ZONE 'UTC'), count(id)
+        FROM search_history
+        WHERE searched_at IS NOT NULL
+        GROUP BY date(searched_at AT TIME ZONE 'UTC')
+    """)
+    op.execute("""
+        INSERT INTO search_totals (id, total_searches)
+        SELECT 1, count(id) FROM search_history
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('search_totals')
+    op.drop_table('daily_search_stats')
+    op.drop_index('ix_city_search_stats_search_count', table_name='city_search_stats')
+    op.drop_table('city_search_stats')
@@ -0,0 +1,71 @@
+"""Add normalized search key with trigram index to city_search_stats
+
+Revision ID: 8bb5647b7098
+Revises: 6b0e4297a707
+Create Date: 2026-10-18 13:02:55.761240
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8bb5647b7098'
+down_revision: Union[str, None] = '6b0e4297a707'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+city_search_stats = sa.table(
+    'city_search_stats',
+    sa.column('city', sa.String()),
+    sa.column('search_key', sa.String())
+)
+
+
+def _normalize_city_name(city_name: str) -> str:
+    """Копия app.cache.normalize_city_name на момент миграции: ключи
+    существующих строк должны совпадать с ключами, которые пишет приложение"""
+    normalized = unicodedata.normalize("NFKC", city_name).casefold()
+    normalized = re.sub(r"\s*,\s*", ", ", normalized)
+    normalized = re.sub(r"\s+", " ", normalized)
+    return normalized.strip(" ,")
+
+
+def upgrade() -> None:
+    op.add_column('city_search_stats', sa.Column('search_key', sa.String(), nullable=True))
+    # Ключ считается в Python, а не через lower() в SQL: casefold и NFKC
+    # нормализуют иначе (ß -> ss), а lower() PostgreSQL с локалью C не меняет
+    # регистр кириллицы
+    bind = op.get_bind()
+    cities = bind.execute(sa.select(city_search_stats.c.city)).scalars().all()
+    if cities:
+        bind.execute(
+            city_search_stats.update()
+            .where(city_search_stats.c.city == sa.bindparam('city_name'))
+            .values(search_key=sa.bindparam('key')),
+            [{'city_name': city, 'key': _normalize_city_name(city)} for city in cities]
+        )
+    op.alter_column('city_search_stats', 'search_key', nullable=False)
+
+    # Поиск подстроки (LIKE '%...%') для автодополнения и статистики по городу.
+    # pg_trgm есть только в PostgreSQL, в SQLite (тесты) индекс не нужен
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            'ix_city_search_stats_search_key_trgm',
+            'city_search_stats',
+            ['search_key'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'search_key': 'gin_trgm_ops'}
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_city_search_stats_search_key_trgm', table_name='city_search_stats')
+    op.drop_column('city_search_stats', 'search_key')
@@ -0,0 +1,46 @@
+"""Replace search_totals with sums over daily_search_stats
+
+Revision ID: c71e5a0d4b92
+Revises: 3f2a9c71d0e4
+Create Date: 2026-10-18 19:05:42.118306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71e5a0d4b92'
+down_revision: Union[str, None] = '3f2a9c71d0e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Итоги /api/stats - суммы по дням: единственную строку search_totals
+    # обновляла каждая запись истории, и параллельные транзакции ждали друг друга
+    op.add_column('daily_search_stats', sa.Column('new_users', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        INSERT INTO daily_search_stats (date, searches, new_users)
+        SELECT date(created_at AT TIME ZONE 'UTC'), 0, count(id)
+        FROM users
+        WHERE created_at IS NOT NULL
+        GROUP BY date(created_at AT TIME ZONE 'UTC')
+        ON CONFLICT (date) DO UPDATE SET new_users = excluded.new_users
+    """)
+    op.drop_table('search_totals')
+
+
+def downgrade() -> None:
+    op.create_table('search_totals',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_searches', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO search_totals (id, total_searches)
+        SELECT 1, coalesce(sum(searches), 0) FROM daily_search_stats
+    """)
+    op.drop_column('daily_search_stats', 'new_users')
@@ -0,0 +1,126 @@
+import time
+import unicodedata
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+def normalize_city_name(city_name: str) -> str:
+    """Нормализовать название города для использования в качестве ключа кэша"""
+    # Приводим к единой юникод-форме и регистру: "МОСКВА", "москва" и "Москва" - один ключ
+    normalized = unicodedata.normalize("NFKC", city_name).casefold()
+    normalized = re.sub(r"\s*,\s*", ", ", normalized)
+    normalized = re.sub(r"\s+", " ", normalized)
+    return normalized.strip(" ,")
+
+class TTLCache:
+    """LRU-кэш ограниченного размера с временем жизни записей
+
+    Если задан stale_ttl, устаревшая запись хранится еще stale_ttl секунд
+    и может быть отдана через get_stale (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stale_ttl: float = 0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        # key -> (значение, момент истечения свежести)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+        # Счетчики для мониторинга
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """Найти запись: (значение, устарела ли) или None"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        now = self._clock()
+        if now >= expires_at + self.stale_ttl:
+            del self._data[key]
+            self.expirations += 1
+            return None
+
+        self._data.move_to_end(key)
+        return value, now >= expires_at
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение, если оно есть и не устарело"""
+        found = self._lookup(key)
+        if found is None or found[1]:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return found[0]
+
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """Получить значение вместе с признаком устаревания"""
+        found = self._lookup(key)
+        if found is None:
+            self.misses += 1
+        elif found[1]:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return found
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение (ttl по умолчанию берется из настроек кэша)"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удалить запись из кэша"""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Очистить кэш (счетчики сохраняются)"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > self._clock()
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Через сколько секунд запись устареет (отрицательное - уже устарела,
+        None - записи нет). Не влияет на счетчики и порядок LRU"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        return entry[1] - self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика использования кэша"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+        }
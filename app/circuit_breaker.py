@@ -0,0 +1,101 @@
+import time
+from typing import Any, Callable, Dict
+
+# Состояния автомата
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Автоматический выключатель для обращений к внешнему сервису
+
+    После failure_threshold ошибок подряд цепь размыкается: запросы сразу
+    отклоняются, не дожидаясь таймаутов. Через recovery_timeout секунд цепь
+    переходит в полуоткрытое состояние и пропускает до half_open_max_calls
+    пробных запросов: успех замыкает цепь, ошибка снова размыкает ее.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+        # Счетчики для мониторинга
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() >= self._opened_at + self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Через сколько секунд цепь начнет пропускать пробные запросы"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_timeout - self._clock())
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить запрос (в полуоткрытом состоянии - занять слот пробы)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+            self._probes_in_flight += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        """Запрос выполнен успешно"""
+        self.successes += 1
+        self._consecutive_failures = 0
+        if self._state == HALF_OPEN:
+            self._state = CLOSED
+            self._probes_in_flight = 0
+
+    def record_failure(self):
+        """Запрос завершился ошибкой сервиса"""
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.opened += 1
+            self._state = OPEN
+            self._opened_at = self._clock()
+            self._probes_in_flight = 0
+
+    def release(self):
+        """Запрос не дошел до сервиса (отмена, лимит) - освободить слот пробы"""
+        if self._state == HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние выключателя"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_after": round(self.retry_after(), 2),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "opened": self.opened
+        }
@@ -1,4 +1,7 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -11,8 +14,51 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронные драйверы для каждого типа БД
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite"
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """Заменить драйвер в URL базы данных на асинхронный"""
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return database_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+def _async_engine_options(database_url: str) -> dict:
+    """Настройки пула соединений асинхронного движка"""
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_pre_ping": True
+    }
+
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL),
+    **_async_engine_options(DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 Base = declarative_base()
 
+# INSERT ... ON CONFLICT поддерживают обе используемые БД
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert
+}
+
+def upsert_insert(dialect_name: str, model):
+    """INSERT с поддержкой ON CONFLICT для диалекта БД"""
+    insert = _UPSERT_INSERTS.get(dialect_name)
+    if insert is None:
+        raise ValueError(f"INSERT ... ON CONFLICT не поддерживается для БД {dialect_name}")
+    return insert(model)
+
 # Dependency для получения сессии БД
 def get_db():
     db = SessionLocal()
@@ -20,4 +66,8 @@ def get_db():
         yield db
     finally:
         db.close()
-        
\ No newline at end of file
+
+# Dependency для получения асинхронной сессии БД (не блокирует event loop)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,79 @@
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import Histogram, db_query_duration
+from app.query_stats import current_query_stats
+from app.tracing import SPAN_KIND_CLIENT, Tracer, current_span, tracer as default_tracer
+
+# Типы запросов для метки метрик и имени спана; остальное (PRAGMA, BEGIN,
+# CREATE...) - OTHER, чтобы число серий не зависело от текста запросов
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+def statement_operation(statement: str) -> str:
+    """Тип SQL-запроса: SELECT, INSERT, UPDATE, DELETE или OTHER"""
+    parts = statement.split(None, 1)
+    operation = parts[0].upper() if parts else ""
+    return operation if operation in _OPERATIONS else "OTHER"
+
+def instrument_engine(
+    engine: Engine,
+    histogram: Histogram = db_query_duration,
+    tracer: Tracer = default_tracer
+):
+    """Учет SQL-запросов движка (для асинхронного - его sync_engine)
+
+    Одна пара обработчиков cursor_execute измеряет время запроса один раз и
+    передает его метрикам, статистике текущего запроса (Server-Timing) и
+    трассировке - с одной и той же меткой операции.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement_operation(statement)
+        span = None
+        # Спаны SQL - только внутри трассируемого этапа
+        if tracer.enabled and current_span() is not None:
+            span = tracer.start_span(
+                f"db {operation}",
+                {
+                    "db.system": conn.dialect.name,
+                    "db.operation": operation,
+                    "db.statement": " ".join(statement.split())[:1000]
+                },
+                SPAN_KIND_CLIENT
+            )
+        context._instrumentation = (time.perf_counter(), operation, span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _finish(context, statement, cursor.rowcount)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        if context is not None:
+            _finish(context, exception_context.statement or "", None, exception_context.original_exception)
+
+    def _finish(context, statement: str, rowcount: Optional[int], exception: Optional[BaseException] = None):
+        measured = getattr(context, "_instrumentation", None)
+        if measured is None:
+            return
+        context._instrumentation = None
+        started, operation, span = measured
+        duration = time.perf_counter() - started
+
+        histogram.observe(duration, operation)
+
+        stats = current_query_stats()
+        if stats is not None:
+            stats.record(statement, rowcount, duration)
+
+        if span is not None:
+            if exception is not None:
+                span.record_exception(exception)
+            elif rowcount is not None and rowcount >= 0:
+                span.set_attribute("db.rowcount", rowcount)
+            tracer.end_span(span)
@@ -1,63 +1,98 @@
+from typing import Optional
 from fastapi import Cookie, Depends, Request
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, upsert_insert
 from app.models import User
-from starlette.middleware.base import BaseHTTPMiddleware
+from app.rollups import build_new_user_statement
+from app.sessions import session_cookies
+from app.request_scope import request_cache
+from app.tracing import span
 import uuid
 
-# Кэш для пользователей в рамках одного запроса
-_user_cache = {}
+async def _find_user(db: AsyncSession, session_id: str):
+    """Найти пользователя по session_id"""
+    with span("user.find"):
+        result = await db.execute(select(User).where(User.session_id == session_id))
+        return result.scalars().first()
 
-def get_or_create_user(
+async def _upsert_user(db: AsyncSession, session_id: str) -> User:
+    """Создать пользователя или вернуть существующего
+    
+    INSERT ... ON CONFLICT (session_id) DO NOTHING RETURNING: при гонке
+    одновременных запросов с одним session_id все получают одну и ту же
+    строку без ошибки уникальности. Счетчик пользователей в сводной таблице
+    увеличивает только запрос, который действительно вставил строку.
+    """
+    with span("user.upsert"):
+        dialect_name = db.get_bind().dialect.name
+        statement = upsert_insert(dialect_name, User).values(session_id=session_id)
+        statement = statement.on_conflict_do_nothing(index_elements=[User.session_id]).returning(User)
+        
+        user = (await db.scalars(statement)).first()
+        if user is None:
+            # Строку только что создал параллельный запрос с тем же session_id
+            user = await _find_user(db, session_id)
+        else:
+            await db.execute(build_new_user_statement(dialect_name))
+        await db.commit()
+        return user
+
+async def get_or_create_user(
     request: Request,
     session_id: str = Cookie(None), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Получить или создать пользователя по session_id из cookies с кэшированием"""
     
-    # Проверяем кэш для текущего запроса
-    cache_key = f"user_{session_id}_{id(request)}"
-    if cache_key in _user_cache:
-        return _user_cache[cache_key]
+    with span("get_or_create_user") as current:
+        # Проверяем кэш для текущего запроса
+        cache = request_cache()
+        cache_key = f"user_{session_id}"
+        if cache is not None and cache_key in cache:
+            current.set_attribute("request_cache", "hit")
+            return cache[cache_key]
+        
+        user = await _load_or_create_user(db, session_id)
+        current.set_attribute("user.id", user.id)
+        
+        # Кэшируем пользователя для текущего запроса
+        if cache is not None:
+            cache[cache_key] = user
+        return user
+
+async def _load_or_create_user(db: AsyncSession, session_id: Optional[str]) -> User:
+    """Найти пользователя по cookie или создать нового"""
+    if session_cookies.enabled:
+        # Подписанная cookie уже содержит id пользователя - БД не нужна
+        user = session_cookies.load(session_id)
+        if user is None:
+            # Пользователь со старой (неподписанной) cookie сохраняет свою историю
+            user = await _find_user(db, session_id) if session_id else None
+            if user is None:
+                user = await _upsert_user(db, str(uuid.uuid4()))
+        return user
     
     if not session_id:
-        session_id = str(uuid.uuid4())
-        cache_key = f"user_{session_id}_{id(request)}"
+        return await _upsert_user(db, str(uuid.uuid4()))
     
-    # Ищем пользователя в БД
-    user = db.query(User).filter(User.session_id == session_id).first()
-    
-    if not user:
-        user = User(session_id=session_id)
-        db.add(user)
-        try:
-            db.commit()
-            db.refresh(user)
-        except Exception:
-            # Если произошла ошибка уникальности, перечитываем
-            db.rollback()
-            user = db.query(User).filter(User.session_id == session_id).first()
-            if not user:
-                session_id = str(uuid.uuid4())
-                user = User(session_id=session_id)
-                db.add(user)
-                db.commit()
-                db.refresh(user)
-    
-    # Кэшируем пользователя для текущего запроса
-    _user_cache[cache_key] = user
+    # Большинство запросов - от существующих пользователей: для них достаточно
+    # чтения, без записи новой версии строки на каждый запрос
+    user = await _find_user(db, session_id)
+    if user is None:
+        user = await _upsert_user(db, session_id)
     return user
 
-class ClearUserCacheMiddleware(BaseHTTPMiddleware):
-    """Middleware для очистки кеша пользователей после каждого запроса"""
+async def get_current_user(
+    request: Request,
+    session_id: str = Cookie(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """Пользователь для эндпоинтов чтения
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Очищаем кэш для завершенного запроса
-        request_id = id(request)
-        keys_to_remove = [key for key in _user_cache.keys() if key.endswith(f"_{request_id}")]
-        for key in keys_to_remove:
-            _user_cache.pop(key, None)
-        
-        return response
+    В режиме подписанных cookie пользователь берется из cookie без обращения
+    к таблице users и не создается (None - у посетителя еще нет истории).
+    """
+    if session_cookies.enabled:
+        return session_cookies.load(session_id)
+    return await get_or_create_user(request, session_id, db)
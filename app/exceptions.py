@@ -0,0 +1,24 @@
+from typing import Optional
+
+class UpstreamError(Exception):
+    """Погодный API не смог обработать запрос (это не "город не найден")"""
+    detail = "Погодный сервис недоступен, попробуйте позже"
+
+    def __init__(self, message: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(message or self.detail)
+        self.retry_after = retry_after
+
+class UpstreamUnavailable(UpstreamError):
+    """Погодный API недоступен: таймаут, ошибка сети или 5xx"""
+
+class UpstreamRejected(UpstreamError):
+    """Погодный API отклонил запрос (4xx, кроме 429): сервис работает, ошибка в запросе"""
+    detail = "Погодный сервис отклонил запрос"
+
+    def __init__(self, status_code: int, message: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UpstreamRateLimited(UpstreamError):
+    """Исчерпан лимит запросов к погодному API"""
+    detail = "Превышен лимит запросов к погодному сервису, попробуйте позже"
@@ -0,0 +1,161 @@
+import csv
+import heapq
+import logging
+import os
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from app.cache import normalize_city_name
+
+logger = logging.getLogger(__name__)
+
+# Справочник городов по умолчанию (поставляется вместе с приложением)
+DEFAULT_GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cities.csv"
+)
+
+# Слова внутри названия: "Нижний Новгород" находится и по "новг"
+_WORD_SEPARATORS = re.compile(r"[\s\-]+")
+_CYRILLIC = re.compile(r"[а-яё]", re.IGNORECASE)
+
+# Символ больше любого символа ключа - верхняя граница диапазона префикса
+_PREFIX_END = chr(0x10FFFF)
+
+class City(NamedTuple):
+    """Город из справочника"""
+    name: str
+    country: str
+    state: str
+    latitude: float
+    longitude: float
+    population: int
+    alternate_names: tuple = ()
+
+class Gazetteer:
+    """Справочник городов с префиксным индексом для автодополнения
+
+    Индекс - отсортированный массив нормализованных ключей (названия, их
+    варианты и отдельные слова) с параллельным массивом ссылок на города.
+    Поиск префикса - два бинарных поиска, найденные города ранжируются
+    по населению.
+    """
+
+    def __init__(self, cities: Iterable[City] = ()):
+        self.cities: List[City] = list(cities)
+
+        entries = []
+        for index, city in enumerate(self.cities):
+            # Подсказку показываем основным названием на алфавите запроса:
+            # "Питер" -> "Санкт-Петербург", "Moskva" -> "Moscow"
+            labels = {}
+            for name in (city.name, *city.alternate_names):
+                labels.setdefault(_is_cyrillic(name), name)
+
+            for name in (city.name, *city.alternate_names):
+                key = normalize_city_name(name)
+                if not key:
+                    continue
+                label = labels[_is_cyrillic(name)]
+                keys = {key, *(word for word in _WORD_SEPARATORS.split(key) if word)}
+                entries.extend((key, index, label) for key in keys)
+        entries.sort()
+
+        self._keys: List[str] = [key for key, _, _ in entries]
+        self._entries = [(index, label) for _, index, label in entries]
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def search(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Найти города, название (или слово в нем) которых начинается с query"""
+        prefix = normalize_city_name(query)
+        if not prefix or limit <= 0:
+            return []
+
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + _PREFIX_END, lo=start)
+
+        # Город может совпасть по нескольким ключам - показываем его один раз
+        labels: Dict[int, str] = {}
+        for index, label in self._entries[start:end]:
+            labels.setdefault(index, label)
+
+        best = heapq.nlargest(limit, labels, key=lambda index: self.cities[index].population)
+        return [
+            {
+                "name": labels[index],
+                "state": self.cities[index].state,
+                "country": self.cities[index].country,
+                "latitude": self.cities[index].latitude,
+                "longitude": self.cities[index].longitude,
+                "population": self.cities[index].population
+            }
+            for index in best
+        ]
+
+    @classmethod
+    def from_file(cls, path: str) -> "Gazetteer":
+        """Загрузить справочник из CSV (формат data/cities.csv) или из выгрузки
+        GeoNames (cities15000.txt и т.п., разделитель - табуляция)"""
+        if path.endswith(".txt"):
+            return cls(_read_geonames(path))
+        return cls(_read_csv(path))
+
+def _read_csv(path: str) -> Iterable[City]:
+    """Прочитать города из CSV: name,alternate_names,country,state,latitude,longitude,population"""
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield City(
+                name=row["name"],
+                country=row.get("country") or "",
+                state=row.get("state") or "",
+                latitude=float(row["latitude"]),
+                longitude=float(row["longitude"]),
+                population=int(row.get("population") or 0),
+                alternate_names=tuple(
+                    name for name in (row.get("alternate_names") or "").split("|") if name
+                )
+            )
+
+def _read_geonames(path: str) -> Iterable[City]:
+    """Прочитать города из дампа GeoNames
+
+    Из альтернативных названий берем только кириллические, иначе индекс
+    раздувается переводами на все языки мира.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            name, ascii_name, alternate_names = fields[1], fields[2], fields[3]
+            alternates = [ascii_name] if ascii_name and ascii_name != name else []
+            alternates += [alt for alt in alternate_names.split(",") if _is_cyrillic(alt)]
+            yield City(
+                name=name,
+                country=fields[8],
+                state="",
+                latitude=float(fields[4]),
+                longitude=float(fields[5]),
+                population=int(fields[14] or 0),
+                alternate_names=tuple(alternates)
+            )
+
+def _is_cyrillic(name: str) -> bool:
+    return bool(_CYRILLIC.search(name))
+
+_gazetteer: Optional[Gazetteer] = None
+
+def get_gazetteer() -> Gazetteer:
+    """Общий справочник городов (загружается при первом обращении)"""
+    global _gazetteer
+    if _gazetteer is None:
+        path = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+        try:
+            _gazetteer = Gazetteer.from_file(path)
+        except Exception as e:
+            # Без справочника автодополнение работает через историю и API
+            logger.error("Ошибка загрузки справочника городов %s: %s", path, e)
+            _gazetteer = Gazetteer()
+    return _gazetteer
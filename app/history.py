@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import SearchHistory
+from app.rollups import update_search_rollups
+from app.tracing import span
+from app.weather_service import WeatherData
+
+logger = logging.getLogger(__name__)
+
+# Маркер остановки фоновой записи
+_STOP = object()
+
+def build_search_record(user_id: int, weather_data: WeatherData) -> Dict[str, Any]:
+    """Подготовить запись истории поиска"""
+    return {
+        "user_id": user_id,
+        "city": weather_data.city,
+        "temperature": weather_data.temperature,
+        "feels_like": weather_data.feels_like,
+        "humidity": weather_data.humidity,
+        "wind_speed": weather_data.wind_speed,
+        "description": weather_data.description,
+        # Для сводной статистики, в search_history не сохраняются
+        "latitude": weather_data.latitude,
+        "longitude": weather_data.longitude,
+        "geocode_query": weather_data.query
+    }
+
+# Поля записи, которые сохраняются в search_history
+_HISTORY_FIELDS = frozenset(column.key for column in SearchHistory.__table__.columns)
+
+async def save_search_records(db: AsyncSession, records: List[Dict[str, Any]]):
+    """Сохранить записи истории одним пакетным INSERT в одной транзакции
+    вместе с обновлением сводной статистики"""
+    with span("history.save", {"records": len(records)}):
+        await db.execute(
+            insert(SearchHistory),
+            [{key: value for key, value in record.items() if key in _HISTORY_FIELDS} for record in records]
+        )
+        await update_search_rollups(db, records)
+        await db.commit()
+
+class SearchHistoryWriter:
+    """Отложенная пакетная запись истории поиска (write-behind)
+
+    Записи складываются в ограниченную очередь, фоновая задача сохраняет их
+    пачками при наборе batch_size записей или раз в flush_interval секунд.
+    Если очередь переполнена дольше enqueue_timeout, enqueue возвращает False
+    и запись нужно сохранить сразу.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue_size: Optional[int] = None,
+        enqueue_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ):
+        if enabled is None:
+            enabled = os.getenv("HISTORY_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self.batch_size = batch_size or int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+        self.flush_interval = flush_interval or float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+        self.max_queue_size = max_queue_size or int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+        self.enqueue_timeout = (
+            enqueue_timeout if enqueue_timeout is not None
+            else float(os.getenv("HISTORY_ENQUEUE_TIMEOUT", "0.1"))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("HISTORY_FLUSH_RETRIES", "3"))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Счетчики для мониторинга
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.flush_failures = 0
+        self.failed_rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def start(self):
+        """Запустить фоновую запись (если режим включен)"""
+        if not self.enabled or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить фоновую запись, дописав все записи из очереди"""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, record: Dict[str, Any]) -> bool:
+        """Поставить запись в очередь. False - запись нужно сохранить сразу"""
+        if not self.running:
+            return False
+
+        # Время поиска фиксируем сейчас, а не в момент записи пачки
+        record = {**record, "searched_at": datetime.now(timezone.utc)}
+        try:
+            await asyncio.wait_for(self._queue.put(record), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        """Цикл фоновой записи"""
+        stop_received = False
+        while not stop_received:
+            batch, stop_received = await self._collect_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect_batch(self):
+        """Набрать пачку записей: до batch_size или до истечения flush_interval"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            if deadline is None:
+                deadline = loop.time() + self.flush_interval
+        return batch, False
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """Сохранить пачку с повторными попытками"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span("history.flush", {"records": len(batch), "attempt": attempt + 1}):
+                    async with self.session_factory() as db:
+                        await save_search_records(db, batch)
+            except Exception as e:
+                self.flush_failures += 1
+                logger.error("Ошибка записи пачки истории (%d записей, попытка %d): %s", len(batch), attempt + 1, e)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 5))
+                continue
+
+            self.flushed_rows += len(batch)
+            self.flushed_batches += 1
+            return
+
+        self.failed_rows += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика фоновой записи"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "flush_failures": self.flush_failures,
+            "failed_rows": self.failed_rows
+        }
+
+# Создаем глобальный экземпляр фоновой записи
+history_writer = SearchHistoryWriter()
+
+async def record_searches(db: AsyncSession, records: List[Dict[str, Any]]):
+    """Сохранить поиски: через фоновую очередь, если она включена,
+    а не поместившиеся в нее записи - сразу, одним пакетным INSERT"""
+    with span("history.record", {"records": len(records)}) as current:
+        pending = [record for record in records if not await history_writer.enqueue(record)]
+        current.set_attribute("queued", len(records) - len(pending))
+        if pending:
+            await save_search_records(db, pending)
@@ -1,24 +1,105 @@
-from fastapi import FastAPI, Request, HTTPException, Depends, Response
+from fastapi import FastAPI, Request, HTTPException, Depends, Response, Query, Header
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from app.weather_service import weather_service
-from app.database import get_db
-from app.dependencies import get_or_create_user, ClearUserCacheMiddleware
-from app.models import User, SearchHistory
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from app.weather_service import weather_service, WeatherData, make_location_id, parse_location_id
+from app.schemas import WeatherBatchRequest, WeatherBatchItem
+from app.exceptions import UpstreamError, UpstreamRateLimited, UpstreamRejected, UpstreamUnavailable
+from app.database import get_async_db, engine, async_engine
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, pool_gauges, registry
+from app.query_stats import QueryStatsMiddleware
+from app.db_instrumentation import instrument_engine
+from app.history import history_writer, build_search_record, record_searches
+from app.prewarm import cache_prewarmer
+from app.profiler import ProfilingMiddleware, profile_store
+from app.tracing import TracingMiddleware, configure_logging, tracer
+from app.rollups import matching_cities, search_totals
+from app.gazetteer import get_gazetteer
+from app.dependencies import get_or_create_user, get_current_user
+from app.request_scope import RequestScopeMiddleware
+from app.sessions import session_cookies
+from app.models import User, SearchHistory, CitySearchStats, DailySearchStats
+from contextlib import asynccontextmanager
+from typing import Optional
 import asyncio
-import httpx
+import logging
+import math
+import os
+
+# Логи приложения с request_id и trace_id текущего запроса
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Обращаться к геокодеру, если истории и справочника не хватило для подсказок
+AUTOCOMPLETE_API_FALLBACK = os.getenv("AUTOCOMPLETE_API_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+# Пакетный запрос погоды: размер пакета и число одновременных запросов к API
+WEATHER_BATCH_MAX_ITEMS = int(os.getenv("WEATHER_BATCH_MAX_ITEMS", "50"))
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "10"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Открываем пул соединений к погодному API, фоновую запись истории,
+    прогрев кэша и отправку спанов на время жизни приложения"""
+    await tracer.start()
+    await weather_service.startup()
+    await history_writer.start()
+    # Загружаем справочник городов заранее, а не на первом запросе автодополнения
+    get_gazetteer()
+    await cache_prewarmer.start()
+    yield
+    # Сначала дописываем историю из очереди, затем закрываем соединения
+    await cache_prewarmer.stop()
+    await history_writer.stop()
+    await weather_service.shutdown()
+    await tracer.stop()
 
 app = FastAPI(
     title="SkyPeek",
     description="Приложение для получения прогноза погоды",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Добавляем middleware для очистки кэша пользователей
-app.add_middleware(ClearUserCacheMiddleware)
+# Кэш данных в рамках одного запроса (пользователь и т.п.)
+app.add_middleware(RequestScopeMiddleware)
+# Число и время SQL-запросов запроса в заголовке Server-Timing (в режиме отладки)
+app.add_middleware(QueryStatsMiddleware)
+# Профиль отдельного запроса по заголовку X-Profile-Token (при заданном PROFILING_TOKEN)
+app.add_middleware(ProfilingMiddleware)
+# Идентификатор запроса для логов и корневой спан трассировки
+app.add_middleware(TracingMiddleware)
+# Время обработки запросов для /metrics (внешний слой - учитывает все middleware)
+app.add_middleware(MetricsMiddleware)
+
+# SQL-запросы обоих движков: метрики, Server-Timing и спаны трассировки
+for _engine in (engine, async_engine.sync_engine):
+    instrument_engine(_engine)
+
+def _upstream_error_response(status_code: int, exc: UpstreamError) -> JSONResponse:
+    headers = {}
+    if exc.retry_after:
+        headers["Retry-After"] = str(math.ceil(exc.retry_after))
+    return JSONResponse(status_code=status_code, content={"detail": exc.detail}, headers=headers)
+
+@app.exception_handler(UpstreamRateLimited)
+async def upstream_rate_limited_handler(request: Request, exc: UpstreamRateLimited):
+    """Исчерпана квота погодного API - 429 с Retry-After вместо 404"""
+    return _upstream_error_response(429, exc)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    """Погодный API недоступен - 503"""
+    logger.warning("Погодный API недоступен: %s", exc)
+    return _upstream_error_response(503, exc)
+
+@app.exception_handler(UpstreamRejected)
+async def upstream_rejected_handler(request: Request, exc: UpstreamRejected):
+    """Погодный API отклонил запрос (например, неверный ключ API) - 502"""
+    logger.error("Погодный API отклонил запрос: %s", exc)
+    return _upstream_error_response(502, exc)
 
 # Подключаем статические файлы
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -33,59 +114,134 @@ async def read_root(request: Request):
 
 @app.get("/api/weather")
 async def get_weather(
-    city: str, 
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    city: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    location_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_or_create_user)
 ):
-    """Получить прогноз погоды для города и сохранить в историю"""
-    if not city.strip():
-        raise HTTPException(status_code=400, detail="Название города не может быть пустым")
+    """Получить прогноз погоды для города и сохранить в историю
     
-    # Получаем данные о погоде
-    weather_data = await weather_service.get_weather_by_city(city)
+    Вместо названия можно передать lat/lon или location_id из ответа
+    или подсказки автодополнения - тогда геокодирование не нужно.
+    """
+    if location_id is not None:
+        coordinates = parse_location_id(location_id)
+        if coordinates is None:
+            raise HTTPException(status_code=400, detail="Некорректный location_id")
+        lat, lon = coordinates
+    
+    if lat is not None and lon is not None:
+        weather_data = await weather_service.get_weather_by_location(lat, lon)
+        not_found_detail = "Погода для указанных координат не найдена"
+    elif city is not None:
+        if not city.strip():
+            raise HTTPException(status_code=400, detail="Название города не может быть пустым")
+        weather_data = await weather_service.get_weather_by_city(city)
+        not_found_detail = f"Город '{city}' не найден"
+    else:
+        raise HTTPException(status_code=422, detail="Нужно указать city, lat и lon или location_id")
     
     if not weather_data:
-        raise HTTPException(status_code=404, detail=f"Город '{city}' не найден")
-    
-    # Сохраняем в историю поиска
-    search_record = SearchHistory(
-        user_id=user.id,
-        city=weather_data.city,
-        temperature=weather_data.temperature,
-        feels_like=weather_data.feels_like,
-        humidity=weather_data.humidity,
-        wind_speed=weather_data.wind_speed,
-        description=weather_data.description
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    
+    # Сохраняем в историю поиска: в режиме write-behind через фоновую очередь,
+    # иначе (или если очередь переполнена) - сразу
+    await record_searches(db, [build_search_record(user.id, weather_data)])
+    
+    _set_session_cookie(request, response, user)
+    
+    return weather_data
+
+@app.post("/api/weather/batch")
+async def get_weather_batch(
+    batch: WeatherBatchRequest,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_or_create_user)
+):
+    """Получить погоду для нескольких городов (или координат) одним запросом
+    
+    Элементы обрабатываются параллельно (не больше WEATHER_BATCH_CONCURRENCY
+    одновременно) через общие кэши сервиса, а история всех успешных поисков
+    сохраняется одним пакетным INSERT.
+    """
+    if len(batch.items) > WEATHER_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не больше {WEATHER_BATCH_MAX_ITEMS} городов в одном запросе"
+        )
+    
+    semaphore = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+    
+    async def resolve(item: WeatherBatchItem) -> Optional[WeatherData]:
+        async with semaphore:
+            if item.city is not None:
+                return await weather_service.get_weather_by_city(item.city)
+            if item.location_id is not None:
+                return await weather_service.get_weather_by_location(*parse_location_id(item.location_id))
+            return await weather_service.get_weather_by_location(item.lat, item.lon)
+    
+    outcomes = await asyncio.gather(
+        *(resolve(item) for item in batch.items),
+        return_exceptions=True
     )
     
-    db.add(search_record)
-    db.commit()
-    db.refresh(search_record)
+    results = []
+    records = []
+    for index, (item, outcome) in enumerate(zip(batch.items, outcomes)):
+        result = {"index": index, "query": item.model_dump(exclude_none=True)}
+        if isinstance(outcome, WeatherData):
+            records.append(build_search_record(user.id, outcome))
+            result.update(status="ok", weather=outcome)
+        elif isinstance(outcome, UpstreamError):
+            result.update(status="error", error=outcome.detail)
+        elif isinstance(outcome, Exception):
+            logger.error("Ошибка получения погоды для %s: %s", item, outcome)
+            result.update(status="error", error="Ошибка получения погоды")
+        else:
+            result.update(status="not_found", error="Город не найден")
+        results.append(result)
+    
+    if records:
+        await record_searches(db, records)
     
-    # Устанавливаем cookie с session_id (если еще не установлен)
-    if not request.cookies.get("session_id"):
+    _set_session_cookie(request, response, user)
+    
+    return {"results": results}
+
+def _set_session_cookie(request: Request, response: Response, user):
+    """Установить cookie с session_id (если еще не установлен или устарел)"""
+    cookie_value = session_cookies.cookie_value(user)
+    if request.cookies.get("session_id") != cookie_value:
         response.set_cookie(
             key="session_id",
-            value=user.session_id,
+            value=cookie_value,
             max_age=30*24*60*60,  # 30 дней
             httponly=True,
             samesite="lax"
         )
-    
-    return weather_data
 
 @app.get("/api/history")
 async def get_search_history(
     request: Request,
-    user: User = Depends(get_or_create_user),
-    db: Session = Depends(get_db)
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить историю поиска пользователя"""
-    searches = db.query(SearchHistory).filter(
-        SearchHistory.user_id == user.id
-    ).order_by(SearchHistory.searched_at.desc()).limit(10).all()
+    if user is None:
+        return []
+    
+    result = await db.execute(
+        select(SearchHistory).where(
+            SearchHistory.user_id == user.id
+        ).order_by(SearchHistory.searched_at.desc()).limit(10)
+    )
+    searches = result.scalars().all()
     
     return [
         {
@@ -104,13 +260,19 @@ async def get_search_history(
 @app.get("/api/last-city")
 async def get_last_searched_city(
     request: Request,
-    user: User = Depends(get_or_create_user),
-    db: Session = Depends(get_db)
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить последний искомый город пользователя"""
-    last_search = db.query(SearchHistory).filter(
-        SearchHistory.user_id == user.id
-    ).order_by(SearchHistory.searched_at.desc()).first()
+    if user is None:
+        return {"last_city": None}
+    
+    result = await db.execute(
+        select(SearchHistory.city, SearchHistory.searched_at).where(
+            SearchHistory.user_id == user.id
+        ).order_by(SearchHistory.searched_at.desc()).limit(1)
+    )
+    last_search = result.first()
     
     if not last_search:
         return {"last_city": None}
@@ -121,42 +283,42 @@ async def get_last_searched_city(
     }
 
 @app.get("/api/stats")
-async def get_search_statistics(db: Session = Depends(get_db)):
-    """Получить статистику поисков по городам"""
-    
-    # Группируем по городам и считаем количество поисков
-    city_stats = db.query(
-        SearchHistory.city,
-        func.count(SearchHistory.id).label('search_count'),
-        func.max(SearchHistory.searched_at).label('last_searched')
-    ).group_by(
-        SearchHistory.city
-    ).order_by(
-        desc('search_count')
-    ).limit(20).all()
+async def get_search_statistics(db: AsyncSession = Depends(get_async_db)):
+    """Получить статистику поисков по городам
+
+    Данные читаются из сводных таблиц, которые обновляются при записи
+    истории и создании пользователей, поэтому стоимость запроса не зависит
+    от размера search_history и users.
+    """
+    
+    # Самые популярные города
+    result = await db.execute(
+        select(CitySearchStats).order_by(
+            CitySearchStats.search_count.desc()
+        ).limit(20)
+    )
+    city_stats = result.scalars().all()
     
     # Общая статистика
-    total_searches = db.query(func.count(SearchHistory.id)).scalar()
-    total_users = db.query(func.count(User.id)).scalar()
-    
-    # Статистика по дням (последние 7 дней)
-    from datetime import datetime, timedelta
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    
-    daily_stats = db.query(
-        func.date(SearchHistory.searched_at).label('date'),
-        func.count(SearchHistory.id).label('searches')
-    ).filter(
-        SearchHistory.searched_at >= seven_days_ago
-    ).group_by(
-        func.date(SearchHistory.searched_at)
-    ).order_by('date').all()
+    total_searches, total_users = (await db.execute(search_totals())).one()
+    unique_cities = await db.scalar(select(func.count()).select_from(CitySearchStats))
+    
+    # Статистика по дням (последние 7 дней по UTC, как и в сводной таблице)
+    from datetime import datetime, timedelta, timezone
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    
+    result = await db.execute(
+        select(DailySearchStats).where(
+            DailySearchStats.date >= seven_days_ago.date()
+        ).order_by(DailySearchStats.date)
+    )
+    daily_stats = result.scalars().all()
     
     return {
         "overview": {
             "total_searches": total_searches,
             "total_users": total_users,
-            "unique_cities": len(city_stats)
+            "unique_cities": unique_cities
         },
         "top_cities": [
             {
@@ -176,51 +338,102 @@ async def get_search_statistics(db: Session = Depends(get_db)):
     }
 
 @app.get("/api/stats/city/{city_name}")
-async def get_city_statistics(city_name: str, db: Session = Depends(get_db)):
+async def get_city_statistics(city_name: str, db: AsyncSession = Depends(get_async_db)):
     """Получить детальную статистику по конкретному городу"""
     
-    # Основная статистика по городу
-    city_searches = db.query(SearchHistory).filter(
-        SearchHistory.city.ilike(f"%{city_name}%")
-    ).all()
+    # Сначала находим подходящие города в сводной таблице (триграммный индекс),
+    # затем берем их историю по B-tree индексу ix_search_history_city
+    city_filter = SearchHistory.city.in_(matching_cities(city_name))
     
-    if not city_searches:
-        raise HTTPException(status_code=404, detail=f"Статистика для города '{city_name}' не найдена")
-    
-    # Подсчеты
-    total_searches = len(city_searches)
-    unique_users = len(set(search.user_id for search in city_searches))
+    # Основная статистика по городу считается в БД, без загрузки записей
+    result = await db.execute(
+        select(
+            func.count(SearchHistory.id).label('total_searches'),
+            func.count(func.distinct(SearchHistory.user_id)).label('unique_users'),
+            func.min(SearchHistory.searched_at).label('first_search'),
+            func.max(SearchHistory.searched_at).label('last_search'),
+            func.avg(SearchHistory.temperature).label('avg_temp'),
+            func.avg(SearchHistory.humidity).label('avg_humidity'),
+            func.avg(SearchHistory.wind_speed).label('avg_wind')
+        ).where(city_filter)
+    )
+    summary = result.one()
     
-    # Средние значения погоды
-    avg_temp = sum(search.temperature for search in city_searches) / total_searches
-    avg_humidity = sum(search.humidity for search in city_searches) / total_searches
-    avg_wind = sum(search.wind_speed for search in city_searches) / total_searches
+    if not summary.total_searches:
+        raise HTTPException(status_code=404, detail=f"Статистика для города '{city_name}' не найдена")
     
     # Самые частые описания погоды
-    from collections import Counter
-    weather_descriptions = Counter(search.description for search in city_searches)
+    result = await db.execute(
+        select(
+            SearchHistory.description,
+            func.count(SearchHistory.id).label('count')
+        ).where(city_filter).group_by(
+            SearchHistory.description
+        ).order_by(
+            func.count(SearchHistory.id).desc(),
+            SearchHistory.description
+        ).limit(5)
+    )
+    weather_descriptions = result.all()
     
     return {
         "city": city_name,
         "statistics": {
-            "total_searches": total_searches,
-            "unique_users": unique_users,
-            "first_search": min(search.searched_at for search in city_searches),
-            "last_search": max(search.searched_at for search in city_searches)
+            "total_searches": summary.total_searches,
+            "unique_users": summary.unique_users,
+            "first_search": summary.first_search,
+            "last_search": summary.last_search
         },
         "weather_averages": {
-            "temperature": round(avg_temp, 1),
-            "humidity": round(avg_humidity, 1),
-            "wind_speed": round(avg_wind, 1)
+            # PostgreSQL возвращает AVG как Decimal
+            "temperature": round(float(summary.avg_temp or 0), 1),
+            "humidity": round(float(summary.avg_humidity or 0), 1),
+            "wind_speed": round(float(summary.avg_wind or 0), 1)
         },
         "popular_conditions": [
             {"condition": condition, "count": count}
-            for condition, count in weather_descriptions.most_common(5)
+            for condition, count in weather_descriptions
         ]
     }
 
+def _format_city_name(city_data: dict) -> str:
+    """Полное название города для подсказки (город, регион, страна)"""
+    city_name = city_data["name"]
+    if city_data.get("state"):
+        city_name += f", {city_data['state']}"
+    if city_data.get("country"):
+        city_name += f", {city_data['country']}"
+    return city_name
+
+def _location_key(latitude, longitude):
+    """Грубые координаты (~10 км) для сравнения городов из разных источников"""
+    if latitude is None or longitude is None:
+        return None
+    return (round(latitude, 1), round(longitude, 1))
+
+def _add_suggestion(
+    suggestions: list,
+    city_name: str,
+    source: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+):
+    """Добавить подсказку, если такого города еще нет
+    
+    Подсказка с координатами получает location_id: выбранный город можно
+    запросить без геокодирования, а название запоминается для ответа.
+    """
+    if any(s["name"].lower() == city_name.lower() for s in suggestions):
+        return
+    
+    suggestion = {"name": city_name, "source": source}
+    if latitude is not None and longitude is not None:
+        suggestion["location_id"] = make_location_id(latitude, longitude)
+        weather_service.remember_place_name(latitude, longitude, city_name)
+    suggestions.append(suggestion)
+
 @app.get("/api/cities")
-async def search_cities(q: str, db: Session = Depends(get_db)):
+async def search_cities(q: str, db: AsyncSession = Depends(get_async_db)):
     """Поиск городов для автодополнения"""
     if not q or len(q.strip()) < 2:
         return {"cities": []}
@@ -229,52 +442,48 @@ async def search_cities(q: str, db: Session = Depends(get_db)):
     
     try:
         # Сначала ищем в истории поиска пользователей
-        history_cities = db.query(SearchHistory.city).filter(
-            SearchHistory.city.ilike(f"%{query}%")
-        ).distinct().limit(5).all()
+        # Сводная таблица уже содержит каждый город один раз - DISTINCT не нужен
+        result = await db.execute(
+            matching_cities(query).order_by(
+                CitySearchStats.search_count.desc()
+            ).limit(5)
+        )
+        history_cities = result.all()
         
         history_suggestions = [{"name": city[0], "source": "history"} for city in history_cities]
-        
-        # Если мало результатов из истории, ищем через Geocoding API
         suggestions = history_suggestions.copy()
         
-        if len(suggestions) < 5:
-            try:
-                async with httpx.AsyncClient() as client:
-                    params = {
-                        "q": query,
-                        "limit": 8,
-                        "appid": weather_service.api_key
-                    }
-                    response = await client.get(weather_service.geocoding_base_url, params=params)
-                    response.raise_for_status()
-                    
-                    api_cities = response.json()
-                    
-                    for city_data in api_cities:
-                        city_name = city_data["name"]
-                        if city_data.get("state"):
-                            city_name += f", {city_data['state']}"
-                        if city_data.get("country"):
-                            city_name += f", {city_data['country']}"
-                        
-                        # Проверяем что такого города еще нет в suggestions
-                        if not any(s["name"].lower() == city_name.lower() for s in suggestions):
-                            suggestions.append({
-                                "name": city_name,
-                                "source": "api"
-                            })
-                        
-                        if len(suggestions) >= 8:
-                            break
-                            
-            except Exception as e:
-                print(f"Ошибка поиска городов через API: {e}")
+        # Затем - локальный справочник городов (без обращения к внешнему API)
+        known_locations = set()
+        for city_data in get_gazetteer().search(query, limit=8):
+            known_locations.add(_location_key(city_data["latitude"], city_data["longitude"]))
+            _add_suggestion(
+                suggestions, _format_city_name(city_data), "gazetteer",
+                city_data["latitude"], city_data["longitude"]
+            )
+            if len(suggestions) >= 8:
+                break
+        
+        # Если результатов все еще мало, ищем через Geocoding API
+        if len(suggestions) < 5 and AUTOCOMPLETE_API_FALLBACK:
+            api_cities = await weather_service.autocomplete_cities(query, limit=8)
+            
+            for city_data in api_cities:
+                # Города из справочника уже есть в подсказках (возможно, под другим названием)
+                if _location_key(city_data["latitude"], city_data["longitude"]) in known_locations:
+                    continue
+                _add_suggestion(
+                    suggestions, _format_city_name(city_data), "api",
+                    city_data["latitude"], city_data["longitude"]
+                )
+                
+                if len(suggestions) >= 8:
+                    break
         
         return {"cities": suggestions[:8]}
         
     except Exception as e:
-        print(f"Ошибка поиска городов: {e}")
+        logger.exception("Ошибка поиска городов: %s", e)
         return {"cities": []}
 
 @app.get("/stats", response_class=HTMLResponse)
@@ -282,6 +491,98 @@ async def stats_page(request: Request):
     """Страница статистики"""
     return templates.TemplateResponse("stats.html", {"request": request})
 
+@app.get("/api/cache/stats")
+async def get_cache_statistics():
+    """Статистика кэшей погодного сервиса (попадания, промахи, вытеснения)"""
+    return weather_service.cache_stats()
+
+@app.get("/api/health/history-writer")
+async def get_history_writer_statistics():
+    """Состояние фоновой записи истории (очередь, пачки, ошибки)"""
+    return history_writer.stats()
+
+@app.get("/api/health/prewarm")
+async def get_prewarm_statistics():
+    """Состояние фонового прогрева кэша популярных городов"""
+    return cache_prewarmer.stats()
+
+@app.get("/api/health/tracing")
+async def get_tracing_statistics():
+    """Состояние трассировки (накопленные, отправленные и отброшенные спаны)"""
+    return tracer.stats()
+
+@app.get("/api/health/upstream")
+async def get_upstream_statistics():
+    """Состояние обращений к погодному API (квота, очередь, circuit breaker)"""
+    return weather_service.upstream_stats()
+
+def _cache_metrics(field: str):
+    def collect():
+        for name, stats in weather_service.cache_stats().items():
+            if field in stats:
+                yield {"cache": name}, stats[field]
+    return collect
+
+def _cache_lookups():
+    for name, stats in weather_service.cache_stats().items():
+        for field, result in (("hits", "hit"), ("stale_hits", "stale_hit"), ("misses", "miss")):
+            if field in stats:
+                yield {"cache": name, "result": result}, stats[field]
+
+def _upstream_state():
+    breaker = weather_service.circuit_breaker
+    for state in ("closed", "open", "half_open"):
+        yield {"state": state}, 1 if breaker.state == state else 0
+
+registry.collected(
+    "skypeek_db_pool_connections", "Соединения пула БД (занятые, сверх лимита, размер пула)",
+    pool_gauges({"sync": engine, "async": async_engine.sync_engine})
+)
+registry.collected("skypeek_cache_entries", "Число записей в кэшах погодного сервиса", _cache_metrics("size"))
+registry.collected("skypeek_cache_hit_ratio", "Доля попаданий в кэши погодного сервиса", _cache_metrics("hit_ratio"))
+registry.collected("skypeek_cache_lookups_total", "Обращения к кэшам по результату", _cache_lookups, type="counter")
+registry.collected("skypeek_upstream_circuit_state", "Состояние circuit breaker погодного API", _upstream_state)
+registry.collected(
+    "skypeek_upstream_rate_limit_tokens", "Доступные токены квоты погодного API",
+    lambda: [({}, weather_service.rate_limiter.stats()["tokens"])]
+)
+registry.collected(
+    "skypeek_history_queue_size", "Записи истории в очереди фоновой записи",
+    lambda: [({}, history_writer.stats()["queue_size"])]
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    """Доступ к профилированию только с токеном; без PROFILING_TOKEN его нет"""
+    if not profile_store.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profile_store.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Неверный токен профилирования")
+
+@app.post("/api/debug/profile", response_class=PlainTextResponse, dependencies=[Depends(require_profiling_token)])
+async def profile_window(seconds: float = Query(10, gt=0)):
+    """Профиль всех потоков приложения за заданное время (folded stacks)"""
+    profile = await profile_store.profile_window(seconds)
+    profile_id = profile_store.save(profile)
+    return PlainTextResponse(profile.folded(), headers={"X-Profile-Id": profile_id})
+
+@app.get("/api/debug/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """Сохраненные профили запросов и временных окон"""
+    return {"profiles": profile_store.list()}
+
+@app.get("/api/debug/profiles/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_profiling_token)])
+async def get_profile(profile_id: str):
+    """Профиль в формате folded stacks для flamegraph.pl или speedscope"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Профиль '{profile_id}' не найден")
+    return PlainTextResponse(profile.folded())
+
 @app.get("/api/health")
 async def health_check():
     """Проверка работоспособности API"""
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Границы бакетов (секунды): от быстрых запросов к кэшу до таймаута API
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Сэмпл собранной метрики: (суффикс имени, метки, значение)
+Sample = Tuple[str, Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Metric(ABC):
+    """Метрика с фиксированным набором меток"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        # Метрики БД обновляются и из потоков синхронного движка
+        self._lock = threading.Lock()
+
+    def _labels(self, labelvalues: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, labelvalues))
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        ...
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+class Histogram(Metric):
+    """Гистограмма длительностей с фиксированными бакетами"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Счетчики по бакетам (последний - +Inf), сумма, количество
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labelvalues: str) -> int:
+        series = self._series.get(labelvalues)
+        return series[2] if series else 0
+
+    def samples(self) -> Iterable[Sample]:
+        for labelvalues, (bucket_counts, total, count) in list(self._series.items()):
+            labels = self._labels(labelvalues)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                yield "_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+class CollectedMetric:
+    """Значения, вычисляемые в момент сбора метрик
+
+    collect возвращает пары (метки, значение). Для счетчиков, которые ведут
+    сами компоненты (попадания в кэш и т.п.), type - counter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+        type: str = "gauge"
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._collect():
+            if value is not None:
+                yield "", labels, value
+
+class MetricsRegistry:
+    """Набор метрик, отдаваемых эндпоинтом /metrics
+
+    Счетчики и гистограммы обновляются на горячем пути, поэтому устроены
+    просто: значения меток передаются позиционно, серия ищется по кортежу,
+    бакет - бинарным поиском. То, что уже считают сами компоненты (кэши,
+    пул соединений, circuit breaker), собирается только при запросе /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def collected(self, name: str, documentation: str, collect: Callable, type: str = "gauge") -> CollectedMetric:
+        return self.register(CollectedMetric(name, documentation, collect, type))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                # Ошибка одного источника не должна ломать весь сбор
+                logger.error("Ошибка сбора метрики %s: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Общий реестр приложения
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "skypeek_http_request_duration_seconds",
+    "Время обработки HTTP-запроса по шаблону маршрута",
+    ("method", "route", "status")
+)
+upstream_request_duration = registry.histogram(
+    "skypeek_upstream_request_duration_seconds",
+    "Время обращения к погодному API по операциям и исходам",
+    ("provider", "operation", "outcome")
+)
+db_query_duration = registry.histogram(
+    "skypeek_db_query_duration_seconds",
+    "Время выполнения SQL-запросов по типу запроса",
+    ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+class MetricsMiddleware:
+    """ASGI middleware: время обработки запросов по шаблону маршрута
+
+    Метка route - шаблон пути (/api/stats/city/{city_name}), а не сам путь,
+    чтобы число серий не росло с числом разных URL.
+    """
+
+    def __init__(self, app, histogram: Histogram = http_request_duration):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                # Для смонтированных приложений (статика) - префикс монтирования
+                getattr(route, "path", None) or scope.get("root_path") or "unmatched",
+                str(status_code)
+            )
+
+def pool_gauges(engines: Dict[str, Engine]) -> Callable[[], Iterable[Tuple[Dict[str, str], float]]]:
+    """Сборщик состояния пулов соединений (занятые, сверх лимита, размер)"""
+
+    def collect():
+        for name, engine in engines.items():
+            pool = engine.pool
+            for state in ("checkedout", "overflow", "size"):
+                method: Optional[Callable] = getattr(pool, state, None)
+                if method is not None:
+                    # overflow у QueuePool отрицателен, пока пул не заполнен
+                    yield {"engine": name, "state": state}, max(0, method())
+    return collect
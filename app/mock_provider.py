@@ -0,0 +1,190 @@
+"""Локальная заглушка OpenWeatherMap для нагрузочного тестирования
+
+Повторяет ответы /geo/1.0/direct и /data/2.5/weather: города берутся из
+справочника (data/cities.csv), погода детерминированно вычисляется по
+координатам. Задержка и доля ошибок настраиваются, ключ API не проверяется.
+
+    uvicorn app.mock_provider:app --port 8090
+    WEATHER_PROVIDER=mock MOCK_PROVIDER_URL=http://127.0.0.1:8090 uvicorn app.main:app
+"""
+import asyncio
+import os
+import random
+import zlib
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+from app.cache import normalize_city_name
+from app.gazetteer import Gazetteer, get_gazetteer
+
+_DESCRIPTIONS = (
+    "ясно", "небольшая облачность", "переменная облачность", "пасмурно",
+    "небольшой дождь", "дождь", "небольшой снег", "туман", "гроза"
+)
+
+def _stable_random(*parts: Any) -> random.Random:
+    """Генератор, зависящий только от parts: одинаковый ответ на одинаковый запрос"""
+    return random.Random(zlib.crc32(repr(parts).encode()))
+
+def synthetic_weather(latitude: float, longitude: float) -> Dict[str, Any]:
+    """Детерминированная погода для координат (в формате OpenWeatherMap)"""
+    rng = _stable_random(round(latitude, 2), round(longitude, 2))
+    temperature = round(30 - abs(latitude) * 0.6 + rng.uniform(-6, 6), 1)
+    wind_speed = round(rng.uniform(0, 12), 1)
+    return {
+        "coord": {"lat": latitude, "lon": longitude},
+        "weather": [{"description": rng.choice(_DESCRIPTIONS)}],
+        "main": {
+            "temp": temperature,
+            "feels_like": round(temperature - wind_speed * 0.3, 1),
+            "humidity": rng.randint(30, 95),
+            "pressure": rng.randint(990, 1035)
+        },
+        "wind": {"speed": wind_speed},
+        "sys": {},
+        "name": ""
+    }
+
+class MockProvider:
+    """Состояние заглушки: настройки, справочник и счетчики запросов"""
+
+    def __init__(
+        self,
+        gazetteer: Optional[Gazetteer] = None,
+        latency: Optional[float] = None,
+        latency_jitter: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        rate_limit_rate: Optional[float] = None,
+        synthetic_cities: Optional[bool] = None,
+        seed: Optional[int] = None
+    ):
+        self.gazetteer = gazetteer if gazetteer is not None else get_gazetteer()
+        # Задержка ответа в секундах: latency +- latency_jitter
+        self.latency = latency if latency is not None else float(os.getenv("MOCK_PROVIDER_LATENCY", "0.05"))
+        self.latency_jitter = (
+            latency_jitter if latency_jitter is not None
+            else float(os.getenv("MOCK_PROVIDER_LATENCY_JITTER", "0.02"))
+        )
+        # Доли ответов 503 и 429
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("MOCK_PROVIDER_ERROR_RATE", "0"))
+        self.rate_limit_rate = (
+            rate_limit_rate if rate_limit_rate is not None
+            else float(os.getenv("MOCK_PROVIDER_RATE_LIMIT_RATE", "0"))
+        )
+        # Неизвестные названия "находятся" в псевдослучайных координатах:
+        # так нагрузочный тест может запрашивать сколько угодно разных городов
+        if synthetic_cities is None:
+            synthetic_cities = os.getenv("MOCK_PROVIDER_SYNTHETIC_CITIES", "false").lower() in ("1", "true", "yes")
+        self.synthetic_cities = synthetic_cities
+        self._random = random.Random(seed if seed is not None else int(os.getenv("MOCK_PROVIDER_SEED", "0")))
+
+        self.requests = {"geocode": 0, "weather": 0}
+        self.errors = 0
+        self.rate_limited = 0
+
+    async def delay(self):
+        latency = self.latency + self._random.uniform(-self.latency_jitter, self.latency_jitter)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def injected_error(self) -> Optional[JSONResponse]:
+        """Ответ с ошибкой, если он выпал по настроенным долям"""
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            return JSONResponse(
+                status_code=429, content={"cod": 429, "message": "rate limit"}, headers={"Retry-After": "1"}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            return JSONResponse(status_code=503, content={"cod": 503, "message": "service unavailable"})
+        return None
+
+    def geocode(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Места по названию (формат /geo/1.0/direct)"""
+        # "Москва, RU" - как и OpenWeatherMap, ищем по названию до запятой
+        name = query.split(",")[0]
+        key = normalize_city_name(name)
+        found = self.gazetteer.search(name, limit=max(limit, 8))
+        exact = [city for city in found if normalize_city_name(city["name"]) == key]
+        places = [
+            {
+                "name": city["name"],
+                "lat": city["latitude"],
+                "lon": city["longitude"],
+                "country": city["country"],
+                "state": city["state"]
+            }
+            for city in (exact or found)[:limit]
+        ]
+        if not places and self.synthetic_cities and key:
+            rng = _stable_random(key)
+            places.append({
+                "name": name.strip(),
+                "lat": round(rng.uniform(-60, 70), 4),
+                "lon": round(rng.uniform(-180, 180), 4),
+                "country": "XX",
+                "state": ""
+            })
+        return places
+
+    def weather(self, latitude: float, longitude: float) -> Dict[str, Any]:
+        """Текущая погода (формат /data/2.5/weather) с названием ближайшего города"""
+        data = synthetic_weather(latitude, longitude)
+        nearest = min(
+            self.gazetteer.cities,
+            key=lambda city: (city.latitude - latitude) ** 2 + (city.longitude - longitude) ** 2,
+            default=None
+        )
+        if nearest is not None and abs(nearest.latitude - latitude) + abs(nearest.longitude - longitude) < 0.5:
+            data["name"] = nearest.name
+            data["sys"]["country"] = nearest.country
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate
+        }
+
+def create_app(provider: Optional[MockProvider] = None) -> FastAPI:
+    """Приложение заглушки (настройки по умолчанию - из переменных окружения)"""
+    provider = provider or MockProvider()
+    mock_app = FastAPI(title="SkyPeek mock weather provider")
+    mock_app.state.provider = provider
+
+    @mock_app.get("/geo/1.0/direct")
+    async def direct_geocoding(q: str, limit: int = Query(5, ge=1, le=50), appid: Optional[str] = None):
+        provider.requests["geocode"] += 1
+        await provider.delay()
+        return provider.injected_error() or provider.geocode(q, limit)
+
+    @mock_app.get("/data/2.5/weather")
+    async def current_weather(
+        lat: float = Query(..., ge=-90, le=90),
+        lon: float = Query(..., ge=-180, le=180),
+        appid: Optional[str] = None,
+        units: Optional[str] = None,
+        lang: Optional[str] = None
+    ):
+        provider.requests["weather"] += 1
+        await provider.delay()
+        return provider.injected_error() or provider.weather(lat, lon)
+
+    @mock_app.get("/stats")
+    async def mock_statistics():
+        return provider.stats()
+
+    return mock_app
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("MOCK_PROVIDER_PORT", "8090")))
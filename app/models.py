@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship  # Исправлено!
 from sqlalchemy.sql import func
 from app.database import Base
@@ -28,4 +28,52 @@ class SearchHistory(Base):
     searched_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Связь с пользователем
-    user = relationship("User", back_populates="searches")
\ No newline at end of file
+    user = relationship("User", back_populates="searches")
+    
+    __table_args__ = (
+        # История и последний город пользователя: WHERE user_id = ? ORDER BY searched_at DESC.
+        # В PostgreSQL city включен в индекс, чтобы last-city обходился index-only scan
+        Index(
+            "ix_search_history_user_id_searched_at",
+            user_id,
+            searched_at.desc(),
+            postgresql_include=["city"]
+        ),
+    )
+
+# Сводные таблицы статистики. Обновляются при записи истории поиска,
+# чтобы /api/stats не агрегировал всю search_history на каждый запрос
+
+class CitySearchStats(Base):
+    __tablename__ = "city_search_stats"
+    
+    city = Column(String, primary_key=True)
+    # Нормализованное название (регистр, пробелы, юникод) для поиска подстроки
+    search_key = Column(String, nullable=False)
+    search_count = Column(Integer, nullable=False, default=0)
+    last_searched = Column(DateTime(timezone=True))
+    # Координаты места и последнее название, по которому его искали, - для
+    # прогрева кэша теми же ключами, что и у запросов пользователей
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geocode_query = Column(String)
+    
+    __table_args__ = (
+        Index("ix_city_search_stats_search_count", search_count.desc()),
+        # В PostgreSQL - триграммный GIN-индекс для LIKE '%...%'
+        Index(
+            "ix_city_search_stats_search_key_trgm",
+            search_key,
+            postgresql_using="gin",
+            postgresql_ops={"search_key": "gin_trgm_ops"}
+        ),
+    )
+
+class DailySearchStats(Base):
+    __tablename__ = "daily_search_stats"
+    
+    # День по UTC. Итоги считаются суммой по дням, без общей строки-счетчика,
+    # которую обновляла бы каждая транзакция
+    date = Column(Date, primary_key=True)
+    searches = Column(Integer, nullable=False, default=0)
+    new_users = Column(Integer, nullable=False, default=0)
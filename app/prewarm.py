@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.circuit_breaker import CLOSED
+from app.database import AsyncSessionLocal
+from app.models import CitySearchStats
+from app.tracing import span
+from app.weather_service import WeatherService, weather_service
+
+logger = logging.getLogger(__name__)
+
+class CachePrewarmer:
+    """Фоновое обновление кэша для самых популярных городов
+
+    Раз в interval секунд (со случайным отклонением до jitter, чтобы копии
+    приложения не обращались к API одновременно) берет top_n городов из
+    сводной статистики и обновляет их координаты и погоду, если записи
+    устареют до следующего прохода. Запросы идут с фоновым приоритетом
+    и не отнимают квоту у пользователей; пока цепь к API разомкнута,
+    проход пропускается.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        service: WeatherService = weather_service,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        interval: Optional[float] = None,
+        top_n: Optional[int] = None,
+        jitter: Optional[float] = None
+    ):
+        if enabled is None:
+            enabled = os.getenv("CACHE_PREWARM", "false").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.service = service
+        self.session_factory = session_factory
+        self.interval = interval or float(os.getenv("CACHE_PREWARM_INTERVAL", "300"))
+        self.top_n = top_n or int(os.getenv("CACHE_PREWARM_TOP", "20"))
+        self.jitter = jitter if jitter is not None else float(os.getenv("CACHE_PREWARM_JITTER", "0.2"))
+
+        self._task: Optional[asyncio.Task] = None
+
+        # Счетчики для мониторинга
+        self.runs = 0
+        self.skipped_runs = 0
+        self.refreshed = 0
+        self.fresh = 0
+        self.failures = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_duration: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def lead_time(self) -> float:
+        """Обновлять записи, которые устареют раньше следующего прохода"""
+        return self.interval * (1 + self.jitter) + 30
+
+    async def start(self):
+        """Запустить фоновое обновление (если режим включен)"""
+        if not self.enabled or self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить фоновое обновление"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def _next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run(self):
+        """Цикл обновления: первый проход сразу после старта"""
+        while True:
+            try:
+                with span("cache.prewarm"):
+                    await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error("Ошибка прогрева кэша: %s", e)
+            await asyncio.sleep(self._next_delay())
+
+    async def _top_cities(self) -> List[Any]:
+        """Популярные места с координатами и названием для геокодера
+        
+        Отображаемое название ("Moscow, Moscow, RU") не подходит ни как ключ
+        кэша, ни как запрос к геокодеру, поэтому места без этих данных
+        (записанные до их появления) пропускаются.
+        """
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(
+                    CitySearchStats.city,
+                    CitySearchStats.geocode_query,
+                    CitySearchStats.latitude,
+                    CitySearchStats.longitude
+                ).where(
+                    or_(CitySearchStats.latitude.isnot(None), CitySearchStats.geocode_query.isnot(None))
+                ).order_by(
+                    CitySearchStats.search_count.desc()
+                ).limit(self.top_n)
+            )
+            return list(result)
+
+    async def run_once(self):
+        """Один проход по популярным городам"""
+        if self.service.circuit_breaker.state != CLOSED:
+            self.skipped_runs += 1
+            return
+
+        started = time.monotonic()
+        for city in await self._top_cities():
+            try:
+                if await self.service.prewarm_city(
+                    self.lead_time, city.geocode_query, city.latitude, city.longitude
+                ):
+                    self.refreshed += 1
+                else:
+                    self.fresh += 1
+            except Exception as e:
+                self.failures += 1
+                logger.warning("Ошибка прогрева кэша для %s: %s", city.city, e)
+
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_duration = time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика прогрева кэша"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "interval": self.interval,
+            "top_n": self.top_n,
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "refreshed": self.refreshed,
+            "fresh": self.fresh,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_run_duration": (
+                round(self.last_run_duration, 3) if self.last_run_duration is not None else None
+            )
+        }
+
+# Создаем глобальный экземпляр прогрева кэша
+cache_prewarmer = CachePrewarmer()
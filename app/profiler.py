@@ -0,0 +1,248 @@
+import asyncio
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Стек - кортеж подписей кадров от корня к листу
+Stack = Tuple[str, ...]
+
+_labels: Dict[Any, str] = {}
+
+def _frame_label(code) -> str:
+    """Подпись кадра: функция и файл относительно sys.path (кэшируется по коду)"""
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for path in sorted(sys.path, key=len, reverse=True):
+            if path and filename.startswith(path + os.sep):
+                filename = filename[len(path) + 1:]
+                break
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+def _frame_stack(frame, stop=None) -> Stack:
+    """Стек от корня потока до frame (или от кадра stop, если он в стеке)"""
+    frames = []
+    while frame is not None:
+        frames.append(_frame_label(frame.f_code))
+        if frame is stop:
+            break
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+def _await_stack(coro) -> Stack:
+    """Стек приостановленной корутины по цепочке await"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(_frame_label(frame.f_code))
+        awaited = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if awaited is not None and not hasattr(awaited, "cr_frame") and not hasattr(awaited, "gi_frame"):
+            # Ожидание future/задачи - лист стека
+            frames.append(f"<await {type(awaited).__name__}>")
+            break
+        coro = awaited
+    return tuple(frames)
+
+def task_sampler(task: asyncio.Task, loop_thread_id: int) -> Callable[[], List[Stack]]:
+    """Сэмплы одной задачи: стек потока цикла, пока задача выполняется,
+    и цепочка await, пока она ждет (сеть, БД, пул потоков)"""
+    coro = task.get_coro()
+
+    def sample() -> List[Stack]:
+        if task.done():
+            return []
+        if getattr(coro, "cr_running", False):
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is not None:
+                return [_frame_stack(frame, stop=coro.cr_frame)]
+        return [_await_stack(coro)]
+    return sample
+
+def threads_sampler(exclude: Iterable[int] = ()) -> Callable[[], List[Stack]]:
+    """Сэмплы всех потоков процесса (кроме exclude), с именем потока в корне"""
+    excluded = set(exclude)
+
+    def sample() -> List[Stack]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return [
+            (f"thread {names.get(thread_id, thread_id)}",) + _frame_stack(frame)
+            for thread_id, frame in sys._current_frames().items()
+            if thread_id not in excluded and thread_id != threading.get_ident()
+        ]
+    return sample
+
+class Profile:
+    """Собранные сэмплы: число попаданий каждого стека"""
+
+    def __init__(self, description: str, interval: float):
+        self.description = description
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def add(self, stacks: List[Stack]):
+        self.samples += 1
+        for stack in stacks:
+            if stack:
+                self.stacks[stack] += 1
+
+    def folded(self) -> str:
+        """Профиль в формате folded stacks (flamegraph.pl, speedscope, inferno)"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "description": self.description,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 4),
+            "samples": self.samples,
+            "interval": self.interval
+        }
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер: фоновый поток раз в interval секунд снимает стеки
+
+    Работает только по запросу - для одного HTTP-запроса или на заданное
+    время; без активного профилирования накладных расходов нет.
+    """
+
+    def __init__(self, sample: Callable[[], List[Stack]], description: str, interval: float):
+        self.profile = Profile(description, interval)
+        self._sample = sample
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stopped.set()
+        self._thread.join()
+        self.profile.duration = time.perf_counter() - self._started
+        return self.profile
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.profile.add(self._sample())
+
+class ProfileStore:
+    """Последние профили в памяти и настройки доступа к профилированию
+
+    Профилирование включено, только если задан PROFILING_TOKEN: токен
+    передается в заголовке X-Profile-Token.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        interval: Optional[float] = None,
+        keep: Optional[int] = None,
+        max_duration: Optional[float] = None
+    ):
+        self.token = token if token is not None else os.getenv("PROFILING_TOKEN") or None
+        self.interval = interval or float(os.getenv("PROFILING_INTERVAL", "0.005"))
+        self.keep = keep or int(os.getenv("PROFILING_KEEP", "20"))
+        self.max_duration = max_duration or float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        # Заголовок приходит в latin-1, а compare_digest для str принимает только ASCII
+        return (
+            self.enabled and token is not None
+            and hmac.compare_digest(token.encode(), self.token.encode())
+        )
+
+    def save(self, profile: Profile) -> str:
+        profile_id = str(next(self._ids))
+        self._profiles[profile_id] = profile
+        while len(self._profiles) > self.keep:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{"id": profile_id, **profile.summary()} for profile_id, profile in self._profiles.items()]
+
+    async def profile_window(self, seconds: float) -> Profile:
+        """Профиль всех потоков процесса за seconds секунд (не больше max_duration)"""
+        seconds = min(seconds, self.max_duration)
+        profiler = SamplingProfiler(threads_sampler(), f"window {seconds:g}s", self.interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = profiler.stop()
+        return profile
+
+# Создаем глобальное хранилище профилей
+profile_store = ProfileStore()
+
+class ProfilingMiddleware:
+    """ASGI middleware: профиль отдельного запроса с заголовком X-Profile-Token
+
+    В профиль попадает все, что выполняет задача запроса: зависимости,
+    обработчик, обращения к погодному API и БД, рендеринг шаблона и
+    сериализация ответа. Идентификатор профиля возвращается в заголовке
+    X-Profile-Id, сам профиль - GET /api/debug/profiles/{id}.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.store.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        token = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"x-profile-token"), None)
+        if not self.store.authorized(token):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(
+            task_sampler(asyncio.current_task(), threading.get_ident()),
+            f"{scope['method']} {scope['path']}",
+            self.store.interval
+        )
+        profile_id = None
+
+        async def send_wrapper(message):
+            nonlocal profile_id
+            if message["type"] == "http.response.start":
+                # Профиль охватывает обработку до начала ответа
+                profile_id = self.store.save(profiler.stop())
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile_id is None:
+                self.store.save(profiler.stop())
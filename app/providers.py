@@ -0,0 +1,107 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+# Запрос к провайдеру: URL и параметры GET
+ProviderRequest = Tuple[str, Dict[str, Any]]
+
+class WeatherProvider(ABC):
+    """Источник данных о погоде: геокодирование и текущая погода
+
+    Провайдер только описывает HTTP-запросы и разбирает ответы в общий
+    формат. Сами запросы (пул соединений, квота, circuit breaker, кэши)
+    выполняет WeatherService.
+
+    Место геокодера: name, latitude, longitude, country, state.
+    Наблюдение погоды: temperature, feels_like, humidity, wind_speed,
+    description, name, country.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def geocode_request(self, query: str, limit: int) -> ProviderRequest:
+        ...
+
+    @abstractmethod
+    def parse_geocode(self, data: Any) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def weather_request(self, latitude: float, longitude: float) -> ProviderRequest:
+        ...
+
+    @abstractmethod
+    def parse_weather(self, data: Any) -> Dict[str, Any]:
+        ...
+
+class OpenWeatherMapProvider(WeatherProvider):
+    """OpenWeatherMap: Geocoding API и Current Weather Data"""
+
+    name = "openweathermap"
+
+    def __init__(self, api_key: Optional[str], base_url: str = "https://api.openweathermap.org"):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.geocoding_url = f"{self.base_url}/geo/1.0/direct"
+        self.weather_url = f"{self.base_url}/data/2.5/weather"
+
+    def geocode_request(self, query: str, limit: int) -> ProviderRequest:
+        return self.geocoding_url, {"q": query, "limit": limit, "appid": self.api_key}
+
+    def parse_geocode(self, data: Any) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": place["name"],
+                "latitude": place["lat"],
+                "longitude": place["lon"],
+                "country": place.get("country", ""),
+                "state": place.get("state", "")
+            }
+            for place in data or []
+        ]
+
+    def weather_request(self, latitude: float, longitude: float) -> ProviderRequest:
+        return self.weather_url, {
+            "lat": latitude,
+            "lon": longitude,
+            "appid": self.api_key,
+            "units": "metric",  # Celsius
+            "lang": "ru"
+        }
+
+    def parse_weather(self, data: Any) -> Dict[str, Any]:
+        main = data["main"]
+        return {
+            "temperature": main["temp"],
+            "feels_like": main["feels_like"],
+            "humidity": main["humidity"],
+            "wind_speed": data["wind"].get("speed", 0),
+            "description": data["weather"][0]["description"],
+            "name": data.get("name"),
+            "country": data.get("sys", {}).get("country")
+        }
+
+class MockProvider(OpenWeatherMapProvider):
+    """Локальная заглушка app.mock_provider: API OpenWeatherMap, ключ не проверяется"""
+
+    name = "mock"
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8090"):
+        super().__init__(api_key="mock", base_url=base_url)
+
+def create_provider(name: Optional[str] = None) -> WeatherProvider:
+    """Провайдер из настроек WEATHER_PROVIDER
+
+    openweathermap - настоящий API (WEATHER_API_BASE_URL переопределяет адрес),
+    mock - локальная заглушка app.mock_provider по адресу MOCK_PROVIDER_URL.
+    """
+    name = (name or os.getenv("WEATHER_PROVIDER", "openweathermap")).lower()
+    if name == "openweathermap":
+        return OpenWeatherMapProvider(
+            api_key=os.getenv("OPENWEATHER_API_KEY"),
+            base_url=os.getenv("WEATHER_API_BASE_URL", "https://api.openweathermap.org")
+        )
+    if name == "mock":
+        return MockProvider(base_url=os.getenv("MOCK_PROVIDER_URL", "http://127.0.0.1:8090"))
+    raise ValueError(f"Неизвестный провайдер погоды: {name}")
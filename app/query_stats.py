@@ -0,0 +1,114 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class QueryStats:
+    """SQL-запросы, выполненные за время запроса или блока кода
+
+    rows - сумма rowcount драйвера: затронутые строки для INSERT/UPDATE/DELETE,
+    для SELECT - прочитанные строки там, где драйвер их сообщает
+    (psycopg2, asyncpg; SQLite - нет).
+    """
+
+    def __init__(self, keep_statements: bool = False):
+        self.statements = 0
+        self.rows = 0
+        self.duration = 0.0
+        # Тексты запросов - для сообщения о превышении бюджета в тестах
+        self.statement_log: Optional[List[str]] = [] if keep_statements else None
+
+    def record(self, statement: str, rowcount: int, duration: float):
+        self.statements += 1
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+        self.duration += duration
+        if self.statement_log is not None:
+            self.statement_log.append(" ".join(statement.split()))
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing"""
+        return (
+            f'db;dur={self.duration * 1000:.2f};'
+            f'desc="{self.statements} queries, {self.rows} rows"'
+        )
+
+# Статистика текущего запроса (None - учет выключен)
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+@contextmanager
+def track_queries(keep_statements: bool = False) -> Iterator[QueryStats]:
+    """Собрать статистику запросов, выполненных внутри блока в текущем контексте"""
+    stats = QueryStats(keep_statements)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+@contextmanager
+def count_queries(*engines: Engine) -> Iterator[QueryStats]:
+    """Собрать статистику всех запросов движков внутри блока, из любого потока
+
+    Для тестов: TestClient выполняет приложение в другом потоке, куда
+    контекст теста не передается.
+    """
+    stats = QueryStats(keep_statements=True)
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_count_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_count_started", time.perf_counter())
+        stats.record(statement, cursor.rowcount, time.perf_counter() - started)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before)
+        event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield stats
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before)
+            event.remove(engine, "after_cursor_execute", after)
+
+class QueryStatsMiddleware:
+    """ASGI middleware: число, строки и время SQL-запросов в заголовке Server-Timing
+
+    Включается QUERY_STATS (по умолчанию - вместе с DEBUG). Выключенный
+    middleware только передает запрос дальше.
+    """
+
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        if enabled is None:
+            enabled = os.getenv("QUERY_STATS", os.getenv("DEBUG", "false")).lower() in ("1", "true", "yes")
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        with track_queries() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    total = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((
+                        b"server-timing",
+                        f"{stats.server_timing()}, app;dur={total:.2f}".encode("latin-1")
+                    ))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
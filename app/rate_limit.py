@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+class Priority(IntEnum):
+    """Классы приоритета запросов к внешнему API (меньше - важнее)"""
+    USER = 0
+    AUTOCOMPLETE = 1
+    BACKGROUND = 2
+
+class RateLimitExceeded(Exception):
+    """Разрешение на запрос не получено до дедлайна"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Лимит запросов исчерпан, повторите через {retry_after:.1f} с")
+        self.retry_after = retry_after
+
+class TokenBucketLimiter:
+    """Token bucket с очередью ожидания по приоритетам
+
+    Бакет пополняется со скоростью rate токенов в секунду до capacity.
+    Если токенов нет, запрос встает в очередь: следующий токен получает
+    ожидающий с наивысшим приоритетом (при равном - пришедший раньше).
+    Ожидание ограничено дедлайном своего класса приоритета, после чего
+    acquire выбрасывает RateLimitExceeded.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        max_wait: Optional[Dict[Priority, float]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait or {}
+        self._clock = clock
+
+        self._tokens = capacity
+        self._updated = clock()
+        # Пауза после ответа 429 от API: до этого момента токены не выдаются
+        self._paused_until = 0.0
+
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Счетчики для мониторинга
+        self.granted = {priority: 0 for priority in Priority}
+        self.rejected = {priority: 0 for priority in Priority}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = self._clock()
+        if now >= self._paused_until:
+            # Во время паузы токены не копятся, чтобы после нее не было всплеска
+            elapsed = now - max(self._updated, self._paused_until)
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """Через сколько секунд появится токен"""
+        now = self._clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _try_take(self) -> bool:
+        self._refill()
+        if self._delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self, priority: Priority = Priority.USER, timeout: Optional[float] = None):
+        """Дождаться разрешения на запрос (не дольше timeout или дедлайна приоритета)"""
+        if not self.enabled:
+            return
+
+        if not self._waiters and self._try_take():
+            self.granted[priority] += 1
+            return
+
+        if timeout is None:
+            timeout = self.max_wait.get(priority)
+        if timeout is not None and self._delay() > timeout and not self._waiters:
+            # Токен заведомо не успеет появиться - не занимаем место в очереди
+            self.rejected[priority] += 1
+            raise RateLimitExceeded(self._delay())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wake_dispatcher()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done() or future.cancelled():
+                future.cancel()
+                self.rejected[priority] += 1
+                raise RateLimitExceeded(self._delay())
+            # Токен выдан одновременно с истечением дедлайна - используем его
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        self.granted[priority] += 1
+
+    def _wake_dispatcher(self):
+        dispatcher = self._dispatcher
+        if (
+            dispatcher is None or dispatcher.done()
+            or dispatcher.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Раздавать токены ожидающим по мере пополнения бакета"""
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                # Ожидающий ушел по дедлайну или был отменен
+                heapq.heappop(self._waiters)
+                continue
+
+            if self._try_take():
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+
+            await asyncio.sleep(self._delay())
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (API ответил 429)"""
+        self._refill()
+        self._tokens = 0
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние лимитера"""
+        self._refill()
+        queued = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[Priority(priority).name.lower()] += 1
+        return {
+            "enabled": self.enabled,
+            "rate_per_minute": self.rate * 60,
+            "capacity": self.capacity,
+            "tokens": round(self._tokens, 2),
+            "paused_for": round(max(0.0, self._paused_until - self._clock()), 2),
+            "queued": queued,
+            "granted": {priority.name.lower(): count for priority, count in self.granted.items()},
+            "rejected": {priority.name.lower(): count for priority, count in self.rejected.items()}
+        }
@@ -0,0 +1,32 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Данные текущего запроса. Словарь создается middleware на каждый запрос,
+# поэтому он виден всем зависимостям и обработчику этого запроса и
+# недоступен параллельным запросам
+_request_cache: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_cache", default=None)
+
+def request_cache() -> Optional[Dict[str, Any]]:
+    """Кэш текущего запроса (None - вызов вне RequestScopeMiddleware)"""
+    return _request_cache.get()
+
+class RequestScopeMiddleware:
+    """ASGI middleware, открывающий кэш на время одного запроса
+
+    В отличие от BaseHTTPMiddleware не оборачивает запрос в отдельную задачу
+    и потоки ответа, а кэш очищается и при исключении в обработчике.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_cache.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_cache.reset(token)
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone, date
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.sql import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import normalize_city_name
+from app.database import upsert_insert
+from app.models import CitySearchStats, DailySearchStats
+
+def utc_date(value: datetime) -> date:
+    """День по UTC, в котором сводные таблицы учитывают событие
+
+    Время без часового пояса считается временем UTC (так его хранит SQLite).
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+def build_rollup_statements(dialect_name: str, records: List[Dict[str, Any]]) -> list:
+    """Подготовить upsert-запросы к сводным таблицам для новых записей истории
+
+    Записи сначала агрегируются в памяти, поэтому пачка из любого числа поисков
+    дает не больше двух запросов. Ключи сортируются, чтобы параллельные
+    транзакции блокировали строки в одном порядке.
+    """
+    now = datetime.now(timezone.utc)
+    cities: Dict[str, Tuple[int, datetime]] = {}
+    # Последние известные координаты и название для поиска по каждому городу
+    locations: Dict[str, Dict[str, Any]] = {}
+    days: Dict[date, int] = {}
+
+    for record in records:
+        searched_at = record.get("searched_at") or now
+        day = utc_date(searched_at)
+        days[day] = days.get(day, 0) + 1
+
+        city = record.get("city")
+        if city is None:
+            continue
+        count, last_searched = cities.get(city, (0, searched_at))
+        cities[city] = (count + 1, max(last_searched, searched_at))
+        location = locations.setdefault(city, {"latitude": None, "longitude": None, "geocode_query": None})
+        if record.get("latitude") is not None and record.get("longitude") is not None:
+            location["latitude"] = record["latitude"]
+            location["longitude"] = record["longitude"]
+        if record.get("geocode_query"):
+            location["geocode_query"] = record["geocode_query"]
+
+    statements = []
+
+    if cities:
+        statement = upsert_insert(dialect_name, CitySearchStats).values([
+            {
+                "city": city,
+                "search_key": normalize_city_name(city),
+                "search_count": count,
+                "last_searched": last_searched,
+                **locations[city]
+            }
+            for city, (count, last_searched) in sorted(cities.items())
+        ])
+        statements.append(statement.on_conflict_do_update(
+            index_elements=[CitySearchStats.city],
+            set_={
+                "search_key": statement.excluded.search_key,
+                "search_count": CitySearchStats.search_count + statement.excluded.search_count,
+                "last_searched": case(
+                    (
+                        CitySearchStats.last_searched >= statement.excluded.last_searched,
+                        CitySearchStats.last_searched
+                    ),
+                    else_=statement.excluded.last_searched
+                ),
+                # Поиск без координат или по координатам не затирает известные значения
+                "latitude": func.coalesce(statement.excluded.latitude, CitySearchStats.latitude),
+                "longitude": func.coalesce(statement.excluded.longitude, CitySearchStats.longitude),
+                "geocode_query": func.coalesce(statement.excluded.geocode_query, CitySearchStats.geocode_query)
+            }
+        ))
+
+    if days:
+        statement = upsert_insert(dialect_name, DailySearchStats).values([
+            {"date": day, "searches": count}
+            for day, count in sorted(days.items())
+        ])
+        statements.append(statement.on_conflict_do_update(
+            index_elements=[DailySearchStats.date],
+            set_={"searches": DailySearchStats.searches + statement.excluded.searches}
+        ))
+
+    return statements
+
+def build_new_user_statement(dialect_name: str):
+    """Upsert счетчика новых пользователей за текущий день"""
+    statement = upsert_insert(dialect_name, DailySearchStats).values(
+        date=datetime.now(timezone.utc).date(), new_users=1
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[DailySearchStats.date],
+        set_={"new_users": DailySearchStats.new_users + 1}
+    )
+
+def search_totals() -> Select:
+    """Всего поисков и пользователей: сумма по дням, без сканирования истории и users"""
+    return select(
+        func.coalesce(func.sum(DailySearchStats.searches), 0),
+        func.coalesce(func.sum(DailySearchStats.new_users), 0)
+    )
+
+async def update_search_rollups(db: AsyncSession, records: List[Dict[str, Any]]):
+    """Обновить сводные таблицы в текущей транзакции"""
+    dialect_name = db.get_bind().dialect.name
+    for statement in build_rollup_statements(dialect_name, records):
+        await db.execute(statement)
+
+def matching_cities(query: str) -> Select:
+    """Города из сводной таблицы, содержащие подстроку query (без учета регистра)
+
+    Таблица хранит каждый город один раз, а поиск идет по нормализованному
+    ключу с триграммным индексом (в SQLite - обычный LIKE).
+    """
+    return select(CitySearchStats.city).where(
+        CitySearchStats.search_key.contains(normalize_city_name(query), autoescape=True)
+    )
+
@@ -0,0 +1,26 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from app.weather_service import parse_location_id
+
+class WeatherBatchItem(BaseModel):
+    """Элемент пакетного запроса: название города, координаты или location_id"""
+    city: Optional[str] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    location_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_location(self):
+        if self.city is not None:
+            if not self.city.strip():
+                raise ValueError("Название города не может быть пустым")
+        elif self.location_id is not None:
+            if parse_location_id(self.location_id) is None:
+                raise ValueError("Некорректный location_id")
+        elif self.lat is None or self.lon is None:
+            raise ValueError("Нужно указать city, lat и lon или location_id")
+        return self
+
+class WeatherBatchRequest(BaseModel):
+    """Пакетный запрос погоды"""
+    items: List[WeatherBatchItem] = Field(..., min_length=1)
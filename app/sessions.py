@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import NamedTuple, Optional
+
+# Значения-заглушки из примеров конфигурации
+_PLACEHOLDER_KEYS = {"change-me", "changeme"}
+
+class SessionUser(NamedTuple):
+    """Пользователь, восстановленный из подписанной cookie (без обращения к БД)"""
+    id: int
+    session_id: str
+
+class SessionCookies:
+    """Подписанные cookie сессии
+
+    Cookie хранит id пользователя и session_id, подписанные HMAC-SHA256:
+    "<user_id>.<session_id>.<подпись>". Проверка подписи заменяет поиск
+    пользователя в таблице users.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, secret_key: Optional[str] = None):
+        if enabled is None:
+            enabled = os.getenv("SIGNED_SESSIONS", "false").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+
+        secret_key = secret_key or os.getenv("SESSION_SECRET_KEY")
+        if self.enabled and (not secret_key or secret_key in _PLACEHOLDER_KEYS):
+            # Подпись - единственная проверка cookie: с известным ключом можно
+            # подделать cookie любого пользователя и читать его историю
+            raise ValueError("SIGNED_SESSIONS включен, но SESSION_SECRET_KEY не задан или не изменен")
+        if not secret_key:
+            # Подписанные cookie выключены - ключ нужен только для sign/load
+            secret_key = secrets.token_urlsafe(32)
+        self._secret_key = secret_key.encode()
+
+    def _signature(self, payload: str) -> str:
+        digest = hmac.new(self._secret_key, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def sign(self, user_id: int, session_id: str) -> str:
+        """Значение подписанной cookie"""
+        payload = f"{user_id}.{session_id}"
+        return f"{payload}.{self._signature(payload)}"
+
+    def load(self, value: Optional[str]) -> Optional[SessionUser]:
+        """Пользователь из cookie (None - cookie нет, она старого формата или подделана)"""
+        if not value:
+            return None
+        parts = value.split(".")
+        if len(parts) != 3:
+            return None
+
+        user_id, session_id, signature = parts
+        # compare_digest для str принимает только ASCII, а cookie присылает клиент
+        expected = self._signature(f"{user_id}.{session_id}")
+        if not hmac.compare_digest(signature.encode(), expected.encode()):
+            return None
+        try:
+            return SessionUser(id=int(user_id), session_id=session_id)
+        except ValueError:
+            return None
+
+    def cookie_value(self, user) -> str:
+        """Значение cookie для пользователя в текущем режиме"""
+        if self.enabled:
+            return self.sign(user.id, user.session_id)
+        return user.session_id
+
+# Создаем глобальный экземпляр
+session_cookies = SessionCookies()
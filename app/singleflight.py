@@ -0,0 +1,52 @@
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """Объединение одновременных одинаковых запросов в один
+
+    Первый вызов с ключом запускает задачу, остальные вызовы с тем же ключом
+    ждут ее результат. Исключение задачи получают все ожидающие. Отмена
+    одного из ожидающих не отменяет общую задачу для остальных.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+        # Счетчики для мониторинга
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить func, либо дождаться уже идущего вызова с тем же ключом"""
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._in_flight[key] = future
+            future.add_done_callback(partial(self._forget, key))
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        """Убрать завершенную задачу, чтобы следующий вызов пошел заново"""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        # Забираем исключение, чтобы asyncio не ругался, если все ожидающие отменены
+        if not future.cancelled():
+            future.exception()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика объединения запросов"""
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "shared": self.shared
+        }
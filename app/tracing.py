@@ -0,0 +1,407 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Виды спанов и коды статуса в формате OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 в OTLP JSON передается строкой
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+class Span:
+    """Этап обработки запроса: имя, время, атрибуты и связь с родителем"""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, message: str = ""):
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        self.set_error(f"{type(exc).__name__}: {exc}")
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": _otlp_attributes({
+                "exception.type": type(exc).__name__,
+                "exception.message": str(exc)
+            })
+        })
+
+    @property
+    def duration(self) -> float:
+        """Длительность в секундах (до текущего момента, если спан не завершен)"""
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Спан в формате OTLP JSON"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": self.events,
+            "status": {"code": self.status_code, "message": self.status_message}
+        }
+
+class _NoopSpan:
+    """Спан при выключенной трассировке: атрибуты никуда не пишутся"""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, message: str = ""):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+# Текущий спан и идентификатор запроса для логов
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """trace_id и span_id из заголовка W3C traceparent (None - заголовка нет или он некорректен)"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, span_id = parts[1].lower(), parts[2].lower()
+    try:
+        int(trace_id, 16), int(span_id, 16)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id
+
+class FileSpanExporter:
+    """Запись спанов в файл: по строке OTLP JSON на пачку
+    (формат file exporter коллектора OpenTelemetry)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def export(self, payload: Dict[str, Any]):
+        await asyncio.to_thread(self._write, json.dumps(payload, ensure_ascii=False))
+
+    async def shutdown(self):
+        pass
+
+class OtlpHttpSpanExporter:
+    """Отправка спанов в коллектор OpenTelemetry по OTLP/HTTP (JSON)"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def export(self, payload: Dict[str, Any]):
+        response = await self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    async def shutdown(self):
+        await self._client.aclose()
+
+def create_exporter(name: Optional[str] = None):
+    """Экспортер по TRACING_EXPORTER: file, otlp или none (трассировка выключена)"""
+    name = (name if name is not None else os.getenv("TRACING_EXPORTER", "none")).lower()
+    if name in ("", "none"):
+        return None
+    if name == "file":
+        return FileSpanExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    if name == "otlp":
+        return OtlpHttpSpanExporter(os.getenv("TRACING_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces"))
+    raise ValueError(f"Неизвестный экспортер трассировки: {name}")
+
+class Tracer:
+    """Трассировка этапов обработки запросов в формате OpenTelemetry
+
+    Завершенные спаны копятся в памяти (не больше max_queue_size, лишние
+    отбрасываются) и раз в flush_interval секунд отправляются экспортеру
+    пачкой. Без экспортера трассировка выключена и span() ничего не стоит.
+    """
+
+    def __init__(
+        self,
+        exporter=None,
+        service_name: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        max_queue_size: Optional[int] = None
+    ):
+        self.exporter = exporter if exporter is not None else create_exporter()
+        self.service_name = service_name or os.getenv("TRACING_SERVICE_NAME", "skypeek")
+        self.flush_interval = flush_interval or float(os.getenv("TRACING_FLUSH_INTERVAL", "5"))
+        self.max_queue_size = max_queue_size or int(os.getenv("TRACING_QUEUE_SIZE", "10000"))
+
+        self._pending: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # Счетчики для мониторинга
+        self.finished = 0
+        self.dropped = 0
+        self.exported = 0
+        self.export_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Optional[Tuple[str, str]] = None
+    ) -> Span:
+        """Новый спан - дочерний к текущему или к parent (trace_id, span_id)"""
+        if parent is None:
+            current = _current_span.get()
+            if current is not None:
+                parent = (current.trace_id, current.span_id)
+        if parent is None:
+            return Span(name, f"{random.getrandbits(128):032x}", None, kind, attributes)
+        return Span(name, parent[0], parent[1], kind, attributes)
+
+    def end_span(self, span: Span):
+        span.end_time = time.time_ns()
+        self.finished += 1
+        if len(self._pending) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self._pending.append(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Optional[Tuple[str, str]] = None
+    ) -> Iterator[Any]:
+        """Спан вокруг блока кода; исключение помечает спан ошибкой"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        span = self.start_span(name, attributes, kind, parent)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "skypeek"},
+                    "spans": [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+
+    async def flush(self):
+        """Отправить накопленные спаны экспортеру"""
+        if not self.enabled or not self._pending:
+            return
+        spans, self._pending = self._pending, []
+        try:
+            await self.exporter.export(self._payload(spans))
+        except Exception as e:
+            self.export_failures += 1
+            logger.warning("Ошибка экспорта %d спанов: %s", len(spans), e)
+            return
+        self.exported += len(spans)
+
+    async def start(self):
+        """Запустить периодическую отправку спанов (если трассировка включена)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить отправку, отправив оставшиеся спаны"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self.enabled:
+            await self.exporter.shutdown()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика трассировки"""
+        return {
+            "enabled": self.enabled,
+            "exporter": type(self.exporter).__name__ if self.enabled else None,
+            "pending": len(self._pending),
+            "finished": self.finished,
+            "dropped": self.dropped,
+            "exported": self.exported,
+            "export_failures": self.export_failures
+        }
+
+# Создаем глобальный трассировщик
+tracer = Tracer()
+
+def span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    kind: int = SPAN_KIND_INTERNAL
+):
+    """Спан глобального трассировщика вокруг блока кода"""
+    return tracer.span(name, attributes, kind)
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет к записям лога request_id и trace_id текущего запроса"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or "-"
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span is not None else "-"
+        return True
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [request_id=%(request_id)s trace_id=%(trace_id)s] %(message)s"
+
+def configure_logging(level: Optional[str] = None):
+    """Формат логов приложения с request_id и trace_id (уровень - LOG_LEVEL)
+
+    Уже настроенные обработчики (например, из --log-config uvicorn) не
+    заменяются - к ним только добавляется фильтр с контекстом запроса.
+    """
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(format=LOG_FORMAT)
+    logging.getLogger("app").setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+    for handler in root.handlers:
+        if not any(isinstance(f, RequestContextFilter) for f in handler.filters):
+            handler.addFilter(RequestContextFilter())
+
+class TracingMiddleware:
+    """ASGI middleware: идентификатор запроса и корневой спан запроса
+
+    Идентификатор берется из заголовка X-Request-ID или создается, попадает
+    в логи и возвращается в ответе. Входящий traceparent продолжает трассу
+    вызывающего сервиса.
+    """
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:128] or uuid.uuid4().hex
+        request_token = _request_id.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                current.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    current.set_error()
+                response_headers = list(message.get("headers", []))
+                response_headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": response_headers}
+            await send(message)
+
+        parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        try:
+            with self.tracer.span(
+                f"{scope['method']} {scope['path']}",
+                {"http.method": scope["method"], "url.path": scope["path"], "http.request_id": request_id},
+                SPAN_KIND_SERVER,
+                parent
+            ) as current:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    # Имя спана - шаблон маршрута, как и метка метрик
+                    route = getattr(scope.get("route"), "path", None)
+                    if route is not None and isinstance(current, Span):
+                        current.name = f"{scope['method']} {route}"
+                        current.set_attribute("http.route", route)
+        finally:
+            _request_id.reset(request_token)
@@ -1,7 +1,26 @@
+import asyncio
+import logging
+import time
 import httpx
-from typing import Optional, Dict, Any
-from pydantic import BaseModel
+from typing import Optional, Callable, Dict, Any, List, Tuple
+from pydantic import BaseModel, Field
 from datetime import datetime
+from app.cache import TTLCache, normalize_city_name
+from app.circuit_breaker import CircuitBreaker
+from app.metrics import upstream_request_duration
+from app.exceptions import UpstreamError, UpstreamRateLimited, UpstreamRejected, UpstreamUnavailable
+from app.providers import ProviderRequest, WeatherProvider, create_provider
+from app.rate_limit import Priority, RateLimitExceeded, TokenBucketLimiter
+from app.singleflight import SingleFlight
+from app.tracing import SPAN_KIND_CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+# Маркер "город не найден" для негативного кэширования геокодирования
+_NOT_FOUND = object()
+
+# Ответы API, которые означают "не найдено" (например, пустой или кривой запрос)
+_NOT_FOUND_STATUSES = (400, 404)
 
 class WeatherData(BaseModel):
     """Модель данных о погоде"""
@@ -12,66 +31,515 @@ class WeatherData(BaseModel):
     wind_speed: float
     description: str
     timestamp: datetime
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    # Идентификатор места для повторных запросов без геокодирования
+    location_id: Optional[str] = None
+    # Погодный API недоступен, показаны последние известные данные на момент timestamp
+    stale: bool = False
+    # Название, по которому искали город (для прогрева кэша геокодирования; в ответ не входит)
+    query: Optional[str] = Field(default=None, exclude=True)
+
+def make_location_id(latitude: float, longitude: float) -> str:
+    """Стабильный идентификатор места: координаты, округленные до ~10 м"""
+    return f"{latitude:.4f},{longitude:.4f}"
+
+def parse_location_id(location_id: str) -> Optional[Tuple[float, float]]:
+    """Координаты из идентификатора места (None - некорректный идентификатор)"""
+    try:
+        latitude, longitude = (float(part) for part in location_id.split(","))
+    except ValueError:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Секунды из заголовка Retry-After (дату HTTP не поддерживаем)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
 
 class WeatherService:
     """Сервис для работы с погодным API"""
     
-    def __init__(self):
+    def __init__(self, provider: Optional[WeatherProvider] = None):
         import os
         from dotenv import load_dotenv
         
         load_dotenv()
         
-        self.api_key = os.getenv("OPENWEATHER_API_KEY")
-        self.weather_base_url = "https://api.openweathermap.org/data/2.5/weather"
-        self.geocoding_base_url = "https://api.openweathermap.org/geo/1.0/direct"
+        # Форматы запросов и ответов конкретного API (по умолчанию из WEATHER_PROVIDER)
+        self.provider = provider or create_provider()
+        
+        # Настройки пула соединений к погодному API
+        self.http_timeout = float(os.getenv("WEATHER_HTTP_TIMEOUT", "10"))
+        self.http_connect_timeout = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", "5"))
+        self.http_max_connections = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+        self.http_max_keepalive_connections = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+        self.http_keepalive_expiry = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.http2 = os.getenv("WEATHER_HTTP2", "false").lower() in ("1", "true", "yes")
+        
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Кэш геокодирования: координаты города не меняются, поэтому TTL большой,
+        # а "не найдено" храним недолго, чтобы опечатки не долбили геокодер
+        self.geocode_negative_ttl = float(os.getenv("GEOCODE_NEGATIVE_TTL", "300"))
+        self._geocode_cache = TTLCache(
+            maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("GEOCODE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+        )
+        
+        # Кэш текущей погоды по округленным координатам. OpenWeatherMap обновляет
+        # данные раз в ~10 минут; слегка устаревшие данные отдаем сразу
+        # и обновляем их в фоне
+        self.weather_cache_precision = int(os.getenv("WEATHER_CACHE_PRECISION", "2"))
+        self._weather_cache = TTLCache(
+            maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "5000")),
+            ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+            stale_ttl=float(os.getenv("WEATHER_CACHE_STALE_TTL", "300"))
+        )
+        self._refresh_tasks: Dict[Tuple[float, float], asyncio.Task] = {}
+        
+        # Названия мест по координатам (из геокодера и подсказок автодополнения),
+        # чтобы запрос по координатам показывал привычное название без
+        # обратного геокодирования
+        self._place_names = TTLCache(
+            maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("GEOCODE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+        )
+        
+        # Одновременные запросы одного города/координат идут в API один раз
+        # (фоновые - отдельно от пользовательских, см. _flight_key)
+        self._geocode_flight = SingleFlight()
+        self._weather_flight = SingleFlight()
+        
+        # Квота ключа API (запросов в минуту): запросы пользователей обслуживаются
+        # раньше автодополнения, а оно - раньше фоновых обновлений
+        self.rate_limiter = TokenBucketLimiter(
+            rate=float(os.getenv("WEATHER_RATE_LIMIT", "60")) / 60,
+            capacity=float(os.getenv("WEATHER_RATE_BURST", "10")),
+            max_wait={
+                Priority.USER: float(os.getenv("WEATHER_RATE_WAIT_USER", "3")),
+                Priority.AUTOCOMPLETE: float(os.getenv("WEATHER_RATE_WAIT_AUTOCOMPLETE", "0.5")),
+                Priority.BACKGROUND: float(os.getenv("WEATHER_RATE_WAIT_BACKGROUND", "30"))
+            }
+        )
+        # Пауза после 429 от API, если он не прислал Retry-After (секунды)
+        self.rate_limit_pause = float(os.getenv("WEATHER_RATE_LIMIT_PAUSE", "60"))
+        
+        # Общий дедлайн одного обращения к API: таймауты httpx действуют на каждую
+        # фазу отдельно, и медленный API держал бы запрос пользователя намного дольше
+        self.call_timeout = float(os.getenv("WEATHER_CALL_TIMEOUT", "4"))
+        # После серии ошибок API запросы сразу получают отказ, а через
+        # recovery секунд пробный запрос проверяет, ожил ли сервис
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("WEATHER_BREAKER_FAILURES", "5")),
+            recovery_timeout=float(os.getenv("WEATHER_BREAKER_RECOVERY", "30"))
+        )
+        # Последние известные данные о погоде: отдаются с пометкой stale,
+        # если API недоступен, а в основном кэше записи уже нет
+        self._last_known = TTLCache(
+            maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "5000")),
+            ttl=float(os.getenv("WEATHER_FALLBACK_TTL", str(3 * 60 * 60)))
+        )
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        """Создать HTTP-клиент с пулом соединений и keep-alive"""
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 недоступен (не установлен пакет h2), используется HTTP/1.1")
+                http2 = False
+        
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.http_timeout, connect=self.http_connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.http_max_connections,
+                max_keepalive_connections=self.http_max_keepalive_connections,
+                keepalive_expiry=self.http_keepalive_expiry
+            ),
+            http2=http2
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий HTTP-клиент сервиса: открывается в startup, закрывается в shutdown"""
+        if self._client is None:
+            # Клиент, созданный здесь, никто бы не закрыл
+            raise RuntimeError("HTTP-клиент погодного сервиса не открыт: startup не вызван или уже вызван shutdown")
+        return self._client
+    
+    async def startup(self):
+        """Открыть пул соединений при старте приложения"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+    
+    async def shutdown(self):
+        """Закрыть пул соединений при остановке приложения"""
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        if self._refresh_tasks:
+            await asyncio.gather(*self._refresh_tasks.values(), return_exceptions=True)
+        
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _request(
+        self,
+        operation: str,
+        url: str,
+        params: Dict[str, Any],
+        priority: Priority = Priority.USER
+    ) -> Any:
+        """GET к погодному API через circuit breaker
+        
+        Пока цепь разомкнута, запрос сразу завершается UpstreamUnavailable.
+        Отказом сервиса считаются только 5xx, таймауты, ошибки соединения и
+        общий дедлайн обращения: исчерпанная квота говорит о нашей нагрузке,
+        ответы 4xx и некорректное тело - о запросе, а не о доступности API.
+        operation (geocode, weather, autocomplete) - метка метрик.
+        """
+        with span(
+            f"upstream {operation}",
+            {"upstream.provider": self.provider.name, "upstream.operation": operation, "upstream.priority": priority.name},
+            SPAN_KIND_CLIENT
+        ) as current:
+            breaker = self.circuit_breaker
+            if not breaker.allow_request():
+                upstream_request_duration.observe(0.0, self.provider.name, operation, "circuit_open")
+                current.set_attribute("upstream.outcome", "circuit_open")
+                raise UpstreamUnavailable(
+                    "Погодный API временно отключен после серии ошибок",
+                    retry_after=breaker.retry_after() or None
+                )
+            
+            outcome = "error"
+            started = time.perf_counter()
+            try:
+                response = await self._send(url, params, priority)
+                outcome = "ok"
+            except UpstreamUnavailable:
+                outcome = "unavailable"
+                breaker.record_failure()
+                raise
+            except UpstreamRejected:
+                outcome = "rejected"
+                breaker.release()
+                raise
+            except UpstreamRateLimited:
+                outcome = "rate_limited"
+                breaker.release()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            finally:
+                upstream_request_duration.observe(
+                    time.perf_counter() - started, self.provider.name, operation, outcome
+                )
+                current.set_attribute("upstream.outcome", outcome)
+            
+            breaker.record_success()
+            # API ответил: тело не в JSON - ошибка ответа, но не отказ сервиса
+            try:
+                return response.json()
+            except ValueError as e:
+                raise UpstreamUnavailable(f"Погодный API вернул не JSON: {e}") from e
+    
+    async def _send(self, url: str, params: Dict[str, Any], priority: Priority) -> httpx.Response:
+        """GET к погодному API с учетом квоты
+        
+        Исчерпанная квота (своя или ответ 429) - UpstreamRateLimited,
+        сетевые ошибки, таймауты и ответы 5xx - UpstreamUnavailable,
+        остальные ответы 4xx - UpstreamRejected.
+        """
+        with span("upstream.rate_limit", {"upstream.priority": priority.name}):
+            try:
+                await self.rate_limiter.acquire(priority)
+            except RateLimitExceeded as e:
+                raise UpstreamRateLimited(retry_after=e.retry_after) from e
+        
+        try:
+            with span("upstream.http", {"url.full": url}, SPAN_KIND_CLIENT) as current:
+                response = await asyncio.wait_for(self.client.get(url, params=params), self.call_timeout)
+                current.set_attribute("http.status_code", response.status_code)
+            response.raise_for_status()
+        except asyncio.TimeoutError as e:
+            raise UpstreamUnavailable(f"Погодный API не ответил за {self.call_timeout:g} с") from e
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            if status_code == 429:
+                retry_after = _parse_retry_after(e.response.headers.get("Retry-After"))
+                self.rate_limiter.pause(retry_after or self.rate_limit_pause)
+                raise UpstreamRateLimited(retry_after=retry_after or self.rate_limit_pause) from e
+            if status_code >= 500:
+                raise UpstreamUnavailable(f"Погодный API ответил {status_code}") from e
+            raise UpstreamRejected(status_code, f"Погодный API отклонил запрос: {status_code}") from e
+        except httpx.TransportError as e:
+            raise UpstreamUnavailable(f"Погодный API недоступен: {e!r}") from e
+        
+        return response
+    
+    async def _call(
+        self,
+        operation: str,
+        request: ProviderRequest,
+        parse: Callable[[Any], Any],
+        priority: Priority = Priority.USER
+    ) -> Any:
+        """Запрос к API и разбор ответа провайдером
+        
+        Ответы 400 и 404 означают, что API не нашел запрошенное, - возвращается None.
+        Ответ, который провайдер не смог разобрать, - UpstreamUnavailable.
+        """
+        url, params = request
+        try:
+            data = await self._request(operation, url, params, priority)
+        except UpstreamRejected as e:
+            if e.status_code in _NOT_FOUND_STATUSES:
+                return None
+            raise
+        
+        try:
+            return parse(data)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise UpstreamUnavailable(f"Некорректный ответ погодного API: {e!r}") from e
     
     async def get_city_coordinates(self, city_name: str) -> Optional[Dict[str, Any]]:
-        """Получить координаты города по названию через OpenWeatherMap"""
+        """Получить координаты города по названию (с кэшированием)"""
+        with span("weather.geocode", {"city": city_name}) as current:
+            cache_key = normalize_city_name(city_name)
+            cached = self._geocode_cache.get(cache_key)
+            if cached is not None:
+                current.set_attribute("cache", "hit")
+                return None if cached is _NOT_FOUND else cached
+            
+            current.set_attribute("cache", "miss")
+            return await self._geocode_flight.do(
+                cache_key,
+                lambda: self._load_city_coordinates(city_name, cache_key)
+            )
+    
+    async def _load_city_coordinates(
+        self,
+        city_name: str,
+        cache_key: str,
+        priority: Priority = Priority.USER
+    ) -> Optional[Dict[str, Any]]:
+        """Запросить координаты у API и сохранить результат в кэш
+        
+        Ошибки API пробрасываются и не кэшируются - следующий запрос попробует снова.
+        """
+        coordinates = await self._fetch_city_coordinates(city_name, priority)
+        
+        if coordinates is None:
+            self._geocode_cache.set(cache_key, _NOT_FOUND, ttl=self.geocode_negative_ttl)
+        else:
+            self._geocode_cache.set(cache_key, coordinates)
+        return coordinates
+    
+    async def _fetch_city_coordinates(
+        self,
+        city_name: str,
+        priority: Priority = Priority.USER
+    ) -> Optional[Dict[str, Any]]:
+        """Запросить координаты города у геокодера (None - город не найден)"""
+        places = await self._call(
+            "geocode", self.provider.geocode_request(city_name, 1), self.provider.parse_geocode, priority
+        )
+        return places[0] if places else None
+    
+    def _coordinates_key(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        """Ключ кэша погоды: координаты, округленные до ~1 км"""
+        return (
+            round(latitude, self.weather_cache_precision),
+            round(longitude, self.weather_cache_precision)
+        )
+    
+    async def get_weather_by_coordinates(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        """Получить данные о погоде по координатам (с кэшированием)"""
+        weather_data, _ = await self._get_weather_observation(latitude, longitude)
+        return weather_data
+    
+    async def _get_weather_observation(
+        self,
+        latitude: float,
+        longitude: float
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[datetime]]:
+        """Данные о погоде и, если API недоступен, время последних известных данных
+        
+        Вторым элементом возвращается None для актуальных данных и время
+        получения для последних известных, отданных вместо ошибки API.
+        """
+        with span("weather.observation", {"latitude": latitude, "longitude": longitude}) as current:
+            cache_key = self._coordinates_key(latitude, longitude)
+            cached = self._weather_cache.get_stale(cache_key)
+            if cached is not None:
+                weather_data, is_stale = cached
+                current.set_attribute("cache", "stale_hit" if is_stale else "hit")
+                if is_stale:
+                    self._schedule_weather_refresh(cache_key, latitude, longitude)
+                return weather_data, None
+            
+            current.set_attribute("cache", "miss")
+            try:
+                return await self._load_weather(cache_key, latitude, longitude), None
+            except UpstreamError:
+                last_known = self._last_known.get(cache_key)
+                if last_known is None:
+                    raise
+                current.set_attribute("fallback", "last_known")
+                return last_known
+    
+    @staticmethod
+    def _flight_key(cache_key: Any, priority: Priority) -> Any:
+        """Ключ объединения запросов с учетом приоритета
+        
+        Фоновое обновление может ждать токен лимитера до дедлайна фонового
+        класса (WEATHER_RATE_WAIT_BACKGROUND). Присоединившись к нему, запрос
+        пользователя ждал бы столько же и получал бы его отказ, поэтому
+        фоновые запросы объединяются только между собой.
+        """
+        return (Priority.BACKGROUND, cache_key) if priority == Priority.BACKGROUND else cache_key
+    
+    async def _load_weather(
+        self,
+        cache_key: Tuple[float, float],
+        latitude: float,
+        longitude: float,
+        priority: Priority = Priority.USER
+    ) -> Optional[Dict[str, Any]]:
+        """Обновить погоду, объединяя одновременные запросы одних координат"""
+        return await self._weather_flight.do(
+            self._flight_key(cache_key, priority),
+            lambda: self._refresh_weather(cache_key, latitude, longitude, priority)
+        )
+    
+    def _schedule_weather_refresh(self, cache_key: Tuple[float, float], latitude: float, longitude: float):
+        """Запустить фоновое обновление устаревшей записи (не больше одного на ключ)"""
+        if cache_key in self._refresh_tasks:
+            return
+        
+        task = asyncio.create_task(self._background_refresh(cache_key, latitude, longitude))
+        self._refresh_tasks[cache_key] = task
+        task.add_done_callback(lambda _: self._refresh_tasks.pop(cache_key, None))
+    
+    async def _background_refresh(self, cache_key: Tuple[float, float], latitude: float, longitude: float):
+        """Фоновое обновление: с низким приоритетом, ошибки только логируются"""
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "q": city_name,
-                    "limit": 1,
-                    "appid": self.api_key
-                }
-                response = await client.get(self.geocoding_base_url, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
-                if not data:
-                    return None
-                
-                result = data[0]
-                return {
-                    "name": result["name"],
-                    "latitude": result["lat"],
-                    "longitude": result["lon"],
-                    "country": result.get("country", ""),
-                    "state": result.get("state", "")
-                }
+            with span("weather.background_refresh", {"latitude": latitude, "longitude": longitude}):
+                await self._load_weather(cache_key, latitude, longitude, Priority.BACKGROUND)
         except Exception as e:
-            print(f"Ошибка при получении координат для {city_name}: {e}")
+            logger.warning("Ошибка фонового обновления погоды %s: %s", cache_key, e)
+    
+    async def _refresh_weather(
+        self,
+        cache_key: Tuple[float, float],
+        latitude: float,
+        longitude: float,
+        priority: Priority = Priority.USER
+    ) -> Optional[Dict[str, Any]]:
+        """Запросить погоду у API и обновить кэш"""
+        weather_data = await self._fetch_weather(latitude, longitude, priority)
+        if weather_data is None:
             return None
+        self._weather_cache.set(cache_key, weather_data)
+        self._last_known.set(cache_key, (weather_data, datetime.now()))
+        return weather_data
     
-    async def get_weather_by_coordinates(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
-        """Получить данные о погоде по координатам через OpenWeatherMap"""
+    async def _fetch_weather(
+        self,
+        latitude: float,
+        longitude: float,
+        priority: Priority = Priority.USER
+    ) -> Optional[Dict[str, Any]]:
+        """Запросить текущую погоду у провайдера (None - API не знает такого места)"""
+        return await self._call(
+            "weather", self.provider.weather_request(latitude, longitude), self.provider.parse_weather, priority
+        )
+    
+    async def prewarm_city(
+        self,
+        lead_time: float,
+        query: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> bool:
+        """Обновить записи кэша популярного места, если они устареют в ближайшие
+        lead_time секунд. Запросы идут с фоновым приоритетом.
+        
+        query - название, по которому место ищут пользователи: геокодирование
+        прогревается под тем же ключом. Погода прогревается по сохраненным
+        координатам (или по результату геокодирования, если их нет).
+        Возвращает True, если хотя бы одна запись обновлялась.
+        """
+        refreshed = False
+        if query:
+            cache_key = normalize_city_name(query)
+            expires_in = self._geocode_cache.expires_in(cache_key)
+            if expires_in is None or expires_in < lead_time:
+                await self._geocode_flight.do(
+                    self._flight_key(cache_key, Priority.BACKGROUND),
+                    lambda: self._load_city_coordinates(query, cache_key, Priority.BACKGROUND)
+                )
+                refreshed = True
+            
+            coordinates = self._geocode_cache.get(cache_key)
+            if latitude is None and coordinates is not None and coordinates is not _NOT_FOUND:
+                latitude, longitude = coordinates["latitude"], coordinates["longitude"]
+        
+        if latitude is None or longitude is None:
+            return refreshed
+        
+        weather_key = self._coordinates_key(latitude, longitude)
+        expires_in = self._weather_cache.expires_in(weather_key)
+        if expires_in is None or expires_in < lead_time:
+            await self._load_weather(weather_key, latitude, longitude, Priority.BACKGROUND)
+            refreshed = True
+        return refreshed
+    
+    async def autocomplete_cities(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Найти города по части названия для автодополнения
+        
+        Подсказки не важнее поиска погоды: при исчерпанной квоте или ошибке
+        API возвращается пустой список.
+        """
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "lat": latitude,
-                    "lon": longitude,
-                    "appid": self.api_key,
-                    "units": "metric",  # Celsius
-                    "lang": "ru"
-                }
-                response = await client.get(self.weather_base_url, params=params)
-                response.raise_for_status()
-                
-                return response.json()
+            places = await self._call(
+                "autocomplete", self.provider.geocode_request(query, limit), self.provider.parse_geocode,
+                Priority.AUTOCOMPLETE
+            )
+            return places or []
         except Exception as e:
-            print(f"Ошибка при получении погоды: {e}")
-            return None
+            logger.warning("Ошибка поиска городов через API: %s", e)
+            return []
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэшей сервиса для мониторинга"""
+        return {
+            "geocoding": self._geocode_cache.stats(),
+            "weather": self._weather_cache.stats(),
+            "place_names": self._place_names.stats(),
+            "last_known": self._last_known.stats(),
+            "coalescing": {
+                "geocoding": self._geocode_flight.stats(),
+                "weather": self._weather_flight.stats()
+            }
+        }
+    
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Состояние обращений к погодному API"""
+        return {
+            "provider": self.provider.name,
+            "rate_limit": self.rate_limiter.stats(),
+            "circuit_breaker": self.circuit_breaker.stats(),
+            "call_timeout": self.call_timeout
+        }
     
     def _get_weather_description(self, weather_code: int) -> str:
         """Преобразовать код погоды в описание"""
@@ -98,39 +566,92 @@ class WeatherService:
     
     async def get_weather_by_city(self, city_name: str) -> Optional[WeatherData]:
         """Получить погоду по названию города"""
+        with span("weather.get_by_city", {"city": city_name}):
+            return await self._get_weather_by_city(city_name)
+    
+    async def _get_weather_by_city(self, city_name: str) -> Optional[WeatherData]:
+        """Геокодирование, затем погода по координатам города"""
         # Получаем координаты города
         coordinates = await self.get_city_coordinates(city_name)
         if not coordinates:
             return None
         
         # Получаем данные о погоде
-        weather_data = await self.get_weather_by_coordinates(
+        weather_data, observed_at = await self._get_weather_observation(
             coordinates["latitude"], 
             coordinates["longitude"]
         )
         if not weather_data:
             return None
         
-        # Форматируем данные
-        main = weather_data["main"]
-        weather = weather_data["weather"][0]
-        wind = weather_data["wind"]
-        
         # Формируем полное название города
         full_city_name = f"{coordinates['name']}"
         if coordinates.get("state"):
             full_city_name += f", {coordinates['state']}"
         if coordinates.get("country"):
             full_city_name += f", {coordinates['country']}"
+        self.remember_place_name(coordinates["latitude"], coordinates["longitude"], full_city_name)
+        
+        return self._build_weather_data(
+            full_city_name, weather_data, coordinates["latitude"], coordinates["longitude"], observed_at,
+            query=city_name.strip()
+        )
+    
+    async def get_weather_by_location(self, latitude: float, longitude: float) -> Optional[WeatherData]:
+        """Получить погоду по координатам без геокодирования
+        
+        Название места берется из кэша названий, а если его там нет - из ответа
+        провайдера погоды.
+        """
+        with span("weather.get_by_location", {"latitude": latitude, "longitude": longitude}):
+            return await self._get_weather_by_location(latitude, longitude)
+    
+    async def _get_weather_by_location(self, latitude: float, longitude: float) -> Optional[WeatherData]:
+        """Погода по координатам с названием места из кэша или ответа провайдера"""
+        weather_data, observed_at = await self._get_weather_observation(latitude, longitude)
+        if not weather_data:
+            return None
+        
+        place_name = self._place_names.get(self._coordinates_key(latitude, longitude))
+        if place_name is None:
+            place_name = weather_data.get("name") or f"{latitude:.2f}, {longitude:.2f}"
+            if weather_data.get("country"):
+                place_name += f", {weather_data['country']}"
+            self.remember_place_name(latitude, longitude, place_name)
+        
+        return self._build_weather_data(place_name, weather_data, latitude, longitude, observed_at)
+    
+    def remember_place_name(self, latitude: float, longitude: float, name: str):
+        """Запомнить название места для запросов по координатам"""
+        self._place_names.set(self._coordinates_key(latitude, longitude), name)
+    
+    def _build_weather_data(
+        self,
+        city_name: str,
+        weather_data: Dict[str, Any],
+        latitude: float,
+        longitude: float,
+        observed_at: Optional[datetime] = None,
+        query: Optional[str] = None
+    ) -> WeatherData:
+        """Преобразовать наблюдение провайдера в WeatherData
         
+        observed_at передается для последних известных данных, отданных вместо ошибки API,
+        query - для поиска по названию.
+        """
         return WeatherData(
-            city=full_city_name,
-            temperature=main["temp"],
-            feels_like=main["feels_like"],
-            humidity=main["humidity"],
-            wind_speed=wind.get("speed", 0),
-            description=weather["description"].capitalize(),
-            timestamp=datetime.now()
+            city=city_name,
+            temperature=weather_data["temperature"],
+            feels_like=weather_data["feels_like"],
+            humidity=weather_data["humidity"],
+            wind_speed=weather_data["wind_speed"],
+            description=weather_data["description"].capitalize(),
+            timestamp=observed_at or datetime.now(),
+            latitude=latitude,
+            longitude=longitude,
+            location_id=make_location_id(latitude, longitude),
+            stale=observed_at is not None,
+            query=query
         )
 
 # Создаем глобальный экземпляр сервиса
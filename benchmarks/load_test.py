@@ -0,0 +1,270 @@
+"""Нагрузочный тест API SkyPeek
+
+Заполняет БД пользователями и историей поиска, поднимает приложение вместе
+с заглушкой погодного API (app.mock_provider) с заданной задержкой и гоняет
+запросы к /api/weather, /api/cities, /api/history, /api/last-city и /api/stats.
+Для каждого эндпоинта выводятся RPS и p50/p95/p99, результат сохраняется
+в JSON, который можно сравнить с прошлым прогоном.
+
+    python -m benchmarks.load_test --users 1000 --history 50000 --requests 2000 --concurrency 50
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --output after.json --baseline before.json
+
+По умолчанию приложение вызывается в том же процессе через ASGI (без сети),
+а БД - временный файл SQLite. --database-url задает другую БД (внимание:
+таблицы приложения в ней пересоздаются), --url - уже запущенный сервер
+(вместе с --database-url его БД, иначе засеянные данные сервер не увидит),
+например:
+
+    WEATHER_PROVIDER=mock DATABASE_URL=... uvicorn app.main:app --workers 4
+    uvicorn app.mock_provider:app --port 8090
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --database-url ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+ENDPOINTS = ("weather", "cities", "history", "last-city", "stats")
+
+# Запрос: путь и заголовки
+Request = Tuple[str, Dict[str, str]]
+
+def configure_environment(args):
+    """Настройки приложения до его импорта: БД, заглушка API, без квоты"""
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["WEATHER_PROVIDER"] = "mock"
+    os.environ.setdefault("MOCK_PROVIDER_URL", "http://mock-provider")
+    os.environ.setdefault("WEATHER_RATE_LIMIT", "0")
+
+def seed(users: int, history: int, cities: List[str]) -> List[str]:
+    """Пересоздать таблицы и заполнить их тестовыми данными, вернуть session_id"""
+    from sqlalchemy import insert
+
+    from app.database import Base, engine
+    from app.models import SearchHistory, User
+    from app.rollups import build_rollup_statements
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(42)
+    session_ids = [f"load-{i}" for i in range(users)]
+    # Популярность городов убывает по закону Ципфа, как и в реальном трафике
+    weights = [1 / rank for rank in range(1, len(cities) + 1)]
+    now = datetime.now(timezone.utc)
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"session_id": session_id} for session_id in session_ids])
+        for start in range(0, history, 10000):
+            batch = [
+                {
+                    "user_id": rng.randint(1, users),
+                    "city": rng.choices(cities, weights)[0],
+                    "temperature": rng.uniform(-20, 30),
+                    "feels_like": rng.uniform(-25, 30),
+                    "humidity": rng.randint(20, 100),
+                    "wind_speed": rng.uniform(0, 15),
+                    "description": "облачно",
+                    "searched_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+                }
+                for _ in range(min(10000, history - start))
+            ]
+            conn.execute(insert(SearchHistory), batch)
+            for statement in build_rollup_statements(engine.dialect.name, batch):
+                conn.execute(statement)
+
+    return session_ids
+
+def request_factory(endpoint: str, city_names: List[str], session_ids: List[str]) -> Callable[[random.Random], Request]:
+    """Генератор запросов к эндпоинту"""
+    weights = [1 / rank for rank in range(1, len(city_names) + 1)]
+
+    def cookie(rng: random.Random) -> Dict[str, str]:
+        return {"Cookie": f"session_id={rng.choice(session_ids)}"}
+
+    if endpoint == "weather":
+        return lambda rng: (f"/api/weather?city={rng.choices(city_names, weights)[0]}", cookie(rng))
+    if endpoint == "cities":
+        return lambda rng: (f"/api/cities?q={rng.choice(city_names)[:rng.randint(2, 4)]}", {})
+    if endpoint == "history":
+        return lambda rng: ("/api/history", cookie(rng))
+    if endpoint == "last-city":
+        return lambda rng: ("/api/last-city", cookie(rng))
+    if endpoint == "stats":
+        return lambda rng: ("/api/stats", {})
+    raise ValueError(f"Неизвестный эндпоинт: {endpoint}")
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+async def run_endpoint(client, make_request, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Прогнать requests запросов в concurrency параллельных потоков"""
+    rng = random.Random(7)
+    for _ in range(warmup):
+        path, headers = make_request(rng)
+        await client.get(path, headers=headers)
+
+    timings: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            path, headers = make_request(rng)
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "rps": round(len(timings) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "max_ms": round(timings[-1], 2),
+        "statuses": statuses
+    }
+
+async def run(args, city_names: List[str], session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    import httpx
+
+    results = {}
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            for endpoint in args.endpoints:
+                make_request = request_factory(endpoint, city_names, session_ids)
+                results[endpoint] = await run_endpoint(client, make_request, args.requests, args.concurrency, args.warmup)
+        return results
+
+    from app.main import app
+    from app.mock_provider import MockProvider, create_app
+    from app.weather_service import weather_service
+
+    mock = MockProvider(latency=args.upstream_latency, latency_jitter=args.upstream_jitter, error_rate=args.upstream_error_rate)
+    weather_service._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(mock)))
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://skypeek", timeout=60) as client:
+            for endpoint in args.endpoints:
+                make_request = request_factory(endpoint, city_names, session_ids)
+                results[endpoint] = await run_endpoint(client, make_request, args.requests, args.concurrency, args.warmup)
+    results["upstream"] = mock.stats()
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def print_results(results: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"{'эндпоинт':12} {'RPS':>9} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9}  статусы")
+    for endpoint in ENDPOINTS:
+        result = results.get(endpoint)
+        if result is None:
+            continue
+        line = (
+            f"{endpoint:12} {result['rps']:>9} {result['p50_ms']:>9} "
+            f"{result['p95_ms']:>9} {result['p99_ms']:>9}  {result['statuses']}"
+        )
+        previous = baseline.get(endpoint)
+        if previous:
+            line += (
+                f"  RPS {(result['rps'] / previous['rps'] - 1) * 100:+.1f}%,"
+                f" p95 {(result['p95_ms'] / previous['p95_ms'] - 1) * 100:+.1f}%"
+            )
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=50000, help="записей в search_history")
+    parser.add_argument("--cities", type=int, default=100, help="разных городов в запросах")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="задержка заглушки API (с)")
+    parser.add_argument("--upstream-jitter", type=float, default=0.02)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", help="БД для теста (по умолчанию временный SQLite)")
+    parser.add_argument("--url", help="адрес запущенного сервера вместо вызова в процессе")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    if args.url and not args.database_url:
+        # Данные засеваются в БД напрямую: серверу нужна та же БД, что и тесту
+        parser.error("--url требует --database-url той же БД, с которой запущен сервер")
+
+    temp_dir = None
+    if not args.database_url:
+        temp_dir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(temp_dir.name, 'load_test.db')}"
+    configure_environment(args)
+
+    from app.gazetteer import get_gazetteer
+
+    # Названия из справочника заглушки: каждый город геокодируется
+    gazetteer_cities = sorted(get_gazetteer().cities, key=lambda city: -city.population)[:args.cities]
+    city_names = [city.name for city in gazetteer_cities]
+    session_ids = seed(args.users, args.history, [f"{city.name}, {city.country}" for city in gazetteer_cities])
+
+    results = asyncio.run(run(args, city_names, session_ids))
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": args.database_url.split("://")[0],
+            "mode": "http" if args.url else "asgi",
+            "settings": {
+                key: getattr(args, key)
+                for key in (
+                    "users", "history", "cities", "requests", "concurrency", "warmup",
+                    "upstream_latency", "upstream_jitter", "upstream_error_rate"
+                )
+            }
+        },
+        "endpoints": {endpoint: results[endpoint] for endpoint in args.endpoints},
+        "upstream": results.get("upstream")
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["endpoints"]
+    print_results(report["endpoints"], baseline)
+    print(f"Результаты сохранены в {args.output}")
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
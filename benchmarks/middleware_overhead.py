@@ -0,0 +1,119 @@
+"""Бенчмарк накладных расходов middleware кэша запроса
+
+Сравнивает прежний ClearUserCacheMiddleware (BaseHTTPMiddleware + глобальный
+словарь с очисткой перебором ключей) с RequestScopeMiddleware (чистый ASGI +
+contextvar). Запросы вызываются напрямую через ASGI, без сети и БД.
+
+    python -m benchmarks.middleware_overhead --requests 20000
+    python -m benchmarks.middleware_overhead --leaked 10000
+
+--leaked заполняет глобальный словарь записями, оставшимися от запросов,
+упавших с исключением: прежний middleware перебирает их на каждом запросе.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import Depends, FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.request_scope import RequestScopeMiddleware, request_cache
+
+# Прежняя реализация (до перехода на RequestScopeMiddleware)
+_user_cache = {}
+
+class ClearUserCacheMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        request_id = id(request)
+        keys_to_remove = [key for key in _user_cache.keys() if key.endswith(f"_{request_id}")]
+        for key in keys_to_remove:
+            _user_cache.pop(key, None)
+        return response
+
+async def global_cache_user(request: Request):
+    cache_key = f"user_session_{id(request)}"
+    if cache_key not in _user_cache:
+        _user_cache[cache_key] = {"id": 1}
+    return _user_cache[cache_key]
+
+async def request_scope_user(request: Request):
+    cache = request_cache()
+    if "user_session" not in cache:
+        cache["user_session"] = {"id": 1}
+    return cache["user_session"]
+
+def build_app(middleware, dependency) -> FastAPI:
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+
+    @app.get("/")
+    async def endpoint(user=Depends(dependency)):
+        return {"user": user["id"]}
+
+    return app
+
+async def call(app):
+    """Один GET / через ASGI"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/", "raw_path": b"/",
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234), "server": ("bench", 80)
+    }
+
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Как и настоящий клиент, остаемся подключенными до конца ответа
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+async def measure(app, requests: int) -> dict:
+    """Время обработки запроса (мкс)"""
+    for _ in range(min(requests, 500)):
+        await call(app)
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await call(app)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "mean_us": round(statistics.fmean(timings), 1),
+        "p50_us": round(statistics.median(timings), 1),
+        "p99_us": round(timings[int(len(timings) * 0.99) - 1], 1)
+    }
+
+async def run(requests: int, leaked: int):
+    variants = (
+        ("без middleware", build_app(None, global_cache_user)),
+        ("ClearUserCacheMiddleware", build_app(ClearUserCacheMiddleware, global_cache_user)),
+        ("RequestScopeMiddleware", build_app(RequestScopeMiddleware, request_scope_user))
+    )
+    for name, app in variants:
+        _user_cache.clear()
+        _user_cache.update({f"user_leaked_{i}": {"id": i} for i in range(leaked)})
+        print(f"{name:28} {await measure(app, requests)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--leaked", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.leaked))
+
+if __name__ == "__main__":
+    main()
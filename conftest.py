@@ -1,12 +1,18 @@
 import pytest
 import os
 import uuid
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_async_db, Base
 from app.models import User, SearchHistory
+from app.rollups import build_new_user_statement, build_rollup_statements
+from app.query_stats import count_queries
+from app.db_instrumentation import instrument_engine
 
 # Тестовая база данных в памяти
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -24,7 +30,38 @@ def override_get_db():
     finally:
         db.close()
 
+# Асинхронный движок на ту же тестовую БД. NullPool - потому что TestClient
+# может выполнять запросы в разных event loop
+async_engine = create_async_engine(
+    "sqlite+aiosqlite:///./test.db",
+    poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Учет SQL-запросов тестовой БД, как у движков приложения
+for _engine in (engine, async_engine.sync_engine):
+    instrument_engine(_engine)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+class FakeClock:
+    """Управляемые часы для тестов TTL и таймаутов: время двигается через now"""
+    
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def fake_clock():
+    """Часы FakeClock для передачи в clock= (TTLCache, CircuitBreaker)"""
+    return FakeClock()
 
 @pytest.fixture(scope="function")
 def test_db():
@@ -33,11 +70,33 @@ def test_db():
     yield
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture
+def async_session_factory(test_db):
+    """Фабрика асинхронных сессий тестовой БД"""
+    return TestingAsyncSessionLocal
+
 @pytest.fixture
 def client(test_db):
     """Клиент для тестирования FastAPI"""
     return TestClient(app)
 
+@pytest.fixture
+def query_budget(test_db):
+    """Проверка числа SQL-запросов внутри блока:
+
+        with query_budget(2):
+            client.get("/api/history")
+    """
+    @contextmanager
+    def budget(max_statements: int):
+        with count_queries(engine, async_engine.sync_engine) as stats:
+            yield stats
+        assert stats.statements <= max_statements, (
+            f"Выполнено {stats.statements} SQL-запросов при бюджете {max_statements}:\n"
+            + "\n".join(stats.statement_log)
+        )
+    return budget
+
 @pytest.fixture
 def db_session(test_db):
     """Сессия БД для тестов"""
@@ -53,10 +112,34 @@ def sample_user(db_session):
     unique_session_id = f"test-session-{uuid.uuid4().hex[:8]}"
     user = User(session_id=unique_session_id)
     db_session.add(user)
+    # Счетчик пользователей в сводной таблице, как при создании в приложении
+    db_session.execute(build_new_user_statement("sqlite"))
     db_session.commit()
     db_session.refresh(user)
     return user
 
+@pytest.fixture
+def make_record():
+    """Фабрика записей истории для save_search_records:
+
+        make_record(user.id, "Казань, Россия", searched_at=yesterday, latitude=55.79)
+    """
+    def make(user_id: int, city: str = "Москва, Россия", searched_at=None, **fields) -> dict:
+        record = {
+            "user_id": user_id,
+            "city": city,
+            "temperature": 15.5,
+            "feels_like": 12.0,
+            "humidity": 65,
+            "wind_speed": 3.2,
+            "description": "облачно",
+            **fields
+        }
+        if searched_at is not None:
+            record["searched_at"] = searched_at
+        return record
+    return make
+
 @pytest.fixture
 def sample_search_history(db_session, sample_user):
     """Создание тестовой истории поиска"""
@@ -89,5 +172,10 @@ def sample_search_history(db_session, sample_user):
     for search in searches:
         db_session.add(search)
     
+    # Сводная статистика обновляется вместе с записью истории, как в приложении
+    records = [{"city": search.city, "searched_at": search.searched_at} for search in searches]
+    for statement in build_rollup_statements("sqlite", records):
+        db_session.execute(statement)
+    
     db_session.commit()
     return searches
@@ -3,6 +3,13 @@ let autocompleteTimeout = null;
 let selectedIndex = -1;
 let autocompleteItems = [];
 
+// Подписи источников подсказок автодополнения
+const sourceLabels = {
+    history: 'Из истории',
+    gazetteer: 'Справочник',
+    api: 'Найдено'
+};
+
 // Загружаем последний город при загрузке страницы
 document.addEventListener('DOMContentLoaded', async function() {
     await loadLastCity();
@@ -112,7 +119,7 @@ function showAutocomplete(cities) {
         item.innerHTML = `
             <span class="city-name">${city.name}</span>
             <span class="city-source source-${city.source}">
-                ${city.source === 'history' ? 'Из истории' : 'Найдено'}
+                ${sourceLabels[city.source] || 'Найдено'}
             </span>
         `;
         
@@ -159,8 +166,8 @@ function selectCity(city) {
     input.value = city.name;
     hideAutocomplete();
     
-    // Автоматический поиск после выбора
-    searchWeather(city.name);
+    // Автоматический поиск после выбора: по location_id геокодирование не нужно
+    searchWeather(city.name, city.location_id);
 }
 
 // Обработчик формы поиска
@@ -191,11 +198,14 @@ document.getElementById('dismiss-suggestion-btn').addEventListener('click', func
 });
 
 // Функция поиска погоды
-async function searchWeather(city) {
+async function searchWeather(city, locationId = null) {
     showLoading();
     
     try {
-        const response = await fetch(`/api/weather?city=${encodeURIComponent(city)}`);
+        const query = locationId
+            ? `location_id=${encodeURIComponent(locationId)}`
+            : `city=${encodeURIComponent(city)}`;
+        const response = await fetch(`/api/weather?${query}`);
         
         if (!response.ok) {
             const error = await response.json();
@@ -330,6 +340,10 @@ function showWeather(data) {
                     <span class="detail-value">${data.wind_speed} км/ч</span>
                 </div>
             </div>
+            ${data.stale ? `
+            <div class="stale-note">
+                ⚠️ Погодный сервис недоступен, показаны последние известные данные
+            </div>` : ''}
             <div class="timestamp">
                 Обновлено: ${new Date(data.timestamp).toLocaleString('ru-RU')}
             </div>
@@ -0,0 +1,98 @@
+import pytest
+from app.cache import TTLCache, normalize_city_name
+
+class TestNormalizeCityName:
+    
+    def test_case_and_whitespace(self):
+        """Тест нормализации регистра и пробелов"""
+        assert normalize_city_name("  МОСКВА ") == "москва"
+        assert normalize_city_name("New   York") == "new york"
+        assert normalize_city_name("Moscow ,RU") == "moscow, ru"
+    
+    def test_unicode_folding(self):
+        """Тест приведения юникод-форм к одному ключу"""
+        decomposed = "Zu\u0308rich"  # u + комбинируемый умлаут
+        assert normalize_city_name(decomposed) == normalize_city_name("Z\u00fcrich")
+        assert normalize_city_name("STRASSE") == normalize_city_name("straße")
+
+class TestTTLCache:
+    
+    def test_get_and_set(self):
+        """Тест сохранения и получения значения"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("moscow", {"lat": 55.75})
+        
+        assert cache.get("moscow") == {"lat": 55.75}
+        assert cache.get("london") is None
+        assert cache.hits == 1
+        assert cache.misses == 1
+    
+    def test_expiration(self, fake_clock):
+        """Тест истечения времени жизни записи"""
+        cache = TTLCache(maxsize=10, ttl=60, clock=fake_clock)
+        cache.set("moscow", 1)
+        cache.set("london", 2, ttl=5)
+        
+        fake_clock.now += 10
+        assert cache.get("london") is None
+        assert cache.get("moscow") == 1
+        
+        fake_clock.now += 60
+        assert "moscow" not in cache
+        assert cache.get("moscow") is None
+        assert cache.expirations == 2
+    
+    def test_expires_in(self, fake_clock):
+        """Тест оставшегося времени свежести записи"""
+        cache = TTLCache(maxsize=10, ttl=60, clock=fake_clock)
+        cache.set("moscow", 1)
+        
+        fake_clock.now += 45
+        assert cache.expires_in("moscow") == 15
+        assert cache.expires_in("london") is None
+        assert cache.hits == cache.misses == 0
+    
+    def test_lru_eviction(self):
+        """Тест вытеснения давно неиспользуемых записей"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+        assert len(cache) == 2
+    
+    def test_stats(self):
+        """Тест статистики кэша"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        
+        stats = cache.stats()
+        assert stats["size"] == 1
+        assert stats["maxsize"] == 10
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+    
+    def test_get_stale(self, fake_clock):
+        """Тест выдачи устаревшей записи в окне stale_ttl"""
+        cache = TTLCache(maxsize=10, ttl=60, stale_ttl=30, clock=fake_clock)
+        cache.set("moscow", 1)
+        
+        assert cache.get_stale("moscow") == (1, False)
+        
+        fake_clock.now += 70
+        assert cache.get("moscow") is None
+        assert cache.get_stale("moscow") == (1, True)
+        
+        fake_clock.now += 30
+        assert cache.get_stale("moscow") is None
+        assert cache.stale_hits == 1
+        assert cache.expirations == 1
+
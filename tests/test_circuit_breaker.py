@@ -0,0 +1,70 @@
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+class TestCircuitBreaker:
+    
+    def test_opens_after_consecutive_failures(self, fake_clock):
+        """Тест что цепь размыкается после failure_threshold ошибок подряд"""
+        breaker = CircuitBreaker(clock=fake_clock, failure_threshold=3, recovery_timeout=10)
+        
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow_request()
+        assert breaker.rejected == 1
+        assert breaker.retry_after() == 10
+    
+    def test_half_open_probe_success_closes(self, fake_clock):
+        """Тест что после recovery_timeout пропускается одна проба, и ее успех замыкает цепь"""
+        breaker = CircuitBreaker(clock=fake_clock, failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        
+        fake_clock.now += 10
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.allow_request()
+    
+    def test_half_open_probe_failure_reopens(self, fake_clock):
+        """Тест что ошибка пробного запроса снова размыкает цепь"""
+        breaker = CircuitBreaker(clock=fake_clock, failure_threshold=2, recovery_timeout=10)
+        breaker.record_failure()
+        breaker.record_failure()
+        
+        fake_clock.now += 15
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_after() == 10
+        assert breaker.opened == 2
+    
+    def test_release_frees_probe_slot(self, fake_clock):
+        """Тест что проба, не дошедшая до сервиса, не блокирует следующие"""
+        breaker = CircuitBreaker(clock=fake_clock, failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        fake_clock.now += 10
+        
+        assert breaker.allow_request()
+        breaker.release()
+        assert breaker.allow_request()
+    
+    def test_stats(self, fake_clock):
+        """Тест статистики выключателя"""
+        breaker = CircuitBreaker(clock=fake_clock, failure_threshold=1, recovery_timeout=5)
+        breaker.record_success()
+        breaker.record_failure()
+        
+        stats = breaker.stats()
+        assert stats["state"] == OPEN
+        assert stats["successes"] == 1
+        assert stats["failures"] == 1
+        assert stats["opened"] == 1
+        assert stats["retry_after"] == 5
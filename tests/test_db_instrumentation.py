@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app.db_instrumentation import instrument_engine, statement_operation
+from app.metrics import MetricsRegistry
+from app.query_stats import track_queries
+
+class TestDbInstrumentation:
+
+    def test_statement_operation(self):
+        """Тест типа запроса: одна метка для метрик и имен спанов"""
+        assert statement_operation("  select x from t") == "SELECT"
+        assert statement_operation("INSERT INTO t VALUES (1)") == "INSERT"
+        assert statement_operation("PRAGMA table_info(t)") == "OTHER"
+        assert statement_operation("") == "OTHER"
+
+    def test_one_hook_feeds_all_consumers(self):
+        """Тест что один обработчик передает запрос метрикам и статистике запроса"""
+        histogram = MetricsRegistry().histogram("queries_seconds", "Запросы", ("operation",))
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, histogram=histogram)
+
+        with engine.connect() as conn:
+            with track_queries() as stats:
+                conn.execute(text("PRAGMA user_version"))
+                conn.execute(text("SELECT 1"))
+
+        assert len(engine.dispatch.before_cursor_execute) == 1
+        assert len(engine.dispatch.after_cursor_execute) == 1
+        assert histogram.count("OTHER") == 1
+        assert histogram.count("SELECT") == 1
+        assert stats.statements == 2
+
+    def test_failed_statement(self):
+        """Тест что упавший запрос тоже учитывается"""
+        histogram = MetricsRegistry().histogram("queries_seconds", "Запросы", ("operation",))
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, histogram=histogram)
+
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                with track_queries() as stats:
+                    conn.execute(text("SELECT x FROM missing"))
+
+        assert histogram.count("SELECT") == 1
+        assert stats.statements == 1
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from sqlalchemy import event, func, select
+from app.dependencies import get_or_create_user
+from app.models import User
+from app.rollups import search_totals
+
+class TestUserUpsert:
+    
+    @pytest.mark.asyncio
+    async def test_new_user_single_statement(self, async_session_factory):
+        """Тест что новый пользователь создается без SELECT: вставка и счетчик пользователей"""
+        sync_engine = async_session_factory.kw["bind"].sync_engine
+        statements = []
+        
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+        try:
+            async with async_session_factory() as db:
+                user = await get_or_create_user(None, None, db)
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", count_statement)
+        
+        assert user.id is not None
+        assert len(statements) == 2
+        assert all("ON CONFLICT" in statement for statement in statements)
+    
+    @pytest.mark.asyncio
+    async def test_existing_user_returned(self, async_session_factory, sample_user):
+        """Тест что существующий пользователь находится по session_id"""
+        async with async_session_factory() as db:
+            user = await get_or_create_user(None, sample_user.session_id, db)
+        assert user.id == sample_user.id
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_same_session(self, async_session_factory):
+        """Тест что одновременные запросы с новым session_id создают одного пользователя"""
+        session_id = "concurrent-session"
+        
+        async def resolve():
+            async with async_session_factory() as db:
+                user = await get_or_create_user(None, session_id, db)
+                return user.id
+        
+        ids = await asyncio.gather(*(resolve() for _ in range(30)))
+        
+        assert len(set(ids)) == 1
+        async with async_session_factory() as db:
+            count = await db.scalar(
+                select(func.count(User.id)).where(User.session_id == session_id)
+            )
+            _, total_users = (await db.execute(search_totals())).one()
+        assert count == 1
+        # Счетчик увеличил только запрос, который вставил строку
+        assert total_users == 1
@@ -0,0 +1,79 @@
+import pytest
+from app.gazetteer import City, Gazetteer, DEFAULT_GAZETTEER_PATH
+
+def make_gazetteer() -> Gazetteer:
+    return Gazetteer([
+        City("Москва", "RU", "", 55.7558, 37.6173, 13010112, ("Moscow", "Moskva")),
+        City("Мосальск", "RU", "", 54.4919, 34.9856, 4000),
+        City("Санкт-Петербург", "RU", "", 59.9386, 30.3141, 5601911, ("Saint Petersburg", "Питер")),
+        City("Нижний Новгород", "RU", "", 56.3269, 44.0059, 1228199, ("Nizhny Novgorod",)),
+        City("Великий Новгород", "RU", "", 58.5213, 31.2710, 224286),
+        City("Нью-Йорк", "US", "New York", 40.7128, -74.0060, 8336817, ("New York",))
+    ])
+
+class TestGazetteer:
+    
+    def test_prefix_search_ranked_by_population(self):
+        """Тест что города с общим префиксом ранжируются по населению"""
+        results = make_gazetteer().search("мос")
+        assert [city["name"] for city in results] == ["Москва", "Мосальск"]
+        assert results[0]["latitude"] == 55.7558
+        assert results[0]["country"] == "RU"
+    
+    def test_search_is_case_insensitive(self):
+        """Тест поиска без учета регистра и лишних пробелов"""
+        assert make_gazetteer().search("  МОС")[0]["name"] == "Москва"
+    
+    def test_search_by_word_inside_name(self):
+        """Тест поиска по слову внутри составного названия"""
+        results = make_gazetteer().search("новг")
+        assert [city["name"] for city in results] == ["Нижний Новгород", "Великий Новгород"]
+        assert make_gazetteer().search("петер")[0]["name"] == "Санкт-Петербург"
+    
+    def test_alternate_name_shows_name_in_query_script(self):
+        """Тест что вариант названия показывается основным названием на алфавите запроса"""
+        gazetteer = make_gazetteer()
+        assert gazetteer.search("питер")[0]["name"] == "Санкт-Петербург"
+        assert gazetteer.search("moskva")[0]["name"] == "Moscow"
+        assert gazetteer.search("saint")[0]["name"] == "Saint Petersburg"
+    
+    def test_city_matched_by_several_keys_returned_once(self):
+        """Тест что город, совпавший по нескольким ключам, возвращается один раз"""
+        results = make_gazetteer().search("new")
+        assert [city["name"] for city in results] == ["New York"]
+        assert results[0]["state"] == "New York"
+    
+    def test_limit(self):
+        """Тест ограничения числа результатов"""
+        assert len(make_gazetteer().search("мос", limit=1)) == 1
+        assert make_gazetteer().search("мос", limit=0) == []
+    
+    def test_no_match(self):
+        """Тест поиска без результатов"""
+        assert make_gazetteer().search("xyz") == []
+        assert make_gazetteer().search("   ") == []
+        assert Gazetteer().search("мос") == []
+    
+    def test_load_bundled_csv(self):
+        """Тест загрузки справочника, поставляемого с приложением"""
+        gazetteer = Gazetteer.from_file(DEFAULT_GAZETTEER_PATH)
+        assert len(gazetteer) > 100
+        assert gazetteer.search("москв")[0]["name"] == "Москва"
+        assert gazetteer.search("kaz")[0]["name"] == "Kazan"
+    
+    def test_load_geonames_dump(self, tmp_path):
+        """Тест загрузки дампа GeoNames"""
+        row = [
+            "524901", "Moscow", "Moscow", "Maskva,Moskau,Москва", "55.75222", "37.61556",
+            "P", "PPLC", "RU", "", "48", "", "", "", "10381222", "", "144",
+            "Europe/Moscow", "2022-12-10"
+        ]
+        path = tmp_path / "cities15000.txt"
+        path.write_text("\t".join(row) + "\n", encoding="utf-8")
+        
+        gazetteer = Gazetteer.from_file(str(path))
+        assert len(gazetteer) == 1
+        assert gazetteer.search("моск")[0]["name"] == "Москва"
+        assert gazetteer.search("mosc")[0]["population"] == 10381222
+        # Некириллические переводы в индекс не попадают
+        assert gazetteer.search("moskau") == []
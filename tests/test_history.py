@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from app.history import SearchHistoryWriter, save_search_records
+from app.models import SearchHistory
+
+async def count_history(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count(SearchHistory.id)))
+
+class TestSearchHistoryWriter:
+    
+    @pytest.mark.asyncio
+    async def test_save_search_records(self, async_session_factory, sample_user, make_record):
+        """Тест пакетного сохранения записей"""
+        async with async_session_factory() as db:
+            await save_search_records(db, [make_record(sample_user.id) for _ in range(3)])
+        
+        assert await count_history(async_session_factory) == 3
+    
+    @pytest.mark.asyncio
+    async def test_disabled_writer_rejects(self, async_session_factory, sample_user, make_record):
+        """Тест что выключенный режим требует немедленной записи"""
+        writer = SearchHistoryWriter(enabled=False, session_factory=async_session_factory)
+        await writer.start()
+        
+        assert await writer.enqueue(make_record(sample_user.id)) is False
+        assert writer.stats()["running"] is False
+    
+    @pytest.mark.asyncio
+    async def test_flush_on_batch_size(self, async_session_factory, sample_user, make_record):
+        """Тест записи пачки при наборе batch_size записей"""
+        writer = SearchHistoryWriter(
+            enabled=True,
+            session_factory=async_session_factory,
+            batch_size=5,
+            flush_interval=10
+        )
+        await writer.start()
+        
+        for _ in range(5):
+            assert await writer.enqueue(make_record(sample_user.id))
+        
+        for _ in range(100):
+            if writer.flushed_batches:
+                break
+            await asyncio.sleep(0.01)
+        
+        assert writer.flushed_batches == 1
+        assert await count_history(async_session_factory) == 5
+        await writer.stop()
+    
+    @pytest.mark.asyncio
+    async def test_flush_on_interval(self, async_session_factory, sample_user, make_record):
+        """Тест записи неполной пачки по таймеру"""
+        writer = SearchHistoryWriter(
+            enabled=True,
+            session_factory=async_session_factory,
+            batch_size=100,
+            flush_interval=0.05
+        )
+        await writer.start()
+        await writer.enqueue(make_record(sample_user.id))
+        
+        await asyncio.sleep(0.3)
+        
+        assert writer.flushed_rows == 1
+        assert await count_history(async_session_factory) == 1
+        await writer.stop()
+    
+    @pytest.mark.asyncio
+    async def test_stop_drains_queue(self, async_session_factory, sample_user, make_record):
+        """Тест что при остановке очередь дописывается"""
+        writer = SearchHistoryWriter(
+            enabled=True,
+            session_factory=async_session_factory,
+            batch_size=4,
+            flush_interval=10
+        )
+        await writer.start()
+        for _ in range(10):
+            await writer.enqueue(make_record(sample_user.id))
+        
+        await writer.stop()
+        
+        assert writer.flushed_rows == 10
+        assert await count_history(async_session_factory) == 10
+        assert await writer.enqueue(make_record(sample_user.id)) is False
+    
+    @pytest.mark.asyncio
+    async def test_backpressure(self, async_session_factory, sample_user, make_record):
+        """Тест что переполненная очередь не принимает записи"""
+        writer = SearchHistoryWriter(
+            enabled=True,
+            session_factory=async_session_factory,
+            max_queue_size=1,
+            enqueue_timeout=0.01
+        )
+        await writer.start()
+        # Не даем фоновой задаче забрать записи
+        writer._task.cancel()
+        writer._task = asyncio.create_task(asyncio.sleep(10))
+        
+        assert await writer.enqueue(make_record(sample_user.id)) is True
+        assert await writer.enqueue(make_record(sample_user.id)) is False
+        assert writer.stats()["rejected"] == 1
+        
+        writer._task.cancel()
+    
+    @pytest.mark.asyncio
+    async def test_flush_failure_metrics(self, sample_user, make_record):
+        """Тест учета ошибок записи пачки"""
+        def broken_session_factory():
+            raise RuntimeError("database is down")
+        
+        writer = SearchHistoryWriter(
+            enabled=True,
+            session_factory=broken_session_factory,
+            batch_size=2,
+            flush_interval=10,
+            max_retries=0
+        )
+        await writer.start()
+        await writer.enqueue(make_record(sample_user.id))
+        await writer.enqueue(make_record(sample_user.id))
+        await writer.stop()
+        
+        stats = writer.stats()
+        assert stats["flush_failures"] == 1
+        assert stats["failed_rows"] == 2
+        assert stats["flushed_rows"] == 0
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
+from app.gazetteer import Gazetteer
 
 class TestMainAPI:
     
@@ -10,6 +11,24 @@ class TestMainAPI:
         assert response.status_code == 200
         assert response.json() == {"status": "ok", "service": "skyPeek"}
     
+    def test_cache_stats(self, client):
+        """Тест эндпоинта статистики кэшей"""
+        response = client.get("/api/cache/stats")
+        assert response.status_code == 200
+        
+        geocoding = response.json()["geocoding"]
+        for key in ("size", "hits", "misses", "evictions", "hit_ratio"):
+            assert key in geocoding
+    
+    def test_history_writer_stats(self, client):
+        """Тест эндпоинта состояния фоновой записи истории"""
+        response = client.get("/api/health/history-writer")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["running"] is False
+        assert data["flush_failures"] == 0
+    
     def test_home_page(self, client):
         """Тест главной страницы"""
         response = client.get("/")
@@ -55,7 +74,8 @@ class TestMainAPI:
             humidity=65,
             wind_speed=3.2,
             description="облачно",
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            query="Москва"
         )
         mock_get_weather.return_value = mock_weather
         
@@ -66,6 +86,34 @@ class TestMainAPI:
         assert data["temperature"] == 15.5
         assert data["humidity"] == 65
         assert data["description"] == "облачно"
+        assert "query" not in data
+    
+    @patch('app.main.weather_service.get_weather_by_city')
+    def test_get_weather_saves_history(self, mock_get_weather, client):
+        """Тест что успешный поиск сохраняется в историю пользователя"""
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        mock_get_weather.return_value = WeatherData(
+            city="Казань, Россия",
+            temperature=10.0,
+            feels_like=8.0,
+            humidity=70,
+            wind_speed=2.0,
+            description="ясно",
+            timestamp=datetime.now()
+        )
+        
+        response = client.get("/api/weather?city=Казань")
+        assert response.status_code == 200
+        assert "session_id" in response.cookies
+        
+        history = client.get("/api/history").json()
+        assert len(history) == 1
+        assert history[0]["city"] == "Казань, Россия"
+        
+        last_city = client.get("/api/last-city").json()
+        assert last_city["last_city"] == "Казань, Россия"
     
     def test_get_search_history_empty(self, client):
         """Тест получения пустой истории поиска"""
@@ -136,6 +184,32 @@ class TestMainAPI:
         assert data["overview"]["unique_cities"] == 2
         assert len(data["top_cities"]) == 2
     
+    @patch('app.main.weather_service.get_weather_by_city')
+    def test_get_stats_after_searches(self, mock_get_weather, client):
+        """Тест что статистика обновляется при новых поисках"""
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        for city in ["Казань, Россия", "Казань, Россия", "Омск, Россия"]:
+            mock_get_weather.return_value = WeatherData(
+                city=city,
+                temperature=10.0,
+                feels_like=8.0,
+                humidity=70,
+                wind_speed=2.0,
+                description="ясно",
+                timestamp=datetime.now()
+            )
+            assert client.get(f"/api/weather?city={city}").status_code == 200
+        
+        data = client.get("/api/stats").json()
+        assert data["overview"]["total_searches"] == 3
+        assert data["overview"]["total_users"] == 1
+        assert data["overview"]["unique_cities"] == 2
+        assert data["top_cities"][0]["city"] == "Казань, Россия"
+        assert data["top_cities"][0]["search_count"] == 2
+        assert sum(day["searches"] for day in data["daily_stats"]) == 3
+    
     def test_get_city_statistics_not_found(self, client):
         """Тест статистики по несуществующему городу"""
         response = client.get("/api/stats/city/NonexistentCity")
@@ -153,6 +227,53 @@ class TestMainAPI:
         assert data["statistics"]["unique_users"] == 1
         assert data["weather_averages"]["temperature"] == 15.5
     
+    def test_get_city_statistics_aggregates(self, client, db_session, sample_user):
+        """Тест агрегатов статистики по городу"""
+        from app.models import User, SearchHistory
+        from app.rollups import build_rollup_statements
+        from datetime import datetime, timedelta
+        
+        other_user = User(session_id="test-session-other")
+        db_session.add(other_user)
+        db_session.commit()
+        
+        started = datetime.now() - timedelta(days=2)
+        rows = [
+            (sample_user.id, 10.0, 60, 2.0, "дождь"),
+            (sample_user.id, 14.0, 70, 4.0, "облачно"),
+            (other_user.id, 12.0, 80, 3.0, "дождь"),
+            (other_user.id, 20.0, 50, 1.0, "ясно")
+        ]
+        for index, (user_id, temp, humidity, wind, description) in enumerate(rows):
+            db_session.add(SearchHistory(
+                user_id=user_id,
+                city="Казань, Россия",
+                temperature=temp,
+                feels_like=temp,
+                humidity=humidity,
+                wind_speed=wind,
+                description=description,
+                searched_at=started + timedelta(hours=index)
+            ))
+        for statement in build_rollup_statements("sqlite", [{"city": "Казань, Россия"}] * len(rows)):
+            db_session.execute(statement)
+        db_session.commit()
+        
+        response = client.get("/api/stats/city/казань")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["statistics"]["total_searches"] == 4
+        assert data["statistics"]["unique_users"] == 2
+        assert data["statistics"]["first_search"].startswith(started.isoformat()[:19])
+        assert data["weather_averages"] == {
+            "temperature": 14.0,
+            "humidity": 65.0,
+            "wind_speed": 2.5
+        }
+        assert data["popular_conditions"][0] == {"condition": "дождь", "count": 2}
+        assert len(data["popular_conditions"]) == 3
+    
     def test_search_cities_short_query(self, client):
         """Тест поиска городов с коротким запросом"""
         response = client.get("/api/cities?q=M")
@@ -165,25 +286,19 @@ class TestMainAPI:
         assert response.status_code == 200
         assert response.json()["cities"] == []
     
-    @patch('httpx.AsyncClient')
-    def test_search_cities_success(self, mock_client, client, sample_search_history, sample_user):
-        """Тест успешного поиска городов"""
-        from unittest.mock import MagicMock
-        
-        mock_response = MagicMock()
-        mock_response.json.return_value = [
+    @patch('app.main.get_gazetteer', return_value=Gazetteer())
+    @patch('app.main.weather_service.autocomplete_cities', new_callable=AsyncMock)
+    def test_search_cities_success(self, mock_autocomplete, mock_gazetteer, client, sample_search_history, sample_user):
+        """Тест успешного поиска городов (справочник пуст - подсказки из API)"""
+        mock_autocomplete.return_value = [
             {
                 "name": "Moscow",
-                "lat": 55.7558,
-                "lon": 37.6176,
-                "country": "RU"
+                "latitude": 55.7558,
+                "longitude": 37.6176,
+                "country": "RU",
+                "state": ""
             }
         ]
-        mock_response.raise_for_status = MagicMock()
-        
-        mock_client_instance = AsyncMock()
-        mock_client_instance.__aenter__.return_value.get.return_value = mock_response
-        mock_client.return_value = mock_client_instance
         
         response = client.get("/api/cities?q=Мос")
         assert response.status_code == 200
@@ -195,4 +310,431 @@ class TestMainAPI:
         # Проверяем что есть результат из истории
         history_cities = [city for city in cities if city["source"] == "history"]
         assert len(history_cities) >= 1
-        assert "Москва" in history_cities[0]["name"]
\ No newline at end of file
+        assert "Москва" in history_cities[0]["name"]
+        
+        # Проверяем что результат API тоже добавлен
+        api_cities = [city for city in cities if city["source"] == "api"]
+        assert api_cities[0]["name"] == "Moscow, RU"
+    
+    @patch('app.main.weather_service.autocomplete_cities', new_callable=AsyncMock)
+    def test_search_cities_from_gazetteer(self, mock_autocomplete, client):
+        """Тест что справочник отвечает без обращения к Geocoding API"""
+        mock_autocomplete.return_value = []
+        
+        response = client.get("/api/cities?q=ка")
+        assert response.status_code == 200
+        cities = response.json()["cities"]
+        assert len(cities) >= 5
+        assert all(city["source"] == "gazetteer" for city in cities)
+        assert cities[0] == {"name": "Каир, EG", "source": "gazetteer", "location_id": "30.0444,31.2357"}
+        mock_autocomplete.assert_not_called()
+        
+        response = client.get("/api/cities?q=новг")
+        assert response.status_code == 200
+        assert [city["name"] for city in response.json()["cities"][:2]] == [
+            "Нижний Новгород, RU", "Великий Новгород, RU"
+        ]
+        
+        response = client.get("/api/cities?q=Мос")
+        cities = response.json()["cities"]
+        assert cities[0]["name"] == "Москва, RU"
+        
+        # Набралось меньше 5 подсказок - API вызывается, но дубли справочника отбрасываются
+        mock_autocomplete.return_value = [
+            {"name": "Moscow", "latitude": 55.7558, "longitude": 37.6176, "country": "RU", "state": ""},
+            {"name": "Mosby", "latitude": 58.2, "longitude": 7.9, "country": "NO", "state": ""}
+        ]
+        response = client.get("/api/cities?q=Мос")
+        assert response.json()["cities"] == [
+            {"name": "Москва, RU", "source": "gazetteer", "location_id": "55.7558,37.6173"},
+            {"name": "Mosby, NO", "source": "api", "location_id": "58.2000,7.9000"}
+        ]
+    
+    @patch('app.main.AUTOCOMPLETE_API_FALLBACK', False)
+    @patch('app.main.weather_service.autocomplete_cities', new_callable=AsyncMock)
+    def test_search_cities_api_fallback_disabled(self, mock_autocomplete, client):
+        """Тест отключения запасного поиска через Geocoding API"""
+        response = client.get("/api/cities?q=xyzzy")
+        assert response.status_code == 200
+        assert response.json()["cities"] == []
+        mock_autocomplete.assert_not_called()
+    
+    @patch('app.main.get_gazetteer', return_value=Gazetteer())
+    @patch('app.main.weather_service.autocomplete_cities', new_callable=AsyncMock)
+    def test_search_cities_history_case_insensitive(self, mock_autocomplete, mock_gazetteer, client, sample_search_history):
+        """Тест поиска по истории без учета регистра кириллицы"""
+        mock_autocomplete.return_value = []
+        
+        response = client.get("/api/cities?q=санкт")
+        assert response.status_code == 200
+        assert response.json()["cities"] == [
+            {"name": "Санкт-Петербург, Россия", "source": "history"}
+        ]
+    
+    def test_lifespan_opens_and_closes_http_client(self, test_db):
+        """Тест что пул соединений живет вместе с приложением"""
+        from app.main import app, weather_service
+        
+        with TestClient(app) as client:
+            http_client = weather_service._client
+            assert http_client is not None
+            assert not http_client.is_closed
+            assert client.get("/api/health").status_code == 200
+        
+        assert http_client.is_closed
+        assert weather_service._client is None
+
+class TestWeatherByLocation:
+    
+    @staticmethod
+    def make_weather(city: str, latitude: float, longitude: float):
+        from app.weather_service import WeatherData, make_location_id
+        from datetime import datetime
+        
+        return WeatherData(
+            city=city,
+            temperature=10.0,
+            feels_like=8.0,
+            humidity=70,
+            wind_speed=2.0,
+            description="ясно",
+            timestamp=datetime.now(),
+            latitude=latitude,
+            longitude=longitude,
+            location_id=make_location_id(latitude, longitude)
+        )
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    @patch('app.main.weather_service.get_weather_by_location', new_callable=AsyncMock)
+    def test_weather_by_coordinates(self, mock_by_location, mock_by_city, client):
+        """Тест запроса погоды по координатам без геокодирования"""
+        mock_by_location.return_value = self.make_weather("Казань, RU", 55.7887, 49.1221)
+        
+        response = client.get("/api/weather?lat=55.7887&lon=49.1221")
+        assert response.status_code == 200
+        assert response.json()["location_id"] == "55.7887,49.1221"
+        mock_by_location.assert_awaited_once_with(55.7887, 49.1221)
+        mock_by_city.assert_not_called()
+    
+    @patch('app.main.weather_service.get_weather_by_location', new_callable=AsyncMock)
+    def test_weather_by_location_id(self, mock_by_location, client):
+        """Тест запроса погоды по location_id из ответа или подсказки"""
+        mock_by_location.return_value = self.make_weather("Казань, RU", 55.7887, 49.1221)
+        
+        response = client.get("/api/weather?location_id=55.7887,49.1221")
+        assert response.status_code == 200
+        assert response.json()["city"] == "Казань, RU"
+        mock_by_location.assert_awaited_once_with(55.7887, 49.1221)
+        
+        mock_by_location.return_value = None
+        assert client.get("/api/weather?location_id=0.0000,0.0000").status_code == 404
+    
+    def test_weather_invalid_location(self, client):
+        """Тест некорректных координат и location_id"""
+        assert client.get("/api/weather?location_id=abc").status_code == 400
+        assert client.get("/api/weather?location_id=95.0,10.0").status_code == 400
+        assert client.get("/api/weather?lat=95&lon=10").status_code == 422
+        assert client.get("/api/weather?lat=55.0").status_code == 422
+    
+    @patch('app.main.weather_service.autocomplete_cities', new_callable=AsyncMock)
+    def test_suggestion_name_used_for_location_lookup(self, mock_autocomplete, client):
+        """Тест что название из подсказки используется для ответа по location_id"""
+        from app.main import weather_service
+        
+        mock_autocomplete.return_value = []
+        suggestion = client.get("/api/cities?q=казань").json()["cities"][0]
+        assert suggestion["name"] == "Казань, RU"
+        
+        weather_response = {
+            "temperature": 5.0,
+            "feels_like": 3.0,
+            "humidity": 80,
+            "wind_speed": 4.0,
+            "description": "снег",
+            "name": "Kazan",
+            "country": "RU"
+        }
+        with patch.object(weather_service, "_fetch_weather", new_callable=AsyncMock) as mock_fetch:
+            mock_fetch.return_value = weather_response
+            response = client.get(f"/api/weather?location_id={suggestion['location_id']}")
+        
+        assert response.status_code == 200
+        assert response.json()["city"] == "Казань, RU"
+        mock_fetch.assert_awaited_once()
+
+class TestUpstreamErrors:
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_rate_limited_returns_429(self, mock_get_weather, client):
+        """Тест что исчерпанная квота API дает 429 с Retry-After"""
+        from app.exceptions import UpstreamRateLimited
+        mock_get_weather.side_effect = UpstreamRateLimited(retry_after=12.3)
+        
+        response = client.get("/api/weather?city=Москва")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "13"
+        assert "лимит" in response.json()["detail"]
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_unavailable_returns_503(self, mock_get_weather, client):
+        """Тест что недоступность API дает 503"""
+        from app.exceptions import UpstreamUnavailable
+        mock_get_weather.side_effect = UpstreamUnavailable()
+        
+        response = client.get("/api/weather?city=Москва")
+        assert response.status_code == 503
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_open_circuit_returns_retry_after(self, mock_get_weather, client):
+        """Тест что при разомкнутой цепи 503 сообщает, когда повторить запрос"""
+        from app.exceptions import UpstreamUnavailable
+        mock_get_weather.side_effect = UpstreamUnavailable(retry_after=7.2)
+        
+        response = client.get("/api/weather?city=Москва")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "8"
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_batch_reports_upstream_errors(self, mock_get_weather, client):
+        """Тест что в пакетном запросе ошибка API отличается от ненайденного города"""
+        from app.exceptions import UpstreamRateLimited
+        mock_get_weather.side_effect = [UpstreamRateLimited(), None]
+        
+        response = client.post("/api/weather/batch", json={"items": [{"city": "Москва"}, {"city": "Нигде"}]})
+        results = response.json()["results"]
+        assert results[0]["status"] == "error"
+        assert "лимит" in results[0]["error"]
+        assert results[1]["status"] == "not_found"
+    
+    def test_upstream_health(self, client):
+        """Тест эндпоинта состояния погодного API"""
+        response = client.get("/api/health/upstream")
+        assert response.status_code == 200
+        assert set(response.json()["rate_limit"]["queued"]) == {"user", "autocomplete", "background"}
+        assert response.json()["circuit_breaker"]["state"] == "closed"
+
+class TestWeatherBatch:
+    
+    @staticmethod
+    def make_weather(city: str, temperature: float = 10.0):
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        return WeatherData(
+            city=city,
+            temperature=temperature,
+            feels_like=temperature - 2,
+            humidity=70,
+            wind_speed=2.0,
+            description="ясно",
+            timestamp=datetime.now()
+        )
+    
+    @patch('app.main.weather_service.get_weather_by_location', new_callable=AsyncMock)
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_batch_mixed_results(self, mock_by_city, mock_by_location, client):
+        """Тест пакетного запроса с успешными и неудачными элементами"""
+        async def by_city(city):
+            if city == "Нигде":
+                return None
+            if city == "Ошибка":
+                raise RuntimeError("upstream")
+            return self.make_weather(f"{city}, RU")
+        
+        mock_by_city.side_effect = by_city
+        mock_by_location.return_value = self.make_weather("Kazan, RU", 5.0)
+        
+        response = client.post("/api/weather/batch", json={"items": [
+            {"city": "Москва"},
+            {"city": "Нигде"},
+            {"lat": 55.79, "lon": 49.12},
+            {"city": "Ошибка"}
+        ]})
+        assert response.status_code == 200
+        assert "session_id" in response.cookies
+        
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == ["ok", "not_found", "ok", "error"]
+        assert results[0]["weather"]["city"] == "Москва, RU"
+        assert results[2]["query"] == {"lat": 55.79, "lon": 49.12}
+        assert results[2]["weather"]["temperature"] == 5.0
+        mock_by_location.assert_awaited_once_with(55.79, 49.12)
+        
+        # В историю попадают только успешные поиски
+        history = client.get("/api/history").json()
+        assert sorted(item["city"] for item in history) == ["Kazan, RU", "Москва, RU"]
+    
+    @patch('app.main.WEATHER_BATCH_CONCURRENCY', 3)
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_batch_concurrency_is_bounded(self, mock_by_city, client):
+        """Тест что одновременно обрабатывается не больше WEATHER_BATCH_CONCURRENCY элементов"""
+        import asyncio
+        running = 0
+        max_running = 0
+        
+        async def by_city(city):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return self.make_weather(city)
+        
+        mock_by_city.side_effect = by_city
+        
+        response = client.post("/api/weather/batch", json={
+            "items": [{"city": f"Город {i}"} for i in range(10)]
+        })
+        assert response.status_code == 200
+        assert all(result["status"] == "ok" for result in response.json()["results"])
+        assert max_running == 3
+    
+    def test_batch_validation(self, client):
+        """Тест проверки тела пакетного запроса"""
+        assert client.post("/api/weather/batch", json={"items": []}).status_code == 422
+        assert client.post("/api/weather/batch", json={"items": [{"lat": 55.0}]}).status_code == 422
+        assert client.post("/api/weather/batch", json={"items": [{"city": " "}]}).status_code == 422
+        assert client.post("/api/weather/batch", json={"items": [{"lat": 95, "lon": 0}]}).status_code == 422
+    
+    @patch('app.main.WEATHER_BATCH_MAX_ITEMS', 2)
+    def test_batch_too_many_items(self, client):
+        """Тест ограничения размера пакета"""
+        response = client.post("/api/weather/batch", json={
+            "items": [{"city": "Москва"}, {"city": "Казань"}, {"city": "Сочи"}]
+        })
+        assert response.status_code == 400
+
+class TestSignedSessions:
+    
+    @pytest.fixture(autouse=True)
+    def signed_sessions(self):
+        from app.sessions import session_cookies
+        with patch.object(session_cookies, "enabled", True):
+            yield session_cookies
+    
+    @staticmethod
+    def count_users(db_session):
+        from app.models import User
+        db_session.expire_all()
+        return db_session.query(User).count()
+    
+    def test_read_endpoints_do_not_create_users(self, client, db_session):
+        """Тест что эндпоинты чтения не создают пользователей"""
+        assert client.get("/api/history").json() == []
+        assert client.get("/api/last-city").json() == {"last_city": None}
+        assert client.get("/api/history", cookies={"session_id": "1.forged.signature"}).json() == []
+        response = client.get("/api/history", headers={"Cookie": "session_id=1.abc.\xe9".encode("latin-1")})
+        assert response.status_code == 200
+        assert response.json() == []
+        
+        assert self.count_users(db_session) == 0
+        assert "session_id" not in client.cookies
+    
+    @patch('app.main.weather_service.get_weather_by_city')
+    def test_user_created_on_first_search(self, mock_get_weather, client, db_session, signed_sessions):
+        """Тест что пользователь создается при первом поиске и хранится в подписанной cookie"""
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        mock_get_weather.return_value = WeatherData(
+            city="Казань, Россия",
+            temperature=10.0,
+            feels_like=8.0,
+            humidity=70,
+            wind_speed=2.0,
+            description="ясно",
+            timestamp=datetime.now()
+        )
+        
+        response = client.get("/api/weather?city=Казань")
+        assert response.status_code == 200
+        user = signed_sessions.load(response.cookies["session_id"])
+        assert user is not None
+        assert self.count_users(db_session) == 1
+        
+        # Повторный поиск не создает пользователя и не переустанавливает cookie
+        response = client.get("/api/weather?city=Казань")
+        assert "session_id" not in response.cookies
+        assert self.count_users(db_session) == 1
+        
+        history = client.get("/api/history").json()
+        assert len(history) == 2
+        assert client.get("/api/last-city").json()["last_city"] == "Казань, Россия"
+    
+    @patch('app.main.weather_service.get_weather_by_city')
+    def test_legacy_cookie_keeps_history(self, mock_get_weather, client, db_session, sample_search_history, sample_user, signed_sessions):
+        """Тест что старая неподписанная cookie заменяется подписанной для того же пользователя"""
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        mock_get_weather.return_value = WeatherData(
+            city="Казань, Россия",
+            temperature=10.0,
+            feels_like=8.0,
+            humidity=70,
+            wind_speed=2.0,
+            description="ясно",
+            timestamp=datetime.now()
+        )
+        
+        response = client.get("/api/weather?city=Казань", cookies={"session_id": sample_user.session_id})
+        assert response.status_code == 200
+        assert signed_sessions.load(response.cookies["session_id"]).id == sample_user.id
+        assert self.count_users(db_session) == 1
+        
+        history = client.get("/api/history", cookies={"session_id": response.cookies["session_id"]}).json()
+        assert len(history) == 3
+
+class TestQueryBudget:
+    """Число SQL-запросов эндпоинтов: рост означает лишние обращения к БД (N+1 и т.п.)"""
+    
+    @staticmethod
+    def make_weather(city: str):
+        from app.weather_service import WeatherData
+        from datetime import datetime
+        
+        return WeatherData(
+            city=city, temperature=5.0, feels_like=3.0, humidity=80,
+            wind_speed=2.0, description="снег", timestamp=datetime.now()
+        )
+    
+    def test_read_endpoints(self, client, query_budget, sample_search_history, sample_user):
+        """Тест бюджета запросов эндпоинтов чтения"""
+        cookies = {"session_id": sample_user.session_id}
+        
+        # Пользователь и история
+        with query_budget(2):
+            client.get("/api/history", cookies=cookies)
+        with query_budget(2):
+            client.get("/api/last-city", cookies=cookies)
+        # Топ городов, итоги (поиски и пользователи), число городов, дни
+        with query_budget(4):
+            client.get("/api/stats")
+        # Сводка и дни, без загрузки записей истории
+        with query_budget(2):
+            client.get("/api/stats/city/Москва")
+    
+    @patch('app.main.AUTOCOMPLETE_API_FALLBACK', False)
+    def test_search_cities(self, client, query_budget, sample_search_history):
+        """Тест что автодополнение делает один запрос к сводной таблице"""
+        with query_budget(1):
+            client.get("/api/cities?q=Мос")
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_weather_search(self, mock_get_weather, client, query_budget, sample_user):
+        """Тест бюджета поиска погоды: пользователь, запись истории и две сводные таблицы"""
+        mock_get_weather.return_value = self.make_weather("Москва, RU")
+        
+        with query_budget(5):
+            client.get("/api/weather?city=Москва", cookies={"session_id": sample_user.session_id})
+        with query_budget(5):
+            client.get("/api/weather?city=Москва")
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_batch_does_not_grow_with_items(self, mock_get_weather, client, query_budget, sample_user):
+        """Тест что пакетный запрос пишет историю одним INSERT независимо от размера"""
+        mock_get_weather.side_effect = lambda city: self.make_weather(city)
+        items = [{"city": f"Город {i}"} for i in range(10)]
+        
+        with query_budget(5):
+            client.post("/api/weather/batch", json={"items": items}, cookies={"session_id": sample_user.session_id})
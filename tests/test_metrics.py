@@ -0,0 +1,116 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from unittest.mock import AsyncMock, patch
+from app.db_instrumentation import instrument_engine
+from app.metrics import Metric, MetricsMiddleware, MetricsRegistry
+
+class TestMetricsRegistry:
+    
+    def test_histogram_render(self):
+        """Тест текстового формата гистограммы: накопительные бакеты, сумма, количество"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Тест", ("route",), buckets=(0.1, 1))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5, "/a")
+        
+        lines = registry.render().splitlines()
+        assert lines[:2] == ["# HELP test_seconds Тест", "# TYPE test_seconds histogram"]
+        assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{route="/a",le="1"} 2' in lines
+        assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'test_seconds_sum{route="/a"} 5.55' in lines
+        assert 'test_seconds_count{route="/a"} 3' in lines
+    
+    def test_collected_metric(self):
+        """Тест метрик, вычисляемых при сборе, и экранирования меток"""
+        registry = MetricsRegistry()
+        registry.collected("test_size", "Размер", lambda: [({"name": 'a"b'}, 3)])
+        registry.collected("test_broken", "Ошибка", lambda: 1 / 0)
+        
+        text_format = registry.render()
+        assert 'test_size{name="a\\"b"} 3' in text_format
+        assert "test_broken" not in text_format
+
+    def test_metric_requires_samples(self):
+        """Тест что метрику без samples создать нельзя"""
+        with pytest.raises(TypeError):
+            Metric("test_total", "Тест")
+
+class TestMetricsMiddleware:
+    
+    def test_route_template_label(self):
+        """Тест что запросы группируются по шаблону маршрута, а не по пути"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("requests_seconds", "Запросы", ("method", "route", "status"))
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, histogram=histogram)
+        
+        @app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            return {"id": item_id}
+        
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+        
+        assert histogram.count("GET", "/items/{item_id}", "200") == 2
+        assert histogram.count("GET", "unmatched", "404") == 1
+
+class TestEngineInstrumentation:
+    
+    def test_queries_counted_by_operation(self):
+        """Тест учета SQL-запросов по типу"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("queries_seconds", "Запросы", ("operation",))
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, histogram=histogram)
+        
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+            conn.execute(text("SELECT x FROM t")).all()
+            conn.execute(text("  select x from t")).all()
+        
+        assert histogram.count("SELECT") == 2
+        assert histogram.count("INSERT") == 1
+        assert histogram.count("OTHER") == 1
+
+class TestMetricsEndpoint:
+    
+    @patch('app.main.weather_service.get_weather_by_city', new_callable=AsyncMock)
+    def test_metrics_endpoint(self, mock_get_weather, client):
+        """Тест эндпоинта /metrics"""
+        mock_get_weather.return_value = None
+        client.get("/api/weather?city=Нигде")
+        
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'skypeek_http_request_duration_seconds_count{method="GET",route="/api/weather",status="404"}' in response.text
+        assert 'skypeek_upstream_circuit_state{state="closed"} 1' in response.text
+        assert "# TYPE skypeek_db_pool_connections gauge" in response.text
+    
+    @pytest.mark.asyncio
+    async def test_upstream_calls_recorded(self):
+        """Тест что обращения к погодному API учитываются по операции и исходу"""
+        from app.exceptions import UpstreamUnavailable
+        from app.metrics import upstream_request_duration
+        from app.weather_service import WeatherService
+        import httpx
+        
+        service = WeatherService()
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = httpx.ConnectError("down")
+        before = upstream_request_duration.count(service.provider.name, "geocode", "unavailable")
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await service.startup()
+            with pytest.raises(UpstreamUnavailable):
+                await service.get_city_coordinates("Москва")
+        
+        assert upstream_request_duration.count(service.provider.name, "geocode", "unavailable") == before + 1
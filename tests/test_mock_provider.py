@@ -0,0 +1,85 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.exceptions import UpstreamUnavailable
+from app.gazetteer import get_gazetteer
+from app.mock_provider import MockProvider, create_app
+from app.providers import OpenWeatherMapProvider
+from app.weather_service import WeatherService
+
+def make_mock(**kwargs) -> MockProvider:
+    kwargs.setdefault("latency", 0)
+    kwargs.setdefault("latency_jitter", 0)
+    kwargs.setdefault("error_rate", 0)
+    kwargs.setdefault("rate_limit_rate", 0)
+    return MockProvider(gazetteer=get_gazetteer(), **kwargs)
+
+class TestMockProvider:
+    
+    def test_geocode_from_gazetteer(self):
+        """Тест геокодирования по справочнику городов"""
+        client = TestClient(create_app(make_mock()))
+        
+        places = client.get("/geo/1.0/direct", params={"q": "Moscow", "limit": 1}).json()
+        assert places == [{"name": "Moscow", "lat": 55.7558, "lon": 37.6173, "country": "RU", "state": ""}]
+        
+        assert client.get("/geo/1.0/direct", params={"q": "Xyzzy"}).json() == []
+    
+    def test_synthetic_cities(self):
+        """Тест что в режиме synthetic_cities находится любой город, всегда в одном месте"""
+        client = TestClient(create_app(make_mock(synthetic_cities=True)))
+        
+        first = client.get("/geo/1.0/direct", params={"q": "Город-1234"}).json()
+        second = client.get("/geo/1.0/direct", params={"q": "город-1234"}).json()
+        assert len(first) == 1
+        assert (first[0]["lat"], first[0]["lon"]) == (second[0]["lat"], second[0]["lon"])
+    
+    def test_weather_is_deterministic(self):
+        """Тест что погода зависит только от координат"""
+        client = TestClient(create_app(make_mock()))
+        params = {"lat": 55.7558, "lon": 37.6173}
+        
+        first = client.get("/data/2.5/weather", params=params).json()
+        assert first == client.get("/data/2.5/weather", params=params).json()
+        assert first["name"] == "Москва"
+        assert first["sys"]["country"] == "RU"
+        assert client.get("/stats").json()["requests"]["weather"] == 2
+    
+    def test_injected_errors(self):
+        """Тест внедрения ошибок 503 и 429"""
+        client = TestClient(create_app(make_mock(error_rate=1)))
+        assert client.get("/data/2.5/weather", params={"lat": 0, "lon": 0}).status_code == 503
+        
+        client = TestClient(create_app(make_mock(rate_limit_rate=1)))
+        response = client.get("/data/2.5/weather", params={"lat": 0, "lon": 0})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+class TestWeatherServiceWithMockProvider:
+    
+    @staticmethod
+    def make_service(mock: MockProvider) -> WeatherService:
+        service = WeatherService(OpenWeatherMapProvider(api_key="mock", base_url="http://mock"))
+        service._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(mock)))
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_weather_by_city(self):
+        """Тест полного цикла геокодирование -> погода через заглушку"""
+        service = self.make_service(make_mock())
+        
+        weather = await service.get_weather_by_city("Казань")
+        assert weather.city == "Казань, RU"
+        assert weather.location_id == "55.7887,49.1221"
+        assert await service.get_weather_by_city("Xyzzy") is None
+        await service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_upstream_errors(self):
+        """Тест что ошибки заглушки проходят через обработку ошибок API"""
+        service = self.make_service(make_mock(error_rate=1))
+        
+        with pytest.raises(UpstreamUnavailable):
+            await service.get_weather_by_city("Казань")
+        assert service.circuit_breaker.failures == 1
+        await service.shutdown()
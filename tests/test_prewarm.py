@@ -0,0 +1,167 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.cache import normalize_city_name
+from app.history import build_search_record, save_search_records
+from app.prewarm import CachePrewarmer
+from app.rate_limit import Priority
+from app.weather_service import WeatherService
+
+# Геокодер: город по названию из запроса (как у OpenWeatherMap, с регионом)
+PLACES = {
+    "москва": {"name": "Moscow", "state": "Moscow", "lat": 55.7558, "lon": 37.6176, "country": "RU"},
+    "казань": {"name": "Kazan", "state": "Tatarstan", "lat": 55.7963, "lon": 49.1088, "country": "RU"},
+    "тверь": {"name": "Tver", "state": "Tver Oblast", "lat": 56.8587, "lon": 35.9176, "country": "RU"}
+}
+
+def make_api_client() -> AsyncMock:
+    """Мок погодного API: геокодер и текущая погода"""
+    async def get(url, params):
+        response = MagicMock()
+        response.raise_for_status = MagicMock()
+        if "geo" in url:
+            place = PLACES.get(normalize_city_name(params["q"]))
+            response.json.return_value = [place] if place else []
+        else:
+            response.json.return_value = {
+                "main": {"temp": 5.0, "feels_like": 3.0, "humidity": 80},
+                "weather": [{"description": "облачно"}],
+                "wind": {"speed": 2.0}
+            }
+        return response
+    
+    client = AsyncMock()
+    client.is_closed = False
+    client.get.side_effect = get
+    return client
+
+def geocode_queries(client: AsyncMock) -> list:
+    return [call.kwargs["params"]["q"] for call in client.get.call_args_list if "geo" in call.args[0]]
+
+async def seed_stats(session_factory, user_id: int, searches=(("Москва", 3), ("Казань", 2), ("Тверь", 1)), locations=()):
+    """История поиска так, как ее пишет приложение: через поиск погоды
+    (по умолчанию популярность: Москва, Казань, Тверь)"""
+    service = WeatherService()
+    records = []
+    with patch('httpx.AsyncClient', return_value=make_api_client()):
+        await service.startup()
+        for city, count in searches:
+            weather = await service.get_weather_by_city(city)
+            records += [build_search_record(user_id, weather) for _ in range(count)]
+        for (latitude, longitude), count in locations:
+            weather = await service.get_weather_by_location(latitude, longitude)
+            records += [build_search_record(user_id, weather) for _ in range(count)]
+    async with session_factory() as db:
+        await save_search_records(db, records)
+
+class TestCachePrewarmer:
+    
+    @pytest.mark.asyncio
+    async def test_refreshes_top_cities_in_background(self, async_session_factory, sample_user):
+        """Тест что прогрев обновляет самые популярные города с фоновым приоритетом"""
+        await seed_stats(async_session_factory, sample_user.id)
+        service = WeatherService()
+        prewarmer = CachePrewarmer(
+            enabled=True, service=service, session_factory=async_session_factory, top_n=2
+        )
+        client = make_api_client()
+        
+        with patch('httpx.AsyncClient', return_value=client):
+            await service.startup()
+            await prewarmer.run_once()
+            
+            assert prewarmer.refreshed == 2
+            assert service.rate_limiter.granted[Priority.BACKGROUND] == 4
+            assert service.rate_limiter.granted[Priority.USER] == 0
+            # Геокодер получает названия, которые вводили пользователи, а не
+            # отображаемые "Kazan, Tatarstan, RU"
+            assert sorted(geocode_queries(client)) == ["Казань", "Москва"]
+            
+            # Запросы пользователей по популярным городам - попадание в кэш
+            weather = await service.get_weather_by_city("Казань")
+            assert weather.temperature == 5.0
+            assert weather.city == "Kazan, Tatarstan, RU"
+            await service.get_weather_by_city(" москва ")
+            assert service.rate_limiter.granted[Priority.USER] == 0
+            
+            # Свежие записи повторно не запрашиваются
+            await prewarmer.run_once()
+        
+        assert prewarmer.fresh == 2
+        assert prewarmer.stats()["runs"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_location_searches_warm_weather_only(self, async_session_factory, sample_user):
+        """Тест что места из поиска по координатам прогреваются без геокодера"""
+        await seed_stats(async_session_factory, sample_user.id, searches=(), locations=[((59.9386, 30.3141), 2)])
+        service = WeatherService()
+        prewarmer = CachePrewarmer(enabled=True, service=service, session_factory=async_session_factory)
+        client = make_api_client()
+        
+        with patch('httpx.AsyncClient', return_value=client):
+            await service.startup()
+            await prewarmer.run_once()
+            
+            assert prewarmer.refreshed == 1
+            assert geocode_queries(client) == []
+            assert service.rate_limiter.granted[Priority.BACKGROUND] == 1
+            
+            await service.get_weather_by_location(59.9386, 30.3141)
+            assert service.rate_limiter.granted[Priority.USER] == 0
+    
+    @pytest.mark.asyncio
+    async def test_skips_cities_without_location(self, async_session_factory, sample_user, make_record):
+        """Тест что строки статистики без координат и названия для поиска пропускаются"""
+        async with async_session_factory() as db:
+            await save_search_records(db, [make_record(sample_user.id, "Moscow, Moscow, RU")])
+        service = WeatherService()
+        prewarmer = CachePrewarmer(enabled=True, service=service, session_factory=async_session_factory)
+        client = make_api_client()
+        
+        with patch('httpx.AsyncClient', return_value=client):
+            await service.startup()
+            await prewarmer.run_once()
+        
+        assert client.get.call_count == 0
+        assert prewarmer.refreshed == 0
+    
+    @pytest.mark.asyncio
+    async def test_refreshes_entries_close_to_expiry(self, async_session_factory, sample_user):
+        """Тест что обновляются записи, которые устареют до следующего прохода"""
+        await seed_stats(async_session_factory, sample_user.id)
+        service = WeatherService()
+        service._weather_cache.ttl = 60
+        prewarmer = CachePrewarmer(
+            enabled=True, service=service, session_factory=async_session_factory,
+            top_n=1, interval=300
+        )
+        
+        with patch('httpx.AsyncClient', return_value=make_api_client()):
+            await service.startup()
+            await prewarmer.run_once()
+            await prewarmer.run_once()
+        
+        assert prewarmer.refreshed == 2
+        assert service.rate_limiter.granted[Priority.BACKGROUND] == 3
+    
+    @pytest.mark.asyncio
+    async def test_skips_when_circuit_open(self, async_session_factory, sample_user):
+        """Тест что при разомкнутой цепи прогрев не обращается к API"""
+        await seed_stats(async_session_factory, sample_user.id)
+        service = WeatherService()
+        service.circuit_breaker.failure_threshold = 1
+        service.circuit_breaker.record_failure()
+        prewarmer = CachePrewarmer(enabled=True, service=service, session_factory=async_session_factory)
+        
+        await prewarmer.run_once()
+        
+        assert prewarmer.skipped_runs == 1
+        assert prewarmer.refreshed == 0
+    
+    @pytest.mark.asyncio
+    async def test_disabled_prewarmer_does_not_start(self, async_session_factory):
+        """Тест что выключенный прогрев не запускает фоновую задачу"""
+        prewarmer = CachePrewarmer(enabled=False, session_factory=async_session_factory)
+        await prewarmer.start()
+        
+        assert prewarmer.stats()["running"] is False
+        await prewarmer.stop()
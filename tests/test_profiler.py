@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.main import app
+from app.profiler import Profile, ProfileStore, ProfilingMiddleware, SamplingProfiler, task_sampler, threads_sampler
+
+def _busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+async def _slow_dependency():
+    await asyncio.sleep(0.05)
+
+def create_test_app(store: ProfileStore) -> FastAPI:
+    test_app = FastAPI()
+    test_app.add_middleware(ProfilingMiddleware, store=store)
+
+    @test_app.get("/slow")
+    async def slow():
+        await _slow_dependency()
+        _busy(0.05)
+        return {"ok": True}
+
+    return test_app
+
+class TestSamplingProfiler:
+
+    def test_folded_format(self):
+        """Тест формата folded stacks: кадры через ';' и число сэмплов"""
+        profile = Profile("test", 0.01)
+        profile.add([("main", "handler"), ("main",)])
+        profile.add([("main", "handler")])
+        profile.add([()])
+
+        assert profile.samples == 3
+        assert profile.folded() == "main 1\nmain;handler 2\n"
+
+    def test_threads_sampler(self):
+        """Тест сэмплирования потоков: занятый поток виден в профиле с его именем"""
+        stop = threading.Event()
+        worker = threading.Thread(target=lambda: stop.wait(5), name="waiter")
+        worker.start()
+        try:
+            profiler = SamplingProfiler(threads_sampler(), "threads", 0.001)
+            profiler.start()
+            time.sleep(0.05)
+            profile = profiler.stop()
+        finally:
+            stop.set()
+            worker.join()
+
+        assert profile.samples > 0
+        assert profile.duration > 0
+        waiter_stacks = [stack for stack in profile.stacks if stack[0] == "thread waiter"]
+        assert waiter_stacks
+        assert any("<lambda>" in frame for stack in waiter_stacks for frame in stack)
+        # Поток профайлера в профиль не попадает
+        assert not any(stack[0] == "thread profiler" for stack in profile.stacks)
+
+    @pytest.mark.asyncio
+    async def test_task_sampler(self):
+        """Тест профиля задачи: и выполнение, и ожидание в await видны в стеках"""
+        async def handler():
+            await _slow_dependency()
+            _busy(0.05)
+
+        task = asyncio.ensure_future(handler())
+        profiler = SamplingProfiler(task_sampler(task, threading.get_ident()), "task", 0.002)
+        profiler.start()
+        await task
+        profile = profiler.stop()
+
+        folded = profile.folded()
+        assert "handler" in folded
+        assert "_slow_dependency" in folded
+        assert "<await" in folded
+        assert "_busy" in folded
+        # Стек задачи начинается с ее корутины, без кадров цикла событий
+        assert all(stack[0].startswith("handler ") for stack in profile.stacks)
+
+class TestProfilingMiddleware:
+
+    def test_disabled_without_token(self):
+        """Тест что без PROFILING_TOKEN профилирование выключено"""
+        store = ProfileStore(token="")
+        client = TestClient(create_test_app(store))
+
+        response = client.get("/slow", headers={"X-Profile-Token": ""})
+
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert store.list() == []
+
+    def test_wrong_token_is_ignored(self):
+        """Тест что запрос с неверным токеном выполняется без профилирования"""
+        store = ProfileStore(token="secret")
+        client = TestClient(create_test_app(store))
+
+        response = client.get("/slow", headers={"X-Profile-Token": "wrong"})
+
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert store.list() == []
+
+    def test_non_ascii_token_is_ignored(self):
+        """Тест что не-ASCII токен в заголовке не ломает запрос"""
+        store = ProfileStore(token="secret")
+        client = TestClient(create_test_app(store))
+        
+        response = client.get("/slow", headers={"X-Profile-Token": "\xe9".encode("latin-1")})
+        
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert store.list() == []
+    
+    def test_profiles_request(self):
+        """Тест профиля запроса: зависимость и обработчик в стеках, id в заголовке"""
+        store = ProfileStore(token="secret", interval=0.002)
+        client = TestClient(create_test_app(store))
+
+        response = client.get("/slow", headers={"X-Profile-Token": "secret"})
+
+        assert response.status_code == 200
+        profile = store.get(response.headers["x-profile-id"])
+        assert profile.description == "GET /slow"
+        assert profile.samples > 0
+        folded = profile.folded()
+        assert "_slow_dependency" in folded
+        assert "_busy" in folded
+
+    def test_keeps_last_profiles(self):
+        """Тест что хранятся только последние PROFILING_KEEP профилей"""
+        store = ProfileStore(token="secret", keep=2)
+
+        ids = [store.save(Profile(str(i), 0.01)) for i in range(3)]
+
+        assert [profile["id"] for profile in store.list()] == ids[1:]
+        assert store.get(ids[0]) is None
+
+class TestProfilingEndpoints:
+
+    @pytest.fixture
+    def profiling_enabled(self, monkeypatch):
+        from app import main
+        store = ProfileStore(token="secret", interval=0.002, max_duration=0.05)
+        monkeypatch.setattr(main, "profile_store", store)
+        return store
+
+    def test_hidden_without_token(self):
+        """Тест что без PROFILING_TOKEN эндпоинты профилирования не существуют"""
+        client = TestClient(app)
+
+        response = client.get("/api/debug/profiles")
+
+        assert response.status_code == 404
+
+    def test_requires_token(self, profiling_enabled):
+        """Тест отказа без правильного токена"""
+        client = TestClient(app)
+
+        assert client.get("/api/debug/profiles").status_code == 403
+        assert client.get("/api/debug/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+
+    def test_profile_window(self, profiling_enabled):
+        """Тест профиля по времени: длительность ограничена, профиль сохраняется"""
+        client = TestClient(app)
+        headers = {"X-Profile-Token": "secret"}
+
+        response = client.post("/api/debug/profile?seconds=30", headers=headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        profile_id = response.headers["x-profile-id"]
+        profiles = client.get("/api/debug/profiles", headers=headers).json()["profiles"]
+        assert profiles[0]["id"] == profile_id
+        assert profiles[0]["description"] == "window 0.05s"
+        assert profiles[0]["samples"] > 0
+        stored = client.get(f"/api/debug/profiles/{profile_id}", headers=headers)
+        assert stored.status_code == 200
+        assert stored.text == response.text
+        assert client.get("/api/debug/profiles/missing", headers=headers).status_code == 404
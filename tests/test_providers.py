@@ -0,0 +1,71 @@
+import pytest
+from app.providers import MockProvider, OpenWeatherMapProvider, WeatherProvider, create_provider
+
+class TestOpenWeatherMapProvider:
+    
+    def test_requests(self):
+        """Тест адресов и параметров запросов"""
+        provider = OpenWeatherMapProvider(api_key="key", base_url="http://localhost:8090/")
+        
+        url, params = provider.geocode_request("Москва", 1)
+        assert url == "http://localhost:8090/geo/1.0/direct"
+        assert params == {"q": "Москва", "limit": 1, "appid": "key"}
+        
+        url, params = provider.weather_request(55.75, 37.61)
+        assert url == "http://localhost:8090/data/2.5/weather"
+        assert params["units"] == "metric"
+    
+    def test_parse_geocode(self):
+        """Тест разбора ответа геокодера"""
+        provider = OpenWeatherMapProvider(api_key="key")
+        
+        assert provider.parse_geocode([]) == []
+        assert provider.parse_geocode([{"name": "Moscow", "lat": 55.75, "lon": 37.61, "country": "RU"}]) == [
+            {"name": "Moscow", "latitude": 55.75, "longitude": 37.61, "country": "RU", "state": ""}
+        ]
+    
+    def test_parse_weather(self):
+        """Тест разбора ответа текущей погоды"""
+        provider = OpenWeatherMapProvider(api_key="key")
+        
+        observation = provider.parse_weather({
+            "name": "Kazan",
+            "sys": {"country": "RU"},
+            "main": {"temp": 5.0, "feels_like": 3.0, "humidity": 80},
+            "weather": [{"description": "снег"}],
+            "wind": {}
+        })
+        assert observation == {
+            "temperature": 5.0, "feels_like": 3.0, "humidity": 80, "wind_speed": 0,
+            "description": "снег", "name": "Kazan", "country": "RU"
+        }
+
+class TestWeatherProvider:
+    
+    def test_incomplete_provider(self):
+        """Тест что провайдер без части методов не создается"""
+        class GeocodeOnlyProvider(WeatherProvider):
+            def geocode_request(self, query, limit):
+                return "http://localhost/geo", {"q": query}
+            
+            def parse_geocode(self, data):
+                return []
+        
+        with pytest.raises(TypeError):
+            GeocodeOnlyProvider()
+
+class TestCreateProvider:
+    
+    def test_mock_provider_url(self, monkeypatch):
+        """Тест что WEATHER_PROVIDER=mock направляет запросы в локальную заглушку"""
+        monkeypatch.setenv("MOCK_PROVIDER_URL", "http://127.0.0.1:9999")
+        provider = create_provider("mock")
+        
+        assert isinstance(provider, MockProvider)
+        assert provider.name == "mock"
+        assert provider.weather_url == "http://127.0.0.1:9999/data/2.5/weather"
+    
+    def test_unknown_provider(self):
+        """Тест неизвестного провайдера"""
+        with pytest.raises(ValueError):
+            create_provider("nope")
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db_instrumentation import instrument_engine
+from app.query_stats import QueryStatsMiddleware, count_queries, track_queries
+
+class TestQueryStats:
+    
+    def test_track_queries(self):
+        """Тест учета запросов, строк и времени в текущем контексте"""
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            with track_queries(keep_statements=True) as stats:
+                conn.execute(text("INSERT INTO t VALUES (1), (2), (3)"))
+                conn.execute(text("SELECT x FROM t")).all()
+            conn.execute(text("SELECT x FROM t")).all()
+        
+        assert stats.statements == 2
+        assert stats.rows == 3
+        assert stats.duration > 0
+        assert stats.statement_log[0] == "INSERT INTO t VALUES (1), (2), (3)"
+    
+    @pytest.mark.asyncio
+    async def test_async_engine(self):
+        """Тест что запросы асинхронного движка попадают в статистику текущего контекста"""
+        engine = create_async_engine("sqlite+aiosqlite://")
+        instrument_engine(engine.sync_engine)
+        
+        async def run_queries(count: int):
+            with track_queries() as stats:
+                async with engine.connect() as conn:
+                    for _ in range(count):
+                        await conn.execute(text("SELECT 1"))
+            return stats.statements
+        
+        assert await asyncio.gather(run_queries(1), run_queries(3)) == [1, 3]
+        await engine.dispose()
+    
+    def test_count_queries_detaches(self):
+        """Тест что count_queries перестает считать после выхода из блока"""
+        engine = create_engine("sqlite://")
+        
+        with engine.connect() as conn:
+            with count_queries(engine) as stats:
+                conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+        
+        assert stats.statements == 1
+
+class TestQueryStatsMiddleware:
+    
+    def make_app(self, enabled: bool) -> FastAPI:
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        app = FastAPI()
+        app.add_middleware(QueryStatsMiddleware, enabled=enabled)
+        
+        @app.get("/")
+        def endpoint():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+            return {}
+        
+        return app
+    
+    def test_server_timing_header(self):
+        """Тест заголовка Server-Timing в режиме отладки"""
+        response = TestClient(self.make_app(enabled=True)).get("/")
+        
+        server_timing = response.headers["server-timing"]
+        assert server_timing.startswith("db;dur=")
+        assert 'desc="2 queries, 0 rows"' in server_timing
+        assert "app;dur=" in server_timing
+    
+    def test_disabled(self):
+        """Тест что без режима отладки заголовок не добавляется"""
+        response = TestClient(self.make_app(enabled=False)).get("/")
+        assert "server-timing" not in response.headers
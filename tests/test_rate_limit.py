@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from app.rate_limit import Priority, RateLimitExceeded, TokenBucketLimiter
+
+class TestTokenBucketLimiter:
+    
+    @pytest.mark.asyncio
+    async def test_burst_then_rate(self):
+        """Тест что сначала доступен запас capacity, затем запросы идут со скоростью rate"""
+        limiter = TokenBucketLimiter(rate=50, capacity=3)
+        loop = asyncio.get_running_loop()
+        
+        started = loop.time()
+        for _ in range(3):
+            await limiter.acquire()
+        assert loop.time() - started < 0.01
+        
+        await limiter.acquire()
+        assert loop.time() - started >= 0.015
+        assert limiter.granted[Priority.USER] == 4
+    
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        """Тест что при нехватке токенов первыми обслуживаются запросы пользователей"""
+        limiter = TokenBucketLimiter(rate=100, capacity=1)
+        await limiter.acquire()
+        order = []
+        
+        async def request(priority, name):
+            await limiter.acquire(priority)
+            order.append(name)
+        
+        await asyncio.gather(
+            request(Priority.BACKGROUND, "background"),
+            request(Priority.AUTOCOMPLETE, "autocomplete"),
+            request(Priority.USER, "user-1"),
+            request(Priority.USER, "user-2")
+        )
+        
+        assert order == ["user-1", "user-2", "autocomplete", "background"]
+    
+    @pytest.mark.asyncio
+    async def test_deadline_exceeded(self):
+        """Тест что ожидание ограничено дедлайном класса приоритета"""
+        limiter = TokenBucketLimiter(rate=1, capacity=1, max_wait={Priority.AUTOCOMPLETE: 0.01})
+        await limiter.acquire()
+        
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            await limiter.acquire(Priority.AUTOCOMPLETE)
+        assert 0 < exc_info.value.retry_after <= 1
+        assert limiter.rejected[Priority.AUTOCOMPLETE] == 1
+    
+    @pytest.mark.asyncio
+    async def test_expired_waiter_does_not_consume_token(self):
+        """Тест что ушедший по дедлайну запрос не забирает токен у следующих"""
+        limiter = TokenBucketLimiter(rate=20, capacity=1)
+        await limiter.acquire()
+        
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire(Priority.BACKGROUND, timeout=0.001)
+        
+        await limiter.acquire(Priority.USER, timeout=1)
+        assert limiter.granted[Priority.USER] == 2
+        assert limiter.granted[Priority.BACKGROUND] == 0
+    
+    @pytest.mark.asyncio
+    async def test_pause(self):
+        """Тест паузы после 429: токены не выдаются и не копятся"""
+        limiter = TokenBucketLimiter(rate=1000, capacity=5)
+        limiter.pause(60)
+        
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            await limiter.acquire(Priority.USER, timeout=0.01)
+        assert exc_info.value.retry_after > 59
+        
+        stats = limiter.stats()
+        assert stats["tokens"] == 0
+        assert stats["paused_for"] > 59
+    
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        """Тест что rate=0 отключает ограничение"""
+        limiter = TokenBucketLimiter(rate=0, capacity=0)
+        for _ in range(100):
+            await limiter.acquire()
+        assert limiter.stats()["enabled"] is False
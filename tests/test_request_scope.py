@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from app.request_scope import RequestScopeMiddleware, request_cache
+
+def http_scope(path: str = "/") -> dict:
+    return {"type": "http", "method": "GET", "path": path, "headers": []}
+
+async def call(app, scope: dict) -> list:
+    """Выполнить ASGI-запрос и вернуть отправленные сообщения"""
+    messages = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        messages.append(message)
+    
+    await app(scope, receive, send)
+    return messages
+
+class TestRequestScopeMiddleware:
+    
+    @pytest.mark.asyncio
+    async def test_cache_lives_for_one_request(self):
+        """Тест что кэш создается на запрос и исчезает после него"""
+        seen = []
+        
+        async def app(scope, receive, send):
+            cache = request_cache()
+            cache["value"] = scope["path"]
+            seen.append(cache)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        
+        middleware = RequestScopeMiddleware(app)
+        await call(middleware, http_scope("/a"))
+        await call(middleware, http_scope("/b"))
+        
+        assert seen == [{"value": "/a"}, {"value": "/b"}]
+        assert seen[0] is not seen[1]
+        assert request_cache() is None
+    
+    @pytest.mark.asyncio
+    async def test_cache_reset_on_exception(self):
+        """Тест что кэш очищается, даже если обработчик упал"""
+        async def app(scope, receive, send):
+            request_cache()["value"] = 1
+            raise RuntimeError("boom")
+        
+        with pytest.raises(RuntimeError):
+            await call(RequestScopeMiddleware(app), http_scope())
+        assert request_cache() is None
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_isolated(self):
+        """Тест что параллельные запросы не видят кэш друг друга"""
+        results = {}
+        
+        async def app(scope, receive, send):
+            request_cache()["path"] = scope["path"]
+            await asyncio.sleep(0.01)
+            results[scope["path"]] = request_cache()["path"]
+        
+        middleware = RequestScopeMiddleware(app)
+        await asyncio.gather(*(call(middleware, http_scope(f"/{i}")) for i in range(10)))
+        
+        assert results == {f"/{i}": f"/{i}" for i in range(10)}
+    
+    @pytest.mark.asyncio
+    async def test_lifespan_passed_through(self):
+        """Тест что не-HTTP события передаются без кэша"""
+        seen = []
+        
+        async def app(scope, receive, send):
+            seen.append(request_cache())
+        
+        await RequestScopeMiddleware(app)({"type": "lifespan"}, None, None)
+        assert seen == [None]
+
+class TestUserCache:
+    
+    @pytest.mark.asyncio
+    async def test_user_cached_within_request(self, async_session_factory):
+        """Тест что пользователь создается один раз за запрос"""
+        from app.dependencies import get_or_create_user
+        
+        async def app(scope, receive, send):
+            async with async_session_factory() as db:
+                first = await get_or_create_user(None, None, db)
+                second = await get_or_create_user(None, None, db)
+            scope["users"] = (first, second)
+        
+        scope = http_scope()
+        await call(RequestScopeMiddleware(app), scope)
+        
+        first, second = scope["users"]
+        assert first is second
+        assert first.id is not None
@@ -0,0 +1,117 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import select
+from app.history import save_search_records
+from app.models import CitySearchStats, DailySearchStats
+from app.rollups import build_rollup_statements, matching_cities, search_totals
+
+class TestRollups:
+    
+    def test_build_statements_aggregates_batch(self, make_record):
+        """Тест что пачка записей дает не больше двух запросов"""
+        records = [make_record(1, "Москва, Россия") for _ in range(50)]
+        records += [make_record(1, "Казань, Россия") for _ in range(50)]
+        
+        assert len(build_rollup_statements("sqlite", records)) == 2
+        assert build_rollup_statements("sqlite", []) == []
+    
+    def test_unsupported_dialect(self, make_record):
+        """Тест ошибки для неподдерживаемой БД"""
+        with pytest.raises(ValueError):
+            build_rollup_statements("mysql", [make_record(1, "Москва, Россия")])
+    
+    @pytest.mark.asyncio
+    async def test_rollups_updated_on_save(self, async_session_factory, sample_user, make_record):
+        """Тест инкрементального обновления сводных таблиц"""
+        yesterday = datetime.now() - timedelta(days=1)
+        now = datetime.now()
+        
+        async with async_session_factory() as db:
+            await save_search_records(db, [
+                make_record(sample_user.id, "Москва, Россия", yesterday),
+                make_record(sample_user.id, "Казань, Россия", yesterday)
+            ])
+            await save_search_records(db, [
+                make_record(sample_user.id, "Москва, Россия", now)
+            ])
+        
+        async with async_session_factory() as db:
+            moscow = await db.get(CitySearchStats, "Москва, Россия")
+            assert moscow.search_count == 2
+            assert moscow.last_searched.replace(tzinfo=None) == now.replace(tzinfo=None)
+            
+            kazan = await db.get(CitySearchStats, "Казань, Россия")
+            assert kazan.search_count == 1
+            
+            days = (await db.execute(
+                select(DailySearchStats).order_by(DailySearchStats.date)
+            )).scalars().all()
+            assert [(day.date, day.searches) for day in days] == [
+                (yesterday.date(), 2),
+                (now.date(), 1)
+            ]
+            
+            total_searches, total_users = (await db.execute(search_totals())).one()
+            assert total_searches == 3
+            assert total_users == 1
+    
+    @pytest.mark.asyncio
+    async def test_days_are_utc(self, async_session_factory, sample_user, make_record):
+        """Тест что поиск учитывается в дне по UTC, а не по часовому поясу записи"""
+        moscow_tz = timezone(timedelta(hours=3))
+        
+        async with async_session_factory() as db:
+            await save_search_records(db, [
+                make_record(sample_user.id, "Москва, Россия", datetime(2026, 10, 18, 1, 30, tzinfo=moscow_tz))
+            ])
+        
+        async with async_session_factory() as db:
+            day = await db.get(DailySearchStats, date(2026, 10, 17))
+            assert day.searches == 1
+    
+    @pytest.mark.asyncio
+    async def test_last_searched_not_moved_back(self, async_session_factory, sample_user, make_record):
+        """Тест что запоздавшая запись не сдвигает last_searched назад"""
+        now = datetime.now()
+        
+        async with async_session_factory() as db:
+            await save_search_records(db, [make_record(sample_user.id, "Москва, Россия", now)])
+            await save_search_records(db, [
+                make_record(sample_user.id, "Москва, Россия", now - timedelta(hours=1))
+            ])
+        
+        async with async_session_factory() as db:
+            moscow = await db.get(CitySearchStats, "Москва, Россия")
+            assert moscow.search_count == 2
+            assert moscow.last_searched.replace(tzinfo=None) == now
+    
+    @pytest.mark.asyncio
+    async def test_location_kept_for_prewarm(self, async_session_factory, sample_user, make_record):
+        """Тест что координаты и название для геокодера не затираются поиском без них"""
+        located = make_record(
+            sample_user.id, "Moscow, Moscow, RU", latitude=55.7558, longitude=37.6176, geocode_query="Москва"
+        )
+        
+        async with async_session_factory() as db:
+            await save_search_records(db, [located])
+            await save_search_records(db, [make_record(sample_user.id, "Moscow, Moscow, RU")])
+        
+        async with async_session_factory() as db:
+            moscow = await db.get(CitySearchStats, "Moscow, Moscow, RU")
+            assert moscow.search_count == 2
+            assert (moscow.latitude, moscow.longitude) == (55.7558, 37.6176)
+            assert moscow.geocode_query == "Москва"
+    
+    @pytest.mark.asyncio
+    async def test_matching_cities(self, async_session_factory, sample_search_history):
+        """Тест поиска городов по подстроке в сводной таблице"""
+        async with async_session_factory() as db:
+            cities = (await db.execute(matching_cities("  МОСКВА"))).scalars().all()
+            assert cities == ["Москва, Россия"]
+            
+            cities = (await db.execute(matching_cities("россия"))).scalars().all()
+            assert sorted(cities) == ["Москва, Россия", "Санкт-Петербург, Россия"]
+            
+            # Спецсимволы LIKE экранируются
+            assert (await db.execute(matching_cities("%"))).scalars().all() == []
+
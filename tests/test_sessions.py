@@ -0,0 +1,55 @@
+import pytest
+from app.sessions import SessionCookies, SessionUser
+
+class TestSessionCookies:
+    
+    @pytest.mark.parametrize("secret_key", ["", "change-me"])
+    def test_enabled_requires_real_secret_key(self, secret_key, monkeypatch):
+        """Тест что подписанные cookie не включаются без ключа или с ключом из примера"""
+        monkeypatch.delenv("SESSION_SECRET_KEY", raising=False)
+        
+        with pytest.raises(ValueError):
+            SessionCookies(enabled=True, secret_key=secret_key)
+        # Без подписанных cookie ключ не нужен
+        assert SessionCookies(enabled=False, secret_key=secret_key).enabled is False
+    
+    def test_sign_and_load(self):
+        """Тест что подписанная cookie восстанавливает пользователя"""
+        cookies = SessionCookies(enabled=True, secret_key="secret")
+        value = cookies.sign(42, "session-1")
+        
+        assert value.startswith("42.session-1.")
+        assert cookies.load(value) == SessionUser(id=42, session_id="session-1")
+    
+    def test_tampered_cookie_rejected(self):
+        """Тест что измененная cookie не принимается"""
+        cookies = SessionCookies(enabled=True, secret_key="secret")
+        signature = cookies.sign(42, "session-1").rsplit(".", 1)[1]
+        
+        assert cookies.load(f"43.session-1.{signature}") is None
+        assert cookies.load(f"42.session-2.{signature}") is None
+        assert cookies.load("42.session-1.bad") is None
+    
+    def test_other_secret_rejected(self):
+        """Тест что cookie, подписанная другим ключом, не принимается"""
+        value = SessionCookies(enabled=True, secret_key="secret").sign(42, "session-1")
+        assert SessionCookies(enabled=True, secret_key="other").load(value) is None
+    
+    def test_invalid_values(self):
+        """Тест cookie старого формата и мусора"""
+        cookies = SessionCookies(enabled=True, secret_key="secret")
+        assert cookies.load(None) is None
+        assert cookies.load("") is None
+        assert cookies.load("3f2c9a6e-1b7d-4c1a-9a57-0e1f2d3c4b5a") is None
+        assert cookies.load("a.b.c.d") is None
+        # Не-ASCII символы в подписи - подделка, а не ошибка сервера
+        assert cookies.load("1.abc.\xe9") is None
+        assert cookies.load("1.сессия.подпись") is None
+    
+    def test_cookie_value_depends_on_mode(self):
+        """Тест значения cookie в обоих режимах"""
+        user = SessionUser(id=7, session_id="session-7")
+        
+        assert SessionCookies(enabled=False, secret_key="secret").cookie_value(user) == "session-7"
+        signed = SessionCookies(enabled=True, secret_key="secret")
+        assert signed.load(signed.cookie_value(user)) == user
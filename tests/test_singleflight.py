@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from app.singleflight import SingleFlight
+
+class TestSingleFlight:
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_result(self):
+        """Тест что одновременные вызовы с одним ключом выполняются один раз"""
+        flight = SingleFlight()
+        calls = 0
+        
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"name": "Moscow"}
+        
+        results = await asyncio.gather(*[flight.do("moscow", fetch) for _ in range(10)])
+        
+        assert calls == 1
+        assert all(result == {"name": "Moscow"} for result in results)
+        assert flight.stats() == {"in_flight": 0, "calls": 1, "shared": 9}
+    
+    @pytest.mark.asyncio
+    async def test_different_keys_not_shared(self):
+        """Тест что разные ключи выполняются независимо"""
+        flight = SingleFlight()
+        
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+        
+        results = await asyncio.gather(
+            flight.do("a", lambda: fetch(1)),
+            flight.do("b", lambda: fetch(2))
+        )
+        
+        assert results == [1, 2]
+        assert flight.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_all_callers(self):
+        """Тест что исключение получают все ожидающие"""
+        flight = SingleFlight()
+        
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream error")
+        
+        results = await asyncio.gather(
+            *[flight.do("moscow", fetch) for _ in range(3)],
+            return_exceptions=True
+        )
+        
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flight) == 0
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """Тест что отмена одного ожидающего не отменяет общий запрос"""
+        flight = SingleFlight()
+        
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "ok"
+        
+        first = asyncio.create_task(flight.do("moscow", fetch))
+        second = asyncio.create_task(flight.do("moscow", fetch))
+        await asyncio.sleep(0.01)
+        
+        first.cancel()
+        assert await second == "ok"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    
+    @pytest.mark.asyncio
+    async def test_key_released_after_completion(self):
+        """Тест что после завершения следующий вызов идет заново"""
+        flight = SingleFlight()
+        calls = 0
+        
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            return calls
+        
+        assert await flight.do("moscow", fetch) == 1
+        assert await flight.do("moscow", fetch) == 2
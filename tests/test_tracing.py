@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import uuid
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app.main import app, weather_service
+from app.tracing import (
+    SPAN_KIND_SERVER, STATUS_ERROR, FileSpanExporter, RequestContextFilter, Tracer,
+    TracingMiddleware, create_exporter, current_request_id, parse_traceparent, tracer
+)
+from app.db_instrumentation import instrument_engine
+
+class MemoryExporter:
+    """Экспортер для тестов: пачки спанов в памяти"""
+
+    def __init__(self):
+        self.payloads = []
+
+    async def export(self, payload):
+        self.payloads.append(payload)
+
+    async def shutdown(self):
+        pass
+
+    def spans(self):
+        return [
+            span
+            for payload in self.payloads
+            for resource_spans in payload["resourceSpans"]
+            for scope_spans in resource_spans["scopeSpans"]
+            for span in scope_spans["spans"]
+        ]
+
+def exported_spans(test_tracer: Tracer):
+    asyncio.run(test_tracer.flush())
+    return test_tracer.exporter.spans()
+
+class TestTracer:
+
+    def test_disabled_without_exporter(self):
+        """Тест что без экспортера спаны не создаются"""
+        test_tracer = Tracer(exporter=None)
+
+        with test_tracer.span("stage") as span:
+            span.set_attribute("key", "value")
+
+        assert not test_tracer.enabled
+        assert test_tracer.stats()["finished"] == 0
+
+    def test_create_exporter(self, tmp_path, monkeypatch):
+        """Тест выбора экспортера по TRACING_EXPORTER"""
+        monkeypatch.setenv("TRACING_FILE", str(tmp_path / "traces.jsonl"))
+
+        assert create_exporter("none") is None
+        assert isinstance(create_exporter("file"), FileSpanExporter)
+        with pytest.raises(ValueError):
+            create_exporter("jaeger")
+
+    def test_nested_spans(self):
+        """Тест вложенности: дочерние спаны в той же трассе с родителем"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+
+        with test_tracer.span("request") as root:
+            with test_tracer.span("geocode", {"city": "Москва"}):
+                pass
+            with test_tracer.span("weather") as weather:
+                weather.set_attribute("cache", "miss")
+
+        spans = {span["name"]: span for span in exported_spans(test_tracer)}
+        assert len(spans["request"]["traceId"]) == 32
+        assert spans["request"]["parentSpanId"] == ""
+        for name in ("geocode", "weather"):
+            assert spans[name]["traceId"] == root.trace_id
+            assert spans[name]["parentSpanId"] == root.span_id
+        assert spans["geocode"]["attributes"] == [{"key": "city", "value": {"stringValue": "Москва"}}]
+        assert int(spans["weather"]["endTimeUnixNano"]) >= int(spans["weather"]["startTimeUnixNano"])
+
+    def test_exception_marks_span(self):
+        """Тест что исключение помечает спан ошибкой и пробрасывается"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+
+        with pytest.raises(RuntimeError):
+            with test_tracer.span("upstream"):
+                raise RuntimeError("timeout")
+
+        span = exported_spans(test_tracer)[0]
+        assert span["status"]["code"] == STATUS_ERROR
+        assert span["events"][0]["name"] == "exception"
+
+    def test_queue_limit(self):
+        """Тест что сверх max_queue_size спаны отбрасываются"""
+        test_tracer = Tracer(exporter=MemoryExporter(), max_queue_size=2)
+
+        for _ in range(3):
+            with test_tracer.span("stage"):
+                pass
+
+        assert test_tracer.stats()["dropped"] == 1
+        assert len(exported_spans(test_tracer)) == 2
+        assert test_tracer.stats()["exported"] == 2
+
+    @pytest.mark.asyncio
+    async def test_file_exporter(self, tmp_path):
+        """Тест записи пачки спанов строкой OTLP JSON"""
+        path = tmp_path / "traces.jsonl"
+        test_tracer = Tracer(exporter=FileSpanExporter(str(path)), service_name="skypeek-test")
+
+        with test_tracer.span("stage"):
+            pass
+        await test_tracer.stop()
+
+        payload = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+        resource = payload["resourceSpans"][0]
+        assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "skypeek-test"
+        assert resource["scopeSpans"][0]["spans"][0]["name"] == "stage"
+
+    def test_parse_traceparent(self):
+        """Тест разбора заголовка W3C traceparent"""
+        trace_id, span_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+        assert parse_traceparent(f"00-{trace_id}-{span_id}-01") == (trace_id, span_id)
+        assert parse_traceparent(None) is None
+        assert parse_traceparent("garbage") is None
+        assert parse_traceparent(f"00-{'0' * 32}-{span_id}-01") is None
+
+    def test_db_spans(self):
+        """Тест спанов SQL-запросов: только внутри трассируемого этапа"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, tracer=test_tracer)
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with test_tracer.span("history.save") as parent:
+                conn.execute(text("SELECT 2"))
+
+        spans = {span["name"]: span for span in exported_spans(test_tracer)}
+        assert set(spans) == {"history.save", "db SELECT"}
+        assert spans["db SELECT"]["parentSpanId"] == parent.span_id
+        attributes = {item["key"]: item["value"] for item in spans["db SELECT"]["attributes"]}
+        assert attributes["db.statement"] == {"stringValue": "SELECT 2"}
+    
+    def test_db_span_error(self):
+        """Тест что упавший SQL-запрос помечает свой спан ошибкой"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, tracer=test_tracer)
+        
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                with test_tracer.span("history.save"):
+                    conn.execute(text("SELECT x FROM missing"))
+        
+        spans = {span["name"]: span for span in exported_spans(test_tracer)}
+        assert spans["db SELECT"]["status"]["code"] == STATUS_ERROR
+        assert spans["db SELECT"]["events"][0]["name"] == "exception"
+
+class TestTracingMiddleware:
+
+    def create_test_app(self, test_tracer: Tracer) -> FastAPI:
+        test_app = FastAPI()
+        test_app.add_middleware(TracingMiddleware, tracer=test_tracer)
+
+        @test_app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            logging.getLogger("app.test").info("item %s", item_id)
+            return {"request_id": current_request_id()}
+
+        return test_app
+
+    def test_request_id(self):
+        """Тест что идентификатор запроса берется из заголовка или создается"""
+        client = TestClient(self.create_test_app(Tracer(exporter=None)))
+
+        response = client.get("/items/1", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+        assert response.json()["request_id"] == "abc-123"
+
+        generated = client.get("/items/1")
+        assert generated.json()["request_id"] == generated.headers["x-request-id"]
+        assert len(generated.headers["x-request-id"]) == 32
+
+    def test_root_span(self):
+        """Тест корневого спана: шаблон маршрута, статус и продолжение трассы"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+        client = TestClient(self.create_test_app(test_tracer))
+        trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+        client.get("/items/7", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+
+        span = exported_spans(test_tracer)[0]
+        assert span["name"] == "GET /items/{item_id}"
+        assert span["kind"] == SPAN_KIND_SERVER
+        assert span["traceId"] == trace_id
+        assert span["parentSpanId"] == parent_id
+        attributes = {item["key"]: item["value"] for item in span["attributes"]}
+        assert attributes["http.status_code"] == {"intValue": "200"}
+        assert attributes["url.path"] == {"stringValue": "/items/7"}
+
+    def test_request_id_in_logs(self, caplog):
+        """Тест что записи лога получают request_id и trace_id запроса"""
+        test_tracer = Tracer(exporter=MemoryExporter())
+        client = TestClient(self.create_test_app(test_tracer))
+        caplog.handler.addFilter(RequestContextFilter())
+
+        with caplog.at_level(logging.INFO, logger="app.test"):
+            client.get("/items/3", headers={"X-Request-ID": "log-1"})
+
+        record = next(record for record in caplog.records if record.name == "app.test")
+        assert record.request_id == "log-1"
+        assert record.trace_id == exported_spans(test_tracer)[0]["traceId"]
+
+class TestWeatherTrace:
+
+    @pytest.fixture
+    def traced(self, monkeypatch):
+        exporter = MemoryExporter()
+        monkeypatch.setattr(tracer, "exporter", exporter)
+        monkeypatch.setattr(tracer, "_pending", [])
+        return tracer
+
+    def test_weather_request_trace(self, client, traced):
+        """Тест трассы /api/weather: пользователь, геокодирование, погода и запись в БД"""
+        city = f"Город-{uuid.uuid4().hex[:8]}"
+
+        async def send(url, params, priority):
+            if url == weather_service.provider.geocoding_url:
+                return httpx.Response(200, json=[{"name": city, "lat": 10.123, "lon": 20.456, "country": "RU"}])
+            return httpx.Response(200, json={
+                "main": {"temp": 1.0, "feels_like": -1.0, "humidity": 70},
+                "wind": {"speed": 3.0},
+                "weather": [{"description": "снег"}],
+                "name": city,
+                "sys": {"country": "RU"}
+            })
+
+        with patch.object(weather_service, "_send", new_callable=AsyncMock) as mock_send:
+            mock_send.side_effect = send
+            response = client.get(f"/api/weather?city={city}")
+
+        assert response.status_code == 200
+        spans = exported_spans(traced)
+        names = [span["name"] for span in spans]
+        for name in (
+            "GET /api/weather", "get_or_create_user", "user.upsert", "weather.get_by_city",
+            "weather.geocode", "upstream geocode", "weather.observation", "upstream weather",
+            "history.record", "history.save", "db INSERT"
+        ):
+            assert name in names, name
+        # Все этапы - одна трасса с корневым спаном запроса
+        assert len({span["traceId"] for span in spans}) == 1
+        by_id = {span["spanId"]: span for span in spans}
+        by_name = {span["name"]: span for span in spans}
+        assert by_id[by_name["upstream geocode"]["parentSpanId"]]["name"] == "weather.geocode"
+        assert by_id[by_name["history.save"]["parentSpanId"]]["name"] == "history.record"
+        root = by_name["GET /api/weather"]
+        request_id = next(item["value"]["stringValue"] for item in root["attributes"] if item["key"] == "http.request_id")
+        assert request_id == response.headers["x-request-id"]
@@ -1,6 +1,21 @@
 import pytest
+import asyncio
+import httpx
 from unittest.mock import AsyncMock, patch, MagicMock
 from app.weather_service import WeatherService, WeatherData
+from app.exceptions import UpstreamRateLimited, UpstreamRejected, UpstreamUnavailable
+from app.rate_limit import Priority
+
+def make_weather_response(temp: float) -> MagicMock:
+    """Мок ответа API текущей погоды"""
+    response = MagicMock()
+    response.json.return_value = {
+        "main": {"temp": temp, "feels_like": temp, "humidity": 50},
+        "weather": [{"description": "ясно"}],
+        "wind": {"speed": 1.0}
+    }
+    response.raise_for_status = MagicMock()
+    return response
 
 class TestWeatherService:
     
@@ -24,9 +39,10 @@ class TestWeatherService:
         mock_response.raise_for_status = MagicMock()
         
         mock_client = AsyncMock()
-        mock_client.__aenter__.return_value.get.return_value = mock_response
+        mock_client.get.return_value = mock_response
         
         with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
             result = await weather_service.get_city_coordinates("Moscow")
             
             assert result is not None
@@ -43,9 +59,10 @@ class TestWeatherService:
         mock_response.raise_for_status = MagicMock()
         
         mock_client = AsyncMock()
-        mock_client.__aenter__.return_value.get.return_value = mock_response
+        mock_client.get.return_value = mock_response
         
         with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
             result = await weather_service.get_city_coordinates("NonexistentCity")
             
             assert result is None
@@ -72,15 +89,16 @@ class TestWeatherService:
         mock_response.raise_for_status = MagicMock()
         
         mock_client = AsyncMock()
-        mock_client.__aenter__.return_value.get.return_value = mock_response
+        mock_client.get.return_value = mock_response
         
         with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
             result = await weather_service.get_weather_by_coordinates(55.7558, 37.6176)
             
             assert result is not None
-            assert result["main"]["temp"] == 15.5
-            assert result["main"]["humidity"] == 65
-            assert result["weather"][0]["description"] == "облачно"
+            assert result["temperature"] == 15.5
+            assert result["humidity"] == 65
+            assert result["description"] == "облачно"
     
     @pytest.mark.asyncio
     async def test_get_weather_by_city_success(self, weather_service):
@@ -117,11 +135,12 @@ class TestWeatherService:
         weather_response.raise_for_status = MagicMock()
         
         mock_client = AsyncMock()
-        mock_client.__aenter__.return_value.get.side_effect = [
+        mock_client.get.side_effect = [
             coordinates_response, weather_response
         ]
         
         with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
             result = await weather_service.get_weather_by_city("Moscow")
             
             assert result is not None
@@ -130,4 +149,526 @@ class TestWeatherService:
             assert result.temperature == 15.5
             assert result.humidity == 65
             assert result.description == "Облачно"
-            
\ No newline at end of file
+    
+    @pytest.mark.asyncio
+    async def test_client_is_reused_between_requests(self, weather_service):
+        """Тест что все запросы идут через один пул соединений"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = []
+        mock_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = mock_response
+        
+        with patch('httpx.AsyncClient', return_value=mock_client) as client_class:
+            await weather_service.startup()
+            await weather_service.get_city_coordinates("Moscow")
+            await weather_service.get_city_coordinates("London")
+            await weather_service.autocomplete_cities("Lon")
+            
+            assert client_class.call_count == 1
+            assert mock_client.get.call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_startup_and_shutdown(self, weather_service):
+        """Тест открытия и закрытия пула соединений"""
+        await weather_service.startup()
+        client = weather_service.client
+        assert not client.is_closed
+        
+        await weather_service.startup()
+        assert weather_service.client is client
+        
+        await weather_service.shutdown()
+        assert client.is_closed
+        assert weather_service._client is None
+    
+    @pytest.mark.asyncio
+    async def test_client_requires_startup(self, weather_service):
+        """Тест что клиент не создается вне startup: после shutdown запросы не открывают новый пул"""
+        with pytest.raises(RuntimeError):
+            weather_service.client
+        
+        await weather_service.startup()
+        await weather_service.shutdown()
+        with patch('httpx.AsyncClient') as client_class:
+            with pytest.raises(RuntimeError):
+                await weather_service.get_city_coordinates("Moscow")
+        
+        assert client_class.call_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_autocomplete_cities_error(self, weather_service):
+        """Тест что ошибка API автодополнения не пробрасывается"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = Exception("connection error")
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            result = await weather_service.autocomplete_cities("Mos")
+            
+            assert result == []
+    
+    @pytest.mark.asyncio
+    async def test_get_city_coordinates_cached(self, weather_service):
+        """Тест что повторное геокодирование берется из кэша"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = [
+            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176, "country": "RU"}
+        ]
+        mock_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = mock_response
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            first = await weather_service.get_city_coordinates("Moscow")
+            second = await weather_service.get_city_coordinates("  MOSCOW ")
+            
+            assert first == second
+            assert mock_client.get.call_count == 1
+            assert weather_service.cache_stats()["geocoding"]["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_city_coordinates_negative_cache(self, weather_service):
+        """Тест кэширования ответа "город не найден" """
+        mock_response = MagicMock()
+        mock_response.json.return_value = []
+        mock_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = mock_response
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            assert await weather_service.get_city_coordinates("Mocsow") is None
+            assert await weather_service.get_city_coordinates("mocsow") is None
+            assert mock_client.get.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_city_coordinates_error_not_cached(self, weather_service):
+        """Тест что ошибки API не попадают в кэш"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = [
+            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176, "country": "RU"}
+        ]
+        mock_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = [httpx.ConnectTimeout("timeout"), mock_response]
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_city_coordinates("Moscow")
+            result = await weather_service.get_city_coordinates("Moscow")
+            
+            assert result["name"] == "Moscow"
+            assert mock_client.get.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_get_weather_by_coordinates_cached(self, weather_service):
+        """Тест что близкие координаты обслуживаются из кэша"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = make_weather_response(15.5)
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            first = await weather_service.get_weather_by_coordinates(55.7558, 37.6176)
+            second = await weather_service.get_weather_by_coordinates(55.7561, 37.6179)
+            
+            assert first == second
+            assert mock_client.get.call_count == 1
+            assert weather_service.cache_stats()["weather"]["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_weather_by_coordinates_stale_while_revalidate(self, weather_service):
+        """Тест что устаревшие данные отдаются сразу и обновляются в фоне"""
+        now = [1000.0]
+        weather_service._weather_cache._clock = lambda: now[0]
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = [make_weather_response(10.0), make_weather_response(12.0)]
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            await weather_service.get_weather_by_coordinates(55.75, 37.61)
+            
+            now[0] += weather_service._weather_cache.ttl + 1
+            stale = await weather_service.get_weather_by_coordinates(55.75, 37.61)
+            assert stale["temperature"] == 10.0
+            
+            # Ждем завершения фонового обновления
+            await asyncio.gather(*weather_service._refresh_tasks.values())
+            
+            fresh = await weather_service.get_weather_by_coordinates(55.75, 37.61)
+            assert fresh["temperature"] == 12.0
+            assert mock_client.get.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_get_weather_by_coordinates_expired(self, weather_service):
+        """Тест что записи старше окна устаревания запрашиваются заново"""
+        now = [1000.0]
+        weather_service._weather_cache._clock = lambda: now[0]
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = [make_weather_response(10.0), make_weather_response(12.0)]
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            await weather_service.get_weather_by_coordinates(55.75, 37.61)
+            
+            cache = weather_service._weather_cache
+            now[0] += cache.ttl + cache.stale_ttl + 1
+            result = await weather_service.get_weather_by_coordinates(55.75, 37.61)
+            
+            assert result["temperature"] == 12.0
+            assert not weather_service._refresh_tasks
+    
+    @pytest.mark.asyncio
+    async def test_get_weather_by_city_concurrent_requests_coalesced(self, weather_service):
+        """Тест что одновременные запросы одного города идут в API один раз"""
+        coordinates_response = MagicMock()
+        coordinates_response.json.return_value = [
+            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176, "country": "RU"}
+        ]
+        coordinates_response.raise_for_status = MagicMock()
+        
+        async def slow_get(url, params=None):
+            await asyncio.sleep(0.01)
+            if url == weather_service.provider.geocoding_url:
+                return coordinates_response
+            return make_weather_response(15.5)
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = slow_get
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            results = await asyncio.gather(*[
+                weather_service.get_weather_by_city(name)
+                for name in ["Moscow", "moscow", " MOSCOW "] * 5
+            ])
+            
+            assert all(result.city == "Moscow, RU" for result in results)
+            assert mock_client.get.call_count == 2
+            
+            coalescing = weather_service.cache_stats()["coalescing"]
+            assert coalescing["geocoding"]["shared"] == 14
+            assert coalescing["weather"]["shared"] == 14
+
+    
+    @pytest.mark.asyncio
+    async def test_get_weather_by_location(self, weather_service):
+        """Тест получения погоды по координатам без геокодирования"""
+        weather_response = make_weather_response(7.0)
+        weather_response.json.return_value.update(name="Kazan", sys={"country": "RU"})
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = weather_response
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            result = await weather_service.get_weather_by_location(55.79, 49.12)
+            
+            assert result.city == "Kazan, RU"
+            assert result.temperature == 7.0
+            assert mock_client.get.call_count == 1
+            assert mock_client.get.call_args[0][0] == weather_service.provider.weather_url
+    
+    @pytest.mark.asyncio
+    async def test_location_lookup_uses_remembered_name(self, weather_service):
+        """Тест что повторный запрос по location_id берет название из кэша"""
+        from app.weather_service import parse_location_id
+        
+        coordinates_response = MagicMock()
+        coordinates_response.json.return_value = [
+            {"name": "Moscow", "lat": 55.7558, "lon": 37.6176, "country": "RU", "state": "Moscow"}
+        ]
+        coordinates_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = [coordinates_response, make_weather_response(15.0)]
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            by_city = await weather_service.get_weather_by_city("Moscow")
+            assert by_city.location_id == "55.7558,37.6176"
+            
+            by_location = await weather_service.get_weather_by_location(*parse_location_id(by_city.location_id))
+            
+            assert by_location.city == "Moscow, Moscow, RU"
+            assert by_location.temperature == 15.0
+            # Ни геокодирования, ни повторного запроса погоды
+            assert mock_client.get.call_count == 2
+    
+    def test_parse_location_id(self):
+        """Тест разбора идентификатора места"""
+        from app.weather_service import make_location_id, parse_location_id
+        
+        assert parse_location_id(make_location_id(55.75581, -37.61763)) == (55.7558, -37.6176)
+        assert parse_location_id("abc") is None
+        assert parse_location_id("1,2,3") is None
+        assert parse_location_id("91,0") is None
+        assert parse_location_id("nan,nan") is None
+
+    
+    @staticmethod
+    def make_status_error(status_code: int, headers: dict = None) -> MagicMock:
+        """Мок ответа API с кодом ошибки"""
+        request = httpx.Request("GET", "https://api.openweathermap.org")
+        response = MagicMock()
+        response.raise_for_status.side_effect = httpx.HTTPStatusError(
+            "error", request=request,
+            response=httpx.Response(status_code, headers=headers, request=request)
+        )
+        return response
+    
+    @pytest.mark.asyncio
+    async def test_upstream_429_is_not_masked_as_not_found(self, weather_service):
+        """Тест что 429 от API не превращается в "город не найден" и ставит лимитер на паузу"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = self.make_status_error(429, {"Retry-After": "30"})
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamRateLimited) as exc_info:
+                await weather_service.get_weather_by_city("Moscow")
+            assert exc_info.value.retry_after == 30
+            
+            # Пока лимитер на паузе, запрос пользователя отклоняется без обращения к API
+            with pytest.raises(UpstreamRateLimited):
+                await weather_service.get_weather_by_city("London")
+            assert mock_client.get.call_count == 1
+            
+            # 429 не кэшируется как "не найдено"
+            assert len(weather_service._geocode_cache) == 0
+    
+    @pytest.mark.asyncio
+    async def test_upstream_5xx_raises_unavailable(self, weather_service):
+        """Тест что ответы 5xx превращаются в UpstreamUnavailable"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = self.make_status_error(502)
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_weather_by_coordinates(55.75, 37.61)
+    
+    @pytest.mark.asyncio
+    async def test_upstream_400_is_not_found(self, weather_service):
+        """Тест что 400 на кривой запрос - "не найдено", а не отказ API"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.endswith("/direct"):
+                if request.url.params["q"] == ",":
+                    return httpx.Response(400, json={"cod": "400", "message": "Nothing to geocode"})
+                return httpx.Response(200, json=[{"name": "Moscow", "lat": 55.75, "lon": 37.61, "country": "RU"}])
+            return httpx.Response(200, json=make_weather_response(5.0).json.return_value)
+        
+        weather_service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            for _ in range(weather_service.circuit_breaker.failure_threshold):
+                assert await weather_service.get_weather_by_city(",") is None
+            
+            assert weather_service.circuit_breaker.state == "closed"
+            result = await weather_service.get_weather_by_city("Moscow")
+            assert result.temperature == 5.0
+        finally:
+            await weather_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_upstream_4xx_raises_rejected(self, weather_service):
+        """Тест что прочие 4xx (например, неверный ключ) - UpstreamRejected"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = self.make_status_error(401)
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamRejected) as exc_info:
+                await weather_service.get_weather_by_coordinates(55.75, 37.61)
+        assert exc_info.value.status_code == 401
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("body", [b"<html>Bad Gateway</html>", b'{"main": {}}'])
+    async def test_malformed_response_raises_unavailable(self, weather_service, body):
+        """Тест что тело не в JSON или без нужных полей - UpstreamUnavailable, а не 500"""
+        weather_service._client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        )
+        try:
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_weather_by_coordinates(55.75, 37.61)
+        finally:
+            await weather_service.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_trip_circuit(self, weather_service):
+        """Тест что ответы 4xx и некорректное тело не размыкают цепь"""
+        weather_service.circuit_breaker.failure_threshold = 2
+        responses = [
+            httpx.Response(400, json={"cod": "400", "message": "wrong latitude"}),
+            httpx.Response(401, json={"cod": 401, "message": "Invalid API key"}),
+            httpx.Response(404, json={"cod": "404", "message": "city not found"}),
+            httpx.Response(200, content=b"<html>oops</html>")
+        ]
+        weather_service._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        try:
+            assert await weather_service.get_weather_by_coordinates(10.0, 37.61) is None
+            with pytest.raises(UpstreamRejected):
+                await weather_service.get_weather_by_coordinates(20.0, 37.61)
+            assert await weather_service.get_weather_by_coordinates(30.0, 37.61) is None
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_weather_by_coordinates(40.0, 37.61)
+        finally:
+            await weather_service.shutdown()
+        
+        stats = weather_service.circuit_breaker.stats()
+        assert stats["state"] == "closed"
+        assert stats["failures"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_autocomplete_uses_its_priority(self, weather_service):
+        """Тест что автодополнение идет с приоритетом AUTOCOMPLETE и не падает при исчерпанной квоте"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = []
+        mock_response.raise_for_status = MagicMock()
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = mock_response
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            await weather_service.autocomplete_cities("Mos")
+            assert weather_service.rate_limiter.granted[Priority.AUTOCOMPLETE] == 1
+            
+            weather_service.rate_limiter.pause(60)
+            assert await weather_service.autocomplete_cities("Mos") == []
+            assert weather_service.rate_limiter.rejected[Priority.AUTOCOMPLETE] == 1
+    
+    @pytest.mark.asyncio
+    async def test_slow_upstream_hits_call_timeout(self, weather_service):
+        """Тест что медленный API прерывается по общему дедлайну обращения"""
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(1)
+        
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.side_effect = slow_get
+        weather_service.call_timeout = 0.05
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_weather_by_coordinates(55.75, 37.61)
+        assert weather_service.circuit_breaker.failures == 1
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self, weather_service):
+        """Тест что после серии ошибок запросы не доходят до API"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = self.make_status_error(503)
+        weather_service.circuit_breaker.failure_threshold = 2
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            for latitude in (10.0, 20.0):
+                with pytest.raises(UpstreamUnavailable):
+                    await weather_service.get_weather_by_coordinates(latitude, 37.61)
+            
+            with pytest.raises(UpstreamUnavailable) as exc_info:
+                await weather_service.get_weather_by_coordinates(30.0, 37.61)
+        
+        assert mock_client.get.call_count == 2
+        assert exc_info.value.retry_after > 0
+        assert weather_service.upstream_stats()["circuit_breaker"]["state"] == "open"
+    
+    @pytest.mark.asyncio
+    async def test_rate_limit_does_not_trip_circuit(self, weather_service):
+        """Тест что ответы 429 не считаются отказом сервиса"""
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = self.make_status_error(429, {"Retry-After": "1"})
+        weather_service.circuit_breaker.failure_threshold = 1
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamRateLimited):
+                await weather_service.get_weather_by_coordinates(55.75, 37.61)
+        assert weather_service.circuit_breaker.state == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_last_known_weather_served_when_upstream_down(self, weather_service):
+        """Тест что при недоступном API отдаются последние известные данные с пометкой stale"""
+        weather_service._geocode_cache.set("moscow", {
+            "name": "Moscow", "latitude": 55.75, "longitude": 37.61, "country": "RU", "state": ""
+        })
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = make_weather_response(5.0)
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            fresh = await weather_service.get_weather_by_city("Moscow")
+            assert fresh.stale is False
+            
+            # Запись основного кэша истекла, а API лежит
+            weather_service._weather_cache.clear()
+            mock_client.get.return_value = self.make_status_error(502)
+            stale = await weather_service.get_weather_by_city("Moscow")
+        
+        assert stale.stale is True
+        assert stale.temperature == 5.0
+        assert stale.timestamp <= fresh.timestamp
+        
+        # Без последних известных данных ошибка пробрасывается
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            with pytest.raises(UpstreamUnavailable):
+                await weather_service.get_weather_by_location(10.0, 10.0)
+    
+    @pytest.mark.asyncio
+    async def test_user_request_does_not_join_queued_background_refresh(self, weather_service):
+        """Тест что запрос пользователя не ждет фоновое обновление тех же координат в очереди квоты"""
+        limiter = weather_service.rate_limiter
+        limiter.rate = 20
+        limiter.capacity = 1
+        limiter._tokens = 0
+        limiter._updated = limiter._clock()
+        mock_client = AsyncMock()
+        mock_client.is_closed = False
+        mock_client.get.return_value = make_weather_response(7.0)
+        
+        with patch('httpx.AsyncClient', return_value=mock_client):
+            await weather_service.startup()
+            background = asyncio.create_task(
+                weather_service.prewarm_city(600, latitude=55.75, longitude=37.61)
+            )
+            while limiter.stats()["queued"]["background"] == 0:
+                await asyncio.sleep(0)
+            
+            weather = await asyncio.wait_for(weather_service.get_weather_by_coordinates(55.75, 37.61), 1)
+            
+            # Пользователь получил токен раньше фонового запроса, а не ждал его
+            assert weather["temperature"] == 7.0
+            assert limiter.granted[Priority.USER] == 1
+            assert limiter.granted[Priority.BACKGROUND] == 0
+            assert await background is True
+        
+        assert limiter.granted[Priority.BACKGROUND] == 1